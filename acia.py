@@ -0,0 +1,317 @@
+import os
+import select
+import socket
+import sys
+
+
+class FileStream(object):
+
+    def __init__(self, infile=None, outfile=None):
+
+        # The input file descriptor, and the binary side of the output (stdin/stdout, pipes or files).
+        self._infd = infile.fileno() if infile is not None else None
+        self._output = getattr(outfile, 'buffer', outfile)
+
+        # Flag set once the input has ended.
+        self.eof = infile is None
+
+    def read(self):
+
+        # Check to see if there is input waiting without blocking.
+        if self.eof or not select.select([self._infd], [], [], 0)[0]:
+            return b''
+
+        # Take everything waiting in one call.
+        data = os.read(self._infd, 4096)
+
+        if not data:
+            self.eof = True
+
+        return data
+
+    def write(self, data):
+
+        # Write the data out.
+        if self._output is not None:
+            self._output.write(data)
+            self._output.flush()
+
+    def close(self):
+
+        # The files belong to whoever opened them.
+        pass
+
+
+class SocketStream(object):
+
+    def __init__(self, connection):
+
+        # The connected socket, switched to non-blocking reads.
+        self._socket = connection
+        self._socket.setblocking(False)
+
+        # Flag set once the other end has closed.
+        self.eof = False
+
+    @classmethod
+    def listen(cls, port, host="127.0.0.1"):
+
+        # Wait for one client to connect on the local port.
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+
+        print("Waiting for serial connection on %s:%d..." % (host, port))
+        connection, _ = server.accept()
+        server.close()
+
+        return cls(connection)
+
+    def read(self):
+
+        # Take everything waiting in one call.
+        try:
+            data = self._socket.recv(4096)
+
+        except BlockingIOError:
+            return b''
+
+        if not data:
+            self.eof = True
+
+        return data
+
+    def write(self, data):
+
+        # Send the data, waiting for room if the socket is full.
+        self._socket.setblocking(True)
+        self._socket.sendall(data)
+        self._socket.setblocking(False)
+
+    def close(self):
+
+        # Hang up.
+        self._socket.close()
+
+
+class BufferStream(object):
+
+    def __init__(self, data=b'', endofinput=True):
+
+        # Input still to be delivered, and everything written.
+        self._input = bytearray(data)
+        self.output = bytearray()
+
+        # Flag for treating the end of the input as the end of the run (for scripted batch runs).
+        self._endofinput = endofinput
+        self.eof = endofinput and not self._input
+
+    def feed(self, data):
+
+        # Queue more input.
+        self._input += data
+        self.eof = False
+
+    def read(self):
+
+        # Hand over all the queued input.
+        data = bytes(self._input)
+        self._input.clear()
+
+        self.eof = self._endofinput
+
+        return data
+
+    def write(self, data):
+
+        # Collect the output.
+        self.output += data
+
+    def close(self):
+
+        pass
+
+
+class ScriptStream(BufferStream):
+
+    def __init__(self, script):
+
+        # Scripted input for batch runs, with output going to stdout.
+        super().__init__(script)
+
+    def write(self, data):
+
+        # Show the output as it comes.
+        sys.stdout.write(data.decode('latin-1'))
+        sys.stdout.flush()
+
+
+class ACIA(object):
+
+    # Default base address, and the register offsets from it.
+    BASE = 0x7F70
+    DATA = 0
+    STATUS = 1
+    COMMAND = 2
+    CONTROL = 3
+
+    # Status register bits.
+    RECEIVERFULL = 0x08
+    TRANSMITTEREMPTY = 0x10
+
+    # Output is flushed at this size, and at every line end.
+    FLUSHSIZE = 256
+
+    def __init__(self, stream, pollcycles=1000, translatenewline=True):
+
+        # The stream the serial port is connected to.
+        self.stream = stream
+
+        # Cycles between checks of the stream, and the flag for the program having found nothing to receive since the
+        # last one.  The checks are scheduled events, so a program idling on the status waits for the next one.
+        self.pollcycles = max(1, pollcycles)
+        self._waiting = False
+
+        # Flag for turning LF into the CR a terminal sends for enter.
+        self.translatenewline = translatenewline
+
+        # Received bytes not yet read by the program, and the position of the next one.
+        self._input = b''
+        self._position = 0
+
+        # Transmitted bytes not yet written to the stream.
+        self._output = bytearray()
+
+        # The last byte received, and the command and control registers.
+        self.data = 0
+        self.command = 0
+        self.control = 0
+
+        # The processor to stop when the input ends (for batch runs).
+        self._processor = None
+
+    @classmethod
+    def fromspec(cls, spec):
+
+        # Connect to stdin/stdout, a local TCP port (tcp:PORT) or a file of scripted input.
+        if spec == "stdio":
+            return cls(FileStream(sys.stdin, sys.stdout))
+
+        if spec.startswith("tcp:"):
+            return cls(SocketStream.listen(int(spec[4:])), translatenewline=False)
+
+        with open(spec, mode='rb') as script:
+            return cls(ScriptStream(script.read()))
+
+    def attach(self, processor, base=None):
+
+        # Put the registers on the processor's bus.
+        base = self.BASE if base is None else base
+        processor.mapdevice(base, base + 3, self.read, self.write)
+
+        # Reading the status, command or control changes nothing (the status only notes the program is waiting), so a
+        # loop polling them can idle until the next check of the stream.  Reading the data takes a byte, so it can't.
+        processor.mapdevice(base + self.STATUS, base + self.CONTROL, self.read, self.write, pure=True)
+
+        # Stop the processor if it waits for input after the input has ended.
+        self._processor = processor
+
+        # Start checking the stream.
+        processor.interrupts.schedule(processor.cy + self.pollcycles, self.poll)
+
+    def read(self, address):
+
+        register = address & 0x03
+
+        # Check to see if the program is polling the status.
+        if register == self.STATUS:
+
+            # Note the program is waiting for the next check of the stream.
+            if self._position >= len(self._input):
+                self._waiting = True
+
+            return self.TRANSMITTEREMPTY | (self.RECEIVERFULL if self._position < len(self._input) else 0)
+
+        # Check to see if the program is reading a received byte.
+        if register == self.DATA:
+
+            if self._position < len(self._input):
+                self.data = self._input[self._position]
+                self._position += 1
+
+            return self.data
+
+        if register == self.COMMAND:
+            return self.command
+
+        return self.control
+
+    def write(self, address, value):
+
+        register = address & 0x03
+
+        # Check to see if the program is sending a byte.
+        if register == self.DATA:
+
+            self._output.append(value & 0xFF)
+
+            # Flush at line ends so output appears promptly, or when the buffer is full.
+            if value == 0x0A or value == 0x0D or len(self._output) >= self.FLUSHSIZE:
+                self.flush()
+
+        # Writing the status register is a programmed reset.
+        elif register == self.STATUS:
+            self.command &= 0xE0
+
+        elif register == self.COMMAND:
+            self.command = value
+
+        else:
+            self.control = value
+
+    def poll(self, cycle):
+
+        # Only go to the stream while the program is waiting on it.
+        if self._waiting:
+            self._waiting = False
+            self.receive()
+
+        # Check again later.
+        self._processor.interrupts.schedule(cycle + self.pollcycles, self.poll)
+
+    def receive(self):
+
+        # Output waiting to go is sent before waiting on input (so prompts show).
+        self.flush()
+
+        # Take whatever the stream has.
+        data = self.stream.read()
+
+        if data:
+
+            # Translate line ends to the CR the program expects.
+            if self.translatenewline:
+                data = data.replace(b'\r\n', b'\r').replace(b'\n', b'\r')
+
+            self._input = self._input[self._position:] + data
+            self._position = 0
+
+        # Check to see if the input has ended with the program still waiting for more.
+        elif self.stream.eof and self._processor is not None:
+
+            # End the run.
+            self._processor.nextstep = False
+
+    def flush(self):
+
+        # Write the buffered output to the stream.
+        if self._output:
+            self.stream.write(bytes(self._output))
+            self._output.clear()
+
+    def close(self):
+
+        # Send anything left and close the stream.
+        self.flush()
+        self.stream.close()
@@ -0,0 +1,97 @@
+from array import array
+
+# The status register bits the arithmetic sets (where the processor's Flags keeps them).
+NEGATIVE = 0x80
+OVERFLOW = 0x40
+ZERO = 0x02
+CARRY = 0x01
+
+
+def index(decimal, carry, a, m):
+
+    # Position of an (A, M, carry) combination in a table, decimal mode in the top half.
+    return (decimal << 17) | (carry << 16) | (a << 8) | m
+
+
+def add(a, m, carry, decimal):
+
+    # Add in binary, which also gives the zero flag in decimal mode (an NMOS 6502 sets it from the binary sum).
+    result = a + m + carry
+    flags = 0 if result & 0xFF else ZERO
+
+    if decimal:
+
+        # Add the low digits and carry a ten into the high digit.
+        low = (a & 0x0F) + (m & 0x0F) + carry
+
+        if low >= 0x0A:
+            low = ((low + 0x06) & 0x0F) + 0x10
+
+        # Negative and overflow come from the sum before the high digit is adjusted, with the high digits signed.
+        signed = (a & 0xF0) - (a & 0x80) * 2 + (m & 0xF0) - (m & 0x80) * 2 + low
+        flags |= signed & NEGATIVE
+
+        if signed < -128 or signed > 127:
+            flags |= OVERFLOW
+
+        # Add the high digits and carry a hundred out.
+        result = (a & 0xF0) + (m & 0xF0) + low
+
+        if result >= 0xA0:
+            result += 0x60
+
+    else:
+
+        # Overflow when both operands have the same sign and the result doesn't.
+        flags |= (result & NEGATIVE) | (~(a ^ m) & (a ^ result) & 0x80) >> 1
+
+    if result > 0xFF:
+        flags |= CARRY
+
+    # Return the result with the flags above it.
+    return (result & 0xFF) | (flags << 8)
+
+
+def subtract(a, m, carry, decimal):
+
+    # Subtract in binary, which gives all the flags in either mode (an NMOS 6502 only corrects the result in decimal).
+    # Overflow when the operands have different signs and the result has the subtrahend's.
+    result = a - m - (1 - carry)
+    flags = (0 if result & 0xFF else ZERO) | (result & NEGATIVE) | ((a ^ m) & (a ^ result) & 0x80) >> 1
+
+    if result >= 0:
+        flags |= CARRY
+
+    if decimal:
+
+        # Subtract the low digits and borrow a ten from the high digit.
+        low = (a & 0x0F) - (m & 0x0F) + carry - 1
+
+        if low < 0:
+            low = ((low - 0x06) & 0x0F) - 0x10
+
+        # Subtract the high digits and borrow a hundred.
+        result = (a & 0xF0) - (m & 0xF0) + low
+
+        if result < 0:
+            result -= 0x60
+
+    # Return the result with the flags above it.
+    return (result & 0xFF) | (flags << 8)
+
+
+def table(operation):
+
+    entries = array('H', [0]) * (4 << 16)
+
+    # Work out every combination once.
+    for decimal in (0, 1):
+        for carry in (0, 1):
+            for a in range(256):
+
+                base = index(decimal, carry, a, 0)
+
+                for m in range(256):
+                    entries[base + m] = operation(a, m, carry, decimal)
+
+    return entries
@@ -24,6 +24,11 @@ class Assembler(MFCBase):
         # Two pass assembler.
         self.__pass = 0
 
+        # The line being assembled, and the lines the first pass had to give an absolute operand (a label not defined
+        # yet), which keep it so no address moves between the passes.
+        self.__linenumber = 0
+        self.__wide = set()
+
         # Default program counter.
         self.pc = 0x0000
 
@@ -49,7 +54,7 @@ class Assembler(MFCBase):
             self.pc = tmppc
 
             # Loop through each line.
-            for sourceline in super(Assembler, self).sourcelines:
+            for self.__linenumber, sourceline in enumerate(self.sourcelines):
 
                 # Reset line position counter.
                 self.__linepos = 0
@@ -67,10 +72,10 @@ class Assembler(MFCBase):
                     if token.type == LexerToken.OPCODE:
 
                         # Calculate the operand for this opcode.
-                        opcodehex, operand, length = self.getoperand(sourceline, token.value, tmppc)
+                        opcodehex, operand, length = self.getoperand(sourceline, token.value)
 
                         # Write the data to the file.
-                        self.writelinedata(opcodehex, operand)
+                        self.writelinedata(opcodehex, operand, length)
 
                         # Increment the program counter based on operand.
                         self.pc += length
@@ -401,8 +406,10 @@ class Assembler(MFCBase):
                     retval.value = currentchar
                     retval.type = LexerToken.OTHER
 
-            # Increment counter.
-            self.__linepos += 1
+            # Step past a one character token (names and numbers have already stopped on the character after them).
+            if retval.type not in (LexerToken.INTEGER, LexerToken.STRING, LexerToken.OPCODE, LexerToken.PSEUDO,
+                                   LexerToken.LABEL, LexerToken.ACC, LexerToken.XREG, LexerToken.YREG):
+                self.__linepos += 1
 
         # Return token.
         return retval
@@ -437,7 +444,7 @@ class Assembler(MFCBase):
 
         return retval
 
-    def getoperand(self, line, opcode, origpc):
+    def getoperand(self, line, opcode):
 
         # Return values.
         opcodehex = 0
@@ -462,17 +469,23 @@ class Assembler(MFCBase):
 
             elif token.type == LexerToken.LABEL:
 
-                if self.__currentstring in self.__labels:
-                    token.value = self.__labels[self.__currentstring]
+                if token.value in self.__labels:
+                    token.value = self.__labels[token.value]
 
                 elif self.__pass == 1:
-                    token.value = 0
-                    length = 0
+                    token.value = self.pc + 2
 
                 else:
-                    self.error("Undefined label: " + self.__currentstring)
+                    self.error("Undefined label: " + token.value)
+                    token.value = self.pc + 2
+
+                # The offset is from the instruction after the branch.
+                offset = token.value - (self.pc + 2)
+
+                if not -128 <= offset <= 127:
+                    self.error("Branch out of range: " + line)
 
-                operand = (((token.value - origpc) - (self.pc + 2)) & 0xFF)
+                operand = offset & 0xFF
 
         else:
             # Based on the token, we can determine the base addressing type.
@@ -498,10 +511,16 @@ class Assembler(MFCBase):
             # This indicates immediate mode.
             elif token.type == LexerToken.HASH:
 
-                # This is a literal decimal or hex value.
+                # This is a literal decimal or hex value (a label not defined yet on the first pass is out of range).
                 operand = self.parseterm(line, -128, 255)
                 opcodehex = self.opcodes[opcode]['IM']
 
+                if operand is None:
+                    self.error("Immediate value out of range: " + line)
+                    operand = 0
+
+                operand &= 0xFF
+
                 # Length is the one-byte opcode + one byte value.
                 length = 2
 
@@ -514,104 +533,63 @@ class Assembler(MFCBase):
                 # Length is just the one-byte opcode.
                 length = 1
 
-            # Check to see if we have a label as the operand.
-            elif token.type == LexerToken.LABEL:
-
-                # Change the type (for processing in next block).
-                token.type = LexerToken.INTEGER
-
-                # Check to see if we have this label already in symbol table.
-                if self.__currentstring in self.__labels:
-
-                    # Assign the value to the label.
-                    token.value = self.__labels[self.__currentstring]
-
-                # If this is the first pass, assign dummy value.
-                elif self.__pass == 1:
-
-                    # Assign the value.
-                    token.value = 0x100
-                    length = 0
-
-                else:
-
-                    # We shouldn't get here unless there is a problem.
-                    self.error("Undefined label: " + self.__currentstring)
+            # Otherwise the operand is an address (a number, label or expression), zero page or absolute, maybe indexed.
+            else:
 
-            # If we have an integer, just need to determine between zero page and absolute (including x/y indexing).
-            if token.type == LexerToken.INTEGER:
+                # Put the token back and work out the address.
+                self.__oldtoken = token
+                operand = self.parsefactor1(line)
 
-                # Set the operand value.
-                operand = token.value
+                if operand is None:
+                    operand = 0
 
                 # Check to see if this is indexed addressing.
-                if self.gettoken(line) != LexerToken.COMMA:
-
-                    # If the operand is less than 256, it is zero page addressing.
-                    if token.value <= 0xFF:
+                token = self.gettoken(line)
+                index = ''
 
-                        # Get the opcode hex value.
-                        opcodehex = self.opcodes[opcode]['ZP']
-
-                        # Length is the one-byte opcode + the zero page address.
-                        length = 2
-
-                    else:
-
-                        # Get the opcode hex value.
-                        opcodehex = self.opcodes[opcode]['ABS']
-
-                        # Length is the one-byte opcode + the two-byte address.
-                        length = 3
-
-                else:
+                if token.type == LexerToken.COMMA:
 
                     # If we saw the comma, need to see if it is X or Y indexed addressing.
                     token = self.gettoken(line)
 
-                    # X indexing.
                     if token.type == LexerToken.XREG:
+                        index = 'X'
 
-                        # If the operand is less than 256, it is zero page addressing.
-                        if token.value <= 0xFF:
-
-                            # Get the opcode hex value.
-                            opcodehex = self.opcodes[opcode]['ZPX']
-
-                            # Length is the one-byte opcode + the one-byte address.
-                            length = 2
-
-                        else:
-
-                            # Get the opcode hex value.
-                            opcodehex = self.opcodes[opcode]['ABSX']
+                    elif token.type == LexerToken.YREG:
+                        index = 'Y'
 
-                            # Length is the one-byte opcode + the two-byte address.
-                            length = 3
+                    else:
+                        self.error("Unknown address syntax")
 
-                    # Y indexing.
-                    elif token.type == LexerToken.YREG:
+                else:
 
-                        # If the operand is less than 256, it is zero page addressing.
-                        if token.value <= 0xFF:
+                    # Put back the look ahead.
+                    self.__oldtoken = token
 
-                            # Get the opcode hex value.
-                            opcodehex = self.opcodes[opcode]['ZPY']
+                # Use zero page if the address fits and the opcode has it, unless the first pass used absolute.
+                if (operand <= 0xFF and 'ZP' + index in self.opcodes[opcode] and
+                        self.__linenumber not in self.__wide):
 
-                            # Length is the one-byte opcode + the one-byte address.
-                            length = 2
+                    # Length is the one-byte opcode + the zero page address.
+                    mode = 'ZP' + index
+                    length = 2
 
-                        else:
+                else:
 
-                            # Get the opcode hex value.
-                            opcodehex = self.opcodes[opcode]['ABSY']
+                    # Length is the one-byte opcode + the two-byte address.
+                    mode = 'ABS' + index
+                    length = 3
 
-                            # Length is the one-byte opcode + the two-byte address.
-                            length = 3
+                    # Keep the first pass's choice for the second.
+                    if self.__pass == 1:
+                        self.__wide.add(self.__linenumber)
 
-                    else:
+                # Get the opcode hex value.
+                if mode in self.opcodes[opcode]:
+                    opcodehex = self.opcodes[opcode][mode]
 
-                        self.error("Unknown address syntax")
+                else:
+                    self.error("Unsupported addressing mode: " + line)
 
                 print("Operand:{0} Opcodehex {1}".format(operand, opcodehex))
 
@@ -650,8 +628,9 @@ class Assembler(MFCBase):
 
                 if value2 is not None:
 
-                    # Do the math.
+                    # Do the math, and look for another term.
                     value = value + value2
+                    continue
 
                 else:
                     break
@@ -664,8 +643,9 @@ class Assembler(MFCBase):
 
                 if value2 is not None:
 
-                    # Do the math.
+                    # Do the math, and look for another term.
                     value = value - value2
+                    continue
 
                 else:
                     break
@@ -694,8 +674,9 @@ class Assembler(MFCBase):
 
                 if value2 is not None:
 
-                    # Do the math.
+                    # Do the math, and look for another factor.
                     value = value * value2
+                    continue
 
                 else:
                     break
@@ -722,8 +703,13 @@ class Assembler(MFCBase):
         # They are passing a character in as operand.
         elif token.type == LexerToken.QUOTE:
 
-            # Get the next character.
-            token = self.gettoken(line)
+            # Take the character as it is (it may be a space or punctuation), then step over the closing quote.
+            if self.__linepos < len(line):
+                value = ord(line[self.__linepos])
+                self.__linepos += 1
+
+            if self.__linepos < len(line) and line[self.__linepos] == '"':
+                self.__linepos += 1
 
         elif token.type == LexerToken.LSQUARE:
 
@@ -731,7 +717,7 @@ class Assembler(MFCBase):
             value = self.parsefactor1(line)
 
             # Check to see if we have a close bracket.
-            if self.gettoken(line) != LexerToken.RSQUARE:
+            if self.gettoken(line).type != LexerToken.RSQUARE:
                 self.error("Missing ]")
 
         # This is for LSB processing of 2 byte values.
@@ -778,10 +764,10 @@ class Assembler(MFCBase):
         if token.type == LexerToken.LABEL:
 
             # Check to see if the label is recorded already.
-            if self.__currentstring in self.__labels:
+            if token.value in self.__labels:
 
                 # Get its value.
-                value = self.__labels[self.__currentstring]
+                value = self.__labels[token.value]
 
                 # Change the type to numeric.
                 token.type = LexerToken.INTEGER
@@ -790,7 +776,7 @@ class Assembler(MFCBase):
                 value = 0x100
 
             else:
-                self.error("Undefined label: " + self.__currentstring)
+                self.error("Undefined label: " + token.value)
 
         # This is just a numeric value.  Set the value accordingly.
         elif token.type == LexerToken.INTEGER and token.value is not None:
@@ -802,7 +788,7 @@ class Assembler(MFCBase):
         elif token.type == LexerToken.OTHER:
             value = ord(token.value)
 
-        else:
+        elif value is None:
             self.error("Value expected")
 
         # Return the generated value.
@@ -812,13 +798,13 @@ class Assembler(MFCBase):
         if self.__pass == 2:
             print("PY6502: {0} : error: {1}".format(self.infile, errmsg))
 
-    def writelinedata(self, opcodehex, operand):
+    def writelinedata(self, opcodehex, operand, length=1):
 
         # Check to see if we should be printing.
         if self.__pass == 2:
 
             # Keep running tally of bytes.
-            self.incrementbyteswritten(operand)
+            self.incrementbyteswritten(length)
 
             if self.includecounter:
 
@@ -830,10 +816,10 @@ class Assembler(MFCBase):
                 # Format the ouptut.
                 outline = "{:02X} ".format(opcodehex)
 
-            # Check to see if we have an operand.
+            # Check to see if we have an operand (one byte, or two for an absolute address however small).
             if operand is not None:
 
-                if operand < 256:
+                if length == 2:
 
                     # Append operand.
                     outline += "{:02X}".format(operand)
@@ -848,23 +834,10 @@ class Assembler(MFCBase):
             # Write current value for PC and hex for opcode and operand.
             self.writeline(outline)
 
-    def incrementbyteswritten(self, operand):
-
-        # Just increment for opcode.
-        self.bytecount += 1
-
-        # Make sure we have an operand.
-        if operand is not None:
+    def incrementbyteswritten(self, length):
 
-            if operand <= 0xFF:
-
-                # Increment for one byte operand.
-                self.bytecount += 1
-
-            else:
-
-                # Increment for two byte operand.
-                self.bytecount += 2
+        # Increment for the opcode and its operand.
+        self.bytecount += length
 
     def handlestart(self, sourceline):
 
@@ -1003,6 +976,16 @@ class Assembler(MFCBase):
     def handleend(self):
         pass
 
+    def writelabels(self, outfile):
+
+        # Write each label as an assignment, in address order.
+        for label, value in sorted(self.__labels.items(), key=lambda item: (item[1], item[0])):
+            outfile.write("%s = $%04X\n" % (label, value))
+
+    @property
+    def labels(self):
+        return self.__labels
+
     def loadpesudoops(self):
         self.__pesudoops = {
             '.ORG': self.handlestart,
@@ -1017,72 +1000,77 @@ class Assembler(MFCBase):
         }
 
     def loadopcodes(self):
-        self.opcodes = {
-            'ADC': {'IM': 0x69, 'ZP': 0x65, 'ZPX': 0x75, 'ABS': 0x6D, 'ABSX': 0x7D, 'ABSY': 0x79, 'INDX': 0x61,
-                    'INDY': 0x71},
-            'AND': {'IM': 0x29, 'ZP': 0x25, 'ZPX': 0x35, 'ABS': 0x2D, 'ABSX': 0x3D, 'ABSY': 0x39, 'INDX': 0x21,
-                    'INDY': 0x31},
-            'ASL': {'ZP': 0x06, 'ZPX': 0x16, 'ABS': 0x0E, 'ABSX': 0x1E, 'ACC': 0x0A},
-            'BIT': {'ZP': 0x24, 'ABS': 0x2C},
-            'BPL': {'REL': 0x10},
-            'BMI': {'REL': 0x30},
-            'BVC': {'REL': 0x50},
-            'BVS': {'REL': 0x70},
-            'BCC': {'REL': 0x90},
-            'BCS': {'REL': 0xB0},
-            'BNE': {'REL': 0xD0},
-            'BEQ': {'REL': 0xF0},
-            'BRK': {'IMP': 0x00},
-            'CMP': {'IM': 0xC9, 'ZP': 0xC5, 'ZPX': 0xD5, 'ABS': 0xCD, 'ABSX': 0xDD, 'ABSY': 0xD9, 'INDX': 0xC1,
-                    'INDY': 0xD1},
-            'CPX': {'IM': 0xE0, 'ZP': 0xD4, 'ABS': 0xEC},
-            'CPY': {'IM': 0xC0, 'ZP': 0xC4, 'ABS': 0xCC},
-            'DEC': {'ZP': 0xC6, 'ZPX': 0xD6, 'ZPY': 0xCE, 'ABS': 0xDC},
-            'EOR': {'IM': 0x49, 'ZP': 0x45, 'ZPX': 0x55, 'ABS': 0x4D, 'ABSX': 0x5D, 'ABSY': 0x59, 'INDX': 0x41,
-                    'INDY': 0x51},
-            'CLC': {'IMP': 0x18},
-            'SEC': {'IMP': 0x38},
-            'CLI': {'IMP': 0x58},
-            'SEI': {'IMP': 0x78},
-            'CLV': {'IMP': 0xB8},
-            'CLD': {'IMP': 0xD8},
-            'SED': {'IMP': 0xF8},
-            'INC': {'ZP': 0xE6, 'ZPX': 0xF6, 'ABS': 0xEE, 'ABSX': 0xFE},
-            'JMP': {'ABS': 0x4C, 'IND': 0x6C},
-            'JSR': {'ABS': 0x20},
-            'LDA': {'IM': 0xA9, 'ZP': 0xA5, 'ZPX': 0xB5, 'ABS': 0xAD, 'ABSX': 0xBD, 'ABSY': 0xB9, 'INDX': 0xA1,
-                    'INDY': 0xB1},
-            'LDX': {'IM': 0xA2, 'ZP': 0xA6, 'ZPY': 0xB6, 'ABS': 0xAE, 'ABSY': 0xBE},
-            'LDY': {'IM': 0xA0, 'ZP': 0xA4, 'ZPX': 0xB4, 'ABS': 0xAC, 'ABSX': 0xBC},
-            'LSR': {'ZP': 0x46, 'ZPX': 0x56, 'ABS': 0x4E, 'ABSX': 0x5E, 'ACC': 0x4A},
-            'NOP': {'IMP': 0xEA},
-            'ORA': {'IM': 0x09, 'ZP': 0x05, 'ZPX': 0x15, 'ABS': 0x0D, 'ABSX': 0x1D, 'ABSY': 0x19, 'INDX': 0x01,
-                    'INDY': 0x11},
-            'TAX': {'IMP': 0xAA},
-            'TXA': {'IMP': 0x8A},
-            'DEX': {'IMP': 0xCA},
-            'INX': {'IMP': 0xE8},
-            'TAY': {'IMP': 0xA8},
-            'TYA': {'IMP': 0x98},
-            'DEY': {'IMP': 0x88},
-            'INY': {'IMP': 0xC8},
-            'ROL': {'ZP': 0x26, 'ZPX': 0x36, 'ABS': 0x2E, 'ABSX': 0x3E, 'ACC': 0x2A},
-            'ROR': {'ZP': 0x66, 'ZPX': 0x76, 'ABS': 0x6E, 'ABSX': 0x7E, 'ACC': 0x6A},
-            'RTI': {'IMP': 0x40},
-            'RTS': {'IMP': 0x60},
-            'SBC': {'IM': 0xE9, 'ZP': 0xE5, 'ZPX': 0xF5, 'ABS': 0xED, 'ABSX': 0xFD, 'ABSY': 0xF9, 'INDX': 0xE1,
-                    'INDY': 0xF1},
-            'STA': {'ZP': 0x85, 'ZPX': 0x95, 'ABS': 0x8D, 'ABSX': 0x9D, 'ABSY': 0x99, 'INDX': 0x81, 'INDY': 0x91},
-            'TXS': {'IMP': 0x9A},
-            'TSX': {'IMP': 0x8A},
-            'PHA': {'IMP': 0x48},
-            'PLA': {'IMP': 0x68},
-            'PHP': {'IMP': 0x08},
-            'PLP': {'IMP': 0x28},
-            'PHX': {'IMP': 0xDA},
-            'PLX': {'IMP': 0xFA},
-            'PHY': {'IMP': 0x5A},
-            'PLY': {'IMP': 0x7A},
-            'STX': {'ZP': 0x86, 'ZPY': 0x96, 'ABS': 0x8E},
-            'STY': {'ZP': 0x84, 'ZPX': 0x94, 'ABS': 0x8C}
-        }
+
+        # Share the class's table, which is only ever read.
+        self.opcodes = self.OPCODES
+
+    # Opcodes by mnemonic and addressing mode.
+    OPCODES = {
+        'ADC': {'IM': 0x69, 'ZP': 0x65, 'ZPX': 0x75, 'ABS': 0x6D, 'ABSX': 0x7D, 'ABSY': 0x79, 'INDX': 0x61,
+                'INDY': 0x71},
+        'AND': {'IM': 0x29, 'ZP': 0x25, 'ZPX': 0x35, 'ABS': 0x2D, 'ABSX': 0x3D, 'ABSY': 0x39, 'INDX': 0x21,
+                'INDY': 0x31},
+        'ASL': {'ZP': 0x06, 'ZPX': 0x16, 'ABS': 0x0E, 'ABSX': 0x1E, 'ACC': 0x0A},
+        'BIT': {'ZP': 0x24, 'ABS': 0x2C},
+        'BPL': {'REL': 0x10},
+        'BMI': {'REL': 0x30},
+        'BVC': {'REL': 0x50},
+        'BVS': {'REL': 0x70},
+        'BCC': {'REL': 0x90},
+        'BCS': {'REL': 0xB0},
+        'BNE': {'REL': 0xD0},
+        'BEQ': {'REL': 0xF0},
+        'BRK': {'IMP': 0x00},
+        'CMP': {'IM': 0xC9, 'ZP': 0xC5, 'ZPX': 0xD5, 'ABS': 0xCD, 'ABSX': 0xDD, 'ABSY': 0xD9, 'INDX': 0xC1,
+                'INDY': 0xD1},
+        'CPX': {'IM': 0xE0, 'ZP': 0xE4, 'ABS': 0xEC},
+        'CPY': {'IM': 0xC0, 'ZP': 0xC4, 'ABS': 0xCC},
+        'DEC': {'ZP': 0xC6, 'ZPX': 0xD6, 'ABS': 0xCE, 'ABSX': 0xDE},
+        'EOR': {'IM': 0x49, 'ZP': 0x45, 'ZPX': 0x55, 'ABS': 0x4D, 'ABSX': 0x5D, 'ABSY': 0x59, 'INDX': 0x41,
+                'INDY': 0x51},
+        'CLC': {'IMP': 0x18},
+        'SEC': {'IMP': 0x38},
+        'CLI': {'IMP': 0x58},
+        'SEI': {'IMP': 0x78},
+        'CLV': {'IMP': 0xB8},
+        'CLD': {'IMP': 0xD8},
+        'SED': {'IMP': 0xF8},
+        'INC': {'ZP': 0xE6, 'ZPX': 0xF6, 'ABS': 0xEE, 'ABSX': 0xFE},
+        'JMP': {'ABS': 0x4C, 'IND': 0x6C},
+        'JSR': {'ABS': 0x20},
+        'LDA': {'IM': 0xA9, 'ZP': 0xA5, 'ZPX': 0xB5, 'ABS': 0xAD, 'ABSX': 0xBD, 'ABSY': 0xB9, 'INDX': 0xA1,
+                'INDY': 0xB1},
+        'LDX': {'IM': 0xA2, 'ZP': 0xA6, 'ZPY': 0xB6, 'ABS': 0xAE, 'ABSY': 0xBE},
+        'LDY': {'IM': 0xA0, 'ZP': 0xA4, 'ZPX': 0xB4, 'ABS': 0xAC, 'ABSX': 0xBC},
+        'LSR': {'ZP': 0x46, 'ZPX': 0x56, 'ABS': 0x4E, 'ABSX': 0x5E, 'ACC': 0x4A},
+        'NOP': {'IMP': 0xEA},
+        'ORA': {'IM': 0x09, 'ZP': 0x05, 'ZPX': 0x15, 'ABS': 0x0D, 'ABSX': 0x1D, 'ABSY': 0x19, 'INDX': 0x01,
+                'INDY': 0x11},
+        'TAX': {'IMP': 0xAA},
+        'TXA': {'IMP': 0x8A},
+        'DEX': {'IMP': 0xCA},
+        'INX': {'IMP': 0xE8},
+        'TAY': {'IMP': 0xA8},
+        'TYA': {'IMP': 0x98},
+        'DEY': {'IMP': 0x88},
+        'INY': {'IMP': 0xC8},
+        'ROL': {'ZP': 0x26, 'ZPX': 0x36, 'ABS': 0x2E, 'ABSX': 0x3E, 'ACC': 0x2A},
+        'ROR': {'ZP': 0x66, 'ZPX': 0x76, 'ABS': 0x6E, 'ABSX': 0x7E, 'ACC': 0x6A},
+        'RTI': {'IMP': 0x40},
+        'RTS': {'IMP': 0x60},
+        'SBC': {'IM': 0xE9, 'ZP': 0xE5, 'ZPX': 0xF5, 'ABS': 0xED, 'ABSX': 0xFD, 'ABSY': 0xF9, 'INDX': 0xE1,
+                'INDY': 0xF1},
+        'STA': {'ZP': 0x85, 'ZPX': 0x95, 'ABS': 0x8D, 'ABSX': 0x9D, 'ABSY': 0x99, 'INDX': 0x81, 'INDY': 0x91},
+        'TXS': {'IMP': 0x9A},
+        'TSX': {'IMP': 0xBA},
+        'PHA': {'IMP': 0x48},
+        'PLA': {'IMP': 0x68},
+        'PHP': {'IMP': 0x08},
+        'PLP': {'IMP': 0x28},
+        'PHX': {'IMP': 0xDA},
+        'PLX': {'IMP': 0xFA},
+        'PHY': {'IMP': 0x5A},
+        'PLY': {'IMP': 0x7A},
+        'STX': {'ZP': 0x86, 'ZPY': 0x96, 'ABS': 0x8E},
+        'STY': {'ZP': 0x84, 'ZPX': 0x94, 'ABS': 0x8C}
+    }
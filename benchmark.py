@@ -0,0 +1,97 @@
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import time
+
+
+class InstanceBenchmark(object):
+
+    # The program each processor loads.
+    PROGRAM = os.path.join("tests", "test1.out")
+
+    # Timings taken for each rate, keeping the best.
+    REPEATS = 3
+
+    def __init__(self, repository, seconds):
+
+        # The tree whose modules are timed (this one, or another checkout to compare it with), and how long to time each
+        # kind of instance for.
+        self.repository = os.path.abspath(repository)
+        self.seconds = seconds
+
+        # Import the modules from that tree.
+        sys.path.insert(0, self.repository)
+        self.processor = importlib.import_module("processor").Processor
+        self.assembler = importlib.import_module("assembler").Assembler
+        self.disassembler = importlib.import_module("disassembler").Disassembler
+
+        with open(os.path.join(self.repository, self.PROGRAM), mode='r') as infile:
+            self.source = infile.read()
+
+    def rate(self, create):
+
+        best = 0.0
+
+        # Create instances for a share of the time, as many times as it is repeated, and keep the best rate.
+        for _ in range(self.REPEATS):
+
+            count = 0
+            start = time.perf_counter()
+
+            while time.perf_counter() - start < self.seconds / self.REPEATS:
+                create()
+                count += 1
+
+            best = max(best, count / (time.perf_counter() - start))
+
+        return best
+
+    def newprocessor(self):
+
+        # Load the program, keeping the parse messages off the screen.
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.processor(io.StringIO(self.source), None, 0x1000, False, False, False)
+
+    def run(self):
+
+        parent = self.newprocessor()
+
+        # Time each kind of instance.
+        rates = [("Processor()", self.rate(self.newprocessor))]
+
+        if hasattr(parent, "fork"):
+            rates.append(("Processor.fork()", self.rate(parent.fork)))
+
+        rates.append(("Assembler()", self.rate(lambda: self.assembler(io.StringIO(""), None))))
+        rates.append(("Disassembler()", self.rate(lambda: self.disassembler(io.StringIO(""), None, 0x1000, False,
+                                                                            False))))
+
+        return rates
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Measure how many processors, forks, assemblers and disassemblers "
+                                                 "can be created per second.")
+    parser.add_argument("-r", "--repository", action="store", dest="repository",
+                        default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Tree to time (default this one; time another checkout to compare before and after).")
+    parser.add_argument("-t", "--seconds", action="store", dest="seconds", type=float, default=2.0,
+                        help="Seconds to time each kind of instance for.")
+
+    args = parser.parse_args()
+
+    # Print the best rate of each.
+    print("Instances per second in %s (best of %d):" % (args.repository, InstanceBenchmark.REPEATS))
+
+    for name, rate in InstanceBenchmark(args.repository, args.seconds).run():
+        print("  %-20s %10.0f" % (name, rate))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+class Breakpoints(object):
+
+    # Names available to breakpoint conditions, in the order they are passed.
+    CONDITIONARGS = "pc, a, x, y, sp, pf, cy, mem"
+
+    def __init__(self):
+
+        # Addresses that stop execution when the program counter reaches them.
+        self.addresses = set()
+
+        # Compiled conditions for breakpoints that only stop when the condition is true.
+        self.conditions = dict()
+
+        # Watched addresses and whether reads, writes or both are watched.
+        self.watches = dict()
+
+        # Description of the watchpoint hit during the current step (None if no hit).
+        self.hit = None
+
+    @property
+    def armed(self):
+
+        # Check to see if anything could stop execution.
+        return bool(self.addresses or self.watches)
+
+    def addbreakpoint(self, address, condition=None):
+
+        # Check to see if there is a condition.
+        if condition:
+
+            # Compile the condition once into a function of the registers and memory (before anything is added, so a
+            # condition that doesn't compile leaves no breakpoint behind).
+            self.conditions[address] = eval(compile("lambda %s: (%s)" % (self.CONDITIONARGS, condition),
+                                                    "<breakpoint %04x>" % address, "eval"), {})
+
+        else:
+
+            # Remove any previous condition.
+            self.conditions.pop(address, None)
+
+        # Add the address to the set.
+        self.addresses.add(address)
+
+    def removebreakpoint(self, address):
+
+        # Remove the address and any condition.
+        self.addresses.discard(address)
+        self.conditions.pop(address, None)
+
+    def addwatch(self, memory, address, read, write):
+
+        # Save the watch.
+        self.watches[address] = (read, write)
+
+        # Have memory report accesses to the address.
+        memory.setwatchcallback(self.watchhit)
+        memory.addwatch(address, read, write)
+
+    def removewatch(self, memory, address):
+
+        # Remove the watch.
+        self.watches.pop(address, None)
+        memory.removewatch(address)
+
+    def install(self, memory):
+
+        # Have memory report accesses to the watched addresses.
+        memory.setwatchcallback(self.watchhit)
+
+        for address, (read, write) in self.watches.items():
+            memory.addwatch(address, read, write)
+
+    def copy(self):
+
+        # Make a new set of breakpoints with the same contents.
+        other = Breakpoints()
+        other.addresses = set(self.addresses)
+        other.conditions = dict(self.conditions)
+        other.watches = dict(self.watches)
+
+        return other
+
+    def watchhit(self, address, value, iswrite):
+
+        # Note the hit, to be reported at the end of the step.
+        self.hit = "Watchpoint: %s $%04x value %02x" % ("write to" if iswrite else "read from", address, value)
+
+    def shouldbreak(self, processor):
+
+        # Get the condition for this address.
+        condition = self.conditions.get(processor.pc)
+
+        # Unconditional breakpoints always stop.
+        if condition is None:
+            return True
+
+        try:
+
+            # Evaluate the condition against the current state.
+            return condition(processor.pc, processor.a, processor.x, processor.y, processor.sp, processor.pf,
+                             processor.cy, processor._memory.readbyte)
+
+        except Exception as error:
+
+            # A condition that can't be evaluated (an unknown name, say) stops in the debugger rather than the run.
+            print("Breakpoint condition at %04x failed: %s" % (processor.pc, error))
+            return True
+
+    def show(self):
+
+        # Print the breakpoints.
+        for address in sorted(self.addresses):
+            print("Breakpoint at %04x%s" % (address, " (conditional)" if address in self.conditions else ""))
+
+        # Print the watchpoints.
+        for address, (read, write) in sorted(self.watches.items()):
+            print("Watchpoint at %04x (%s%s)" % (address, "r" if read else "", "w" if write else ""))
@@ -0,0 +1,23 @@
+class CPUState(object):
+
+    # The registers live in slots, so the instruction handlers read and write them without an instance dictionary or
+    # a property in between.  Subclasses add their own slots to stay dictionary free.
+    __slots__ = ('pc', 'a', 'x', 'y', 'sp', 'pf', 'cy', 'opcode', 'nextevent')
+
+    def __init__(self):
+
+        # These represent the program counter, a, x, y registers, stack pointer (the low byte of an address in page 1),
+        # processor flags, and a cycle counter.
+        self.pc = 0x0000
+        self.a = 0x00
+        self.x = 0x00
+        self.y = 0x00
+        self.sp = 0xFF
+        self.pf = 0x00
+        self.cy = 0
+
+        # The opcode currently executing.
+        self.opcode = 0x00
+
+        # The cycle count at which scheduled events and interrupts next need looking at.
+        self.nextevent = 0
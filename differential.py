@@ -0,0 +1,511 @@
+import argparse
+import contextlib
+import io
+import random
+import sys
+import instructionspec
+from acia import ACIA, BufferStream
+from processor import Flags, Processor
+
+
+class RandomPrograms(object):
+
+    # Where the programs are loaded, and how long they are.
+    ORIGIN = 0x1000
+    LENGTH = 64
+
+    # Opcodes of the jumps and calls, whose targets are kept inside the program so they run more of it.
+    JUMPS = (0x20, 0x4C)
+
+    # Straight line opcodes for the body of a subroutine called in a loop: immediate and zero page loads, stores,
+    # arithmetic and logic, transfers, increments and flag changes.
+    BODYOPCODES = (0xA9, 0xA2, 0xA0, 0xA5, 0xA6, 0xA4, 0x85, 0x86, 0x84, 0x69, 0x65, 0xE9, 0xE5, 0x29, 0x25, 0x09, 0x05,
+                   0x49, 0x45, 0xC9, 0xC5, 0xE6, 0xC6, 0x06, 0x46, 0x26, 0x66, 0x0A, 0x4A, 0xAA, 0xA8, 0x8A, 0x98, 0xE8,
+                   0xCA, 0xC8, 0x88, 0x18, 0x38, 0xF8, 0xD8, 0xEA)
+
+    # The addressing mode of each opcode.
+    MODES = {opcode: mode for mnemonic, mode, opcode, cycles, pagecross in instructionspec.INSTRUCTIONS}
+
+    # Zero page address of the loop counter, with the subroutines working below it.
+    COUNTER = 0xF0
+
+    def __init__(self, seed, weighted=()):
+
+        # The random source, and the opcodes to pick more often than the rest (each weighted as heavily as all the
+        # valid opcodes together).
+        self.random = random.Random(seed)
+        self.opcodes = sorted(Processor.VALIDOPCODES)
+        self.weighted = sorted(weighted)
+
+    def program(self):
+
+        rng = self.random
+        program = []
+
+        # Mostly valid opcodes, the weighted ones among them, with random operand bytes and the odd invalid opcode.
+        while len(program) < self.LENGTH:
+
+            roll = rng.random()
+
+            if roll < 0.02:
+                program.append(rng.randrange(256))
+
+            elif roll < 0.51 or not self.weighted:
+                program.append(rng.choice(self.opcodes))
+
+            else:
+                program.append(rng.choice(self.weighted))
+
+            # Point jumps and calls back into the program.
+            if program[-1] in self.JUMPS:
+                target = self.ORIGIN + rng.randrange(self.LENGTH)
+                program += [target & 0xFF, target >> 8]
+
+        return program[:self.LENGTH]
+
+    def callloop(self):
+
+        rng = self.random
+        subroutine = self.ORIGIN + 16
+
+        # Call a subroutine until the counter runs out (JSR, DEC counter, BNE back to the JSR, BRK).
+        program = [0x20, subroutine & 0xFF, subroutine >> 8, 0xC6, self.COUNTER, 0xD0, 0xF9, 0x00]
+        program += [0xEA] * (16 - len(program))
+
+        # The subroutine is a straight line of loads, stores and arithmetic on the zero page below the counter, then RTS
+        # (so most calls are made with the same registers and memory, and can be cached).
+        while len(program) < self.LENGTH - 3:
+
+            opcode = rng.choice(self.BODYOPCODES)
+            program.append(opcode)
+
+            if self.MODES[opcode] == "immediate":
+                program.append(rng.randrange(256))
+
+            elif self.MODES[opcode] == "zeropage":
+                program.append(rng.randrange(0x80, self.COUNTER))
+
+        program.append(0x60)
+
+        return program + [0x00] * (self.LENGTH - len(program))
+
+    def pollloop(self):
+
+        rng = self.random
+
+        # Some straight line code, then a loop polling the zero page (LDA, AND #, BEQ back) that can run until the end
+        # of the run, as a program waiting for a device would, then more code.
+        program = []
+
+        while len(program) < 8:
+            program.append(rng.choice(self.BODYOPCODES))
+
+            if self.MODES[program[-1]] in ("immediate", "zeropage"):
+                program.append(rng.randrange(0x80, self.COUNTER))
+
+        program += [0xA5, self.COUNTER + 1, 0x29, rng.randrange(256), 0xF0, 0xFA]
+
+        return program + self.program()[:self.LENGTH - len(program)]
+
+    def deviceloop(self):
+
+        data = ACIA.BASE + ACIA.DATA
+        status = ACIA.BASE + ACIA.STATUS
+
+        # A loop reading serial input until a CR, either reading the data register blind (LDA data, CMP #CR, BNE back) or
+        # waiting on the status first (LDA status, AND #full, BEQ back, LDA data, CMP #CR, BNE back to the status), then
+        # more code.  Each read of the data takes a byte, so neither loop can be skipped as idle.
+        if self.random.random() < 0.5:
+            program = [0xAD, data & 0xFF, data >> 8, 0xC9, 0x0D, 0xD0, 0xF9]
+
+        else:
+            program = [0xAD, status & 0xFF, status >> 8, 0x29, ACIA.RECEIVERFULL, 0xF0, 0xF9,
+                       0xAD, data & 0xFF, data >> 8, 0xC9, 0x0D, 0xD0, 0xF2]
+
+        return program + self.program()[:self.LENGTH - len(program)]
+
+    def script(self):
+
+        # Up to a few hundred bytes of serial input other than CR, then a CR.
+        return bytes(self.random.choice(b"0123456789ABCDEF ") for _ in range(self.random.randrange(400))) + b"\r"
+
+    def registers(self):
+
+        rng = self.random
+
+        # Random A, X, Y and flags (decimal mode in about half), with the stack empty and no cycles run.
+        return (self.ORIGIN, rng.randrange(256), rng.randrange(256), rng.randrange(256), 0xFF,
+                rng.randrange(256) | Flags.UNUSED, 0)
+
+    def zeropage(self):
+
+        # Random zero page contents, for the indirect modes to point with.
+        return [self.random.randrange(256) for _ in range(256)]
+
+    def processor(self, program, registers, zeropage, script=None):
+
+        # Load the program (keeping the parse messages off the screen) and set up the registers and zero page.
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor = Processor(io.StringIO(" ".join("%02X" % value for value in program)), None, self.ORIGIN, False,
+                                  False, False)
+
+        processor.setregisters(registers)
+
+        for address, value in enumerate(zeropage):
+            processor._memory.writebyte(address, value)
+
+        # Connect a serial port with the script already received, if there is one.
+        if script is not None:
+            acia = ACIA(BufferStream(script))
+            acia.attach(processor)
+            acia.receive()
+
+        # Run free (stopping at a BRK instead of entering the debugger).
+        processor.stopbetweensteps = False
+
+        return processor
+
+
+class FastPathCheck(object):
+
+    # The free run modes checked against the plain instruction table: name -> (fusion, idle skipping, call caching).
+    MODES = (("superinstructions and idle loops", True, True, False),
+             ("cached calls", False, True, True))
+
+    # Cycles each program runs for at most.
+    CYCLES = 5000
+
+    def __init__(self, count, seed):
+
+        # The number of programs, weighted towards the fused pairs, branches and calls the fast paths handle.
+        self.count = count
+        weighted = {opcode for firsts, seconds in Processor.FUSEDPAIRS for opcode in firsts + seconds}
+        weighted.update(Processor.BRANCHOPCODES)
+        weighted.update((0x20, 0x60))
+        self.programs = RandomPrograms(seed, weighted)
+
+    def run(self):
+
+        shapes = (self.programs.program, self.programs.callloop, self.programs.pollloop, self.programs.deviceloop)
+
+        # Run each program with the fast paths off, then each way of running with them on (taking turns with random
+        # code, a subroutine called in a loop for the call cache to replay, a polling loop to skip and a loop reading a
+        # device that must not be skipped).
+        for index in range(self.count):
+
+            shape = shapes[index % len(shapes)]
+            program = shape()
+            script = self.programs.script() if shape == self.programs.deviceloop else None
+            registers = self.programs.registers()
+            zeropage = self.programs.zeropage()
+            expected = self.result(self.programs.processor(program, registers, zeropage, script), False, False, False)
+
+            for name, fusion, idleskip, memoize in self.MODES:
+
+                actual = self.result(self.programs.processor(program, registers, zeropage, script), fusion, idleskip,
+                                     memoize)
+
+                if actual != expected:
+                    return False, self.mismatch("program %d with %s" % (index, name), program, expected, actual)
+
+        return True, "fast paths: %d programs match the plain instruction table" % self.count
+
+    def result(self, processor, fusion, idleskip, memoize):
+
+        processor.fusion = fusion
+        processor.idleskip = idleskip
+
+        if memoize:
+            processor.enablememoizer()
+
+        # Stop at a cycle count with a scheduled event, which the fast paths stop at too.
+        processor.interrupts.schedule(self.CYCLES, lambda cycle: setattr(processor, 'nextstep', False))
+
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                processor.runfree()
+
+            error = None
+
+        except Exception as exception:
+            error = "%s: %s" % (type(exception).__name__, exception)
+
+        # Return everything the run could have changed.
+        return (processor.getregisters(), processor.stopbetweensteps, error,
+                bytes(processor._memory.readblock(0, processor.maxmemory)))
+
+    @staticmethod
+    def mismatch(what, program, expected, actual):
+
+        # Describe the first difference.
+        lines = ["fast paths: %s differs" % what,
+                 "  program: " + " ".join("%02X" % value for value in program),
+                 "  expected: PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d, break %s, error %s" %
+                 (expected[0] + expected[1:3]),
+                 "  actual:   PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d, break %s, error %s" %
+                 (actual[0] + actual[1:3])]
+
+        for address, (before, after) in enumerate(zip(expected[3], actual[3])):
+            if before != after:
+                lines.append("  first memory difference at %04x: expected %02x, got %02x" % (address, before, after))
+                break
+
+        return "\n".join(lines)
+
+
+class LockstepCheck(object):
+
+    # Steps each program runs for at most.
+    STEPS = 400
+
+    def __init__(self, count, seed):
+
+        # The number of programs, one per instance.
+        self.count = count
+        self.programs = RandomPrograms(seed)
+
+    def run(self):
+
+        # The lockstep engine needs NumPy, which is optional.
+        try:
+            from lockstep import Lockstep
+
+        except ImportError:
+            return None, "lockstep: skipped (NumPy is not installed)"
+
+        shapes = (self.programs.program, self.programs.callloop, self.programs.pollloop)
+        programs = [shapes[index % len(shapes)]() for index in range(self.count)]
+        registers = [self.programs.registers() for _ in range(self.count)]
+        zeropages = [self.programs.zeropage() for _ in range(self.count)]
+
+        # Start every instance from the same image, then give each its own program, zero page and registers.
+        base = self.programs.processor(programs[0], registers[0], zeropages[0])
+        lockstep = Lockstep.fromprocessor(base, self.count)
+        members = list(range(self.count))
+
+        for offset in range(RandomPrograms.LENGTH):
+            lockstep.poke(members, RandomPrograms.ORIGIN + offset, [program[offset] for program in programs])
+
+        for address in range(256):
+            lockstep.poke(members, address, [zeropage[address] for zeropage in zeropages])
+
+        for index, name in enumerate(("pc", "a", "x", "y", "sp", "pf", "cy")):
+            getattr(lockstep, name)[:] = [instance[index] for instance in registers]
+
+        lockstep.run(self.STEPS)
+
+        # Run each program on its own on the scalar processor and compare.
+        for index in range(self.count):
+
+            processor = self.programs.processor(programs[index], registers[index], zeropages[index])
+            status = self.result(processor, Lockstep)
+
+            expected = (processor.getregisters(), status, bytes(processor._memory.readblock(0, processor.maxmemory)))
+            actual = (lockstep.state(index), int(lockstep.status[index]), lockstep.peek(index, 0, processor.maxmemory))
+
+            if actual != expected:
+                return False, self.mismatch(index, programs[index], expected, actual)
+
+        return True, "lockstep: %d instances match the scalar processor" % self.count
+
+    def result(self, processor, lockstep):
+
+        # Step as the lockstep engine does, returning why the program stopped in its terms.
+        with contextlib.redirect_stdout(io.StringIO()):
+
+            for _ in range(self.STEPS):
+
+                if processor.pc > processor.endaddress:
+                    return lockstep.ENDED
+
+                processor.executestep()
+
+                if processor.stopbetweensteps:
+                    return lockstep.BREAK
+
+                if not processor.nextstep:
+                    return lockstep.INVALID
+
+        return lockstep.RUNNING
+
+    @staticmethod
+    def mismatch(index, program, expected, actual):
+
+        statuses = ("running", "ended", "break", "invalid opcode")
+
+        # Describe the first difference.
+        lines = ["lockstep: instance %d differs" % index,
+                 "  program: " + " ".join("%02X" % value for value in program),
+                 "  scalar:   PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d, %s" %
+                 (expected[0] + (statuses[expected[1]],)),
+                 "  lockstep: PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d, %s" %
+                 (actual[0] + (statuses[actual[1]],))]
+
+        for address, (before, after) in enumerate(zip(expected[2], actual[2])):
+            if before != after:
+                lines.append("  first memory difference at %04x: scalar %02x, lockstep %02x" % (address, before, after))
+                break
+
+        return "\n".join(lines)
+
+
+class ArithmeticCheck(object):
+
+    # ADC and SBC immediate, and the flags they set.
+    ADC = 0x69
+    SBC = 0xE9
+    FLAGS = Flags.CARRY | Flags.ZERO | Flags.OVERFLOW | Flags.NEGATIVE
+
+    # Worked decimal examples from the 6502 documentation, to check the reference itself: (name, A, M, carry, result,
+    # carry out).
+    EXAMPLES = (("ADC", 0x58, 0x46, 1, 0x05, 1), ("ADC", 0x12, 0x34, 0, 0x46, 0), ("ADC", 0x15, 0x26, 0, 0x41, 0),
+                ("ADC", 0x81, 0x92, 0, 0x73, 1), ("SBC", 0x46, 0x12, 1, 0x34, 1), ("SBC", 0x40, 0x13, 1, 0x27, 1),
+                ("SBC", 0x32, 0x02, 0, 0x29, 1), ("SBC", 0x12, 0x21, 1, 0x91, 0), ("SBC", 0x21, 0x34, 1, 0x87, 0))
+
+    def __init__(self, count, seed):
+
+        # Every combination is checked, so there is nothing to pick at random.
+        self.programs = RandomPrograms(seed)
+
+    def run(self):
+
+        # Check the reference against the worked examples.
+        for name, a, m, carry, result, carryout in self.EXAMPLES:
+
+            actual, flags = self.reference(name, a, m, carry, Flags.DECIMAL)
+
+            if (actual, flags & Flags.CARRY) != (result, carryout):
+                return False, ("arithmetic: reference gives %02x for %s %02x, %02x with carry %d (expected %02x)" %
+                               (actual, name, a, m, carry, result))
+
+        processor = self.programs.processor([self.ADC, 0x00], (RandomPrograms.ORIGIN, 0, 0, 0, 0xFF, Flags.UNUSED, 0),
+                                            [0] * 256)
+        read = processor._memory.readbyte
+        write = processor._memory.writebyte
+        operand = RandomPrograms.ORIGIN + 1
+
+        # Run the generated handlers on every A, M and carry, in binary and decimal mode, against the reference.
+        for opcode, name in ((self.ADC, "ADC"), (self.SBC, "SBC")):
+
+            handler = processor.instructions[opcode]
+
+            for decimal in (0, Flags.DECIMAL):
+                for carry in (0, Flags.CARRY):
+                    for a in range(256):
+                        for m in range(256):
+
+                            # Set every other flag, to check they are left alone.
+                            flags = Flags.INTERRUPT | Flags.BREAK | Flags.UNUSED | decimal | carry
+                            processor.a = a
+                            processor.pf = flags
+                            processor.pc = operand
+                            write(operand, m)
+                            handler(processor)
+
+                            result, expected = self.reference(name, a, m, 1 if carry else 0, decimal)
+                            expected |= flags & ~self.FLAGS
+
+                            if processor.a != result or processor.pf != expected or read(operand) != m:
+                                return False, ("arithmetic: %s %s A:%02x M:%02x C:%d gave A:%02x Flags:%02x, expected "
+                                               "A:%02x Flags:%02x" % (name, "decimal" if decimal else "binary", a, m,
+                                                                      1 if carry else 0, processor.a, processor.pf,
+                                                                      result, expected))
+
+        return True, "arithmetic: ADC and SBC match the reference for every operand, carry and mode"
+
+    @staticmethod
+    def reference(name, a, m, carry, decimal):
+
+        # Work out the binary result, and overflow from the signed operands rather than the sign bits.
+        signeda = a - 0x100 if a & 0x80 else a
+        signedm = m - 0x100 if m & 0x80 else m
+
+        if name == "ADC":
+            binary = a + m + carry
+            signed = signeda + signedm + carry
+            carried = binary > 0xFF
+
+        else:
+            binary = a - m - (1 - carry)
+            signed = signeda - signedm - (1 - carry)
+            carried = binary >= 0
+
+        result = binary & 0xFF
+        negative = result & 0x80
+        overflow = not -128 <= signed <= 127
+
+        # Decimal mode on an NMOS 6502 corrects the binary result rather than adding digit by digit: 6 when the low digit
+        # carries past 9 (or borrows), then $60 when the high digit does.  The low digit's correction passes on at most
+        # one carry or borrow.  ADC takes N and V from the result between the two corrections (V by the usual rule for
+        # the operands' signs) and the carry from the end; Z still comes from the binary result, and SBC takes all its
+        # flags from it.
+        if decimal and name == "ADC":
+
+            low = (a & 0x0F) + (m & 0x0F) + carry
+            adjusted = binary + (0x06 if low > 0x09 else 0) - (0x10 if low > 0x19 else 0)
+            negative = adjusted & 0x80
+            overflow = ~(a ^ m) & (a ^ adjusted) & 0x80
+
+            if adjusted >= 0xA0:
+                adjusted += 0x60
+
+            result = adjusted & 0xFF
+            carried = adjusted > 0xFF
+
+        elif decimal:
+
+            low = (a & 0x0F) - (m & 0x0F) - (1 - carry)
+            adjusted = binary - (0x06 if low < 0 else 0) + (0x10 if low < -0x0A else 0)
+
+            if not carried:
+                adjusted -= 0x60
+
+            result = adjusted & 0xFF
+
+        flags = ((Flags.CARRY if carried else 0) | (0 if binary & 0xFF else Flags.ZERO) |
+                 (Flags.OVERFLOW if overflow else 0) | (Flags.NEGATIVE if negative else 0))
+
+        return result, flags
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Check the processor's fast paths against the plain ones on random "
+                                                 "programs.")
+    parser.add_argument("checks", nargs="*", help="Checks to run (%s, default all of them)." % ", ".join(sorted(CHECKS)))
+    parser.add_argument("-n", "--count", action="store", dest="count", type=int, default=200,
+                        help="Number of random programs for each check.")
+    parser.add_argument("-s", "--seed", action="store", dest="seed", type=int, default=0,
+                        help="Seed for the random programs.")
+
+    args = parser.parse_args()
+
+    # Check to see if we know the checks asked for.
+    unknown = sorted(set(args.checks) - set(CHECKS))
+
+    if unknown:
+        parser.error("Unknown check: %s" % ", ".join(unknown))
+
+    results = []
+
+    # Run each check in turn (a check that can't run here passes None).
+    for name in args.checks or sorted(CHECKS):
+
+        passed, message = CHECKS[name](args.count, args.seed).run()
+        print(message)
+        results.append(passed)
+
+    failures = results.count(False)
+    skipped = results.count(None)
+    print("%d of %d checks passed%s" % (len(results) - failures - skipped, len(results),
+                                        ", %d skipped" % skipped if skipped else ""))
+
+    return 1 if failures else 0
+
+
+# The checks by name.
+CHECKS = {"arithmetic": ArithmeticCheck, "fastpaths": FastPathCheck, "lockstep": LockstepCheck}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,7 +25,7 @@ class Disassembler(MFCBase):
     def parsecommands(self):
 
         # Loop through file.
-        for sourceline in super(Disassembler, self).sourcelines:
+        for sourceline in self.sourcelines:
 
             # Split into parts based on spaces.
             lineparts = sourceline.split()
@@ -54,7 +54,7 @@ class Disassembler(MFCBase):
             command = self.opcodes[int(opcode, 16)]
 
             # Call formatting and output functions.
-            command[1](command[0], operand)
+            command[1](self, command[0], operand)
 
     def getopcodeandoperand(self, line, opcodepos):
 
@@ -168,160 +168,165 @@ class Disassembler(MFCBase):
         self.writelinedata(3, "{0} {1:04X}".format(opcode, operand))
 
     def loadhexcodes(self):
-        self.opcodes = {
-            0x00: ("BRK", self.formatasempty),
-            0x01: ("ORA", self.formatasindirectx),
-            0x05: ("ORA", self.formataszeropage),
-            0x06: ("ASL", self.formataszeropage),
-            0x08: ("PHP", self.formatasempty),
-            0x09: ("ORA", self.formatasimmediate),
-            0x0A: ("LDY", self.formatasimmediate),
-            0x0D: ("ORA", self.formatasabsolute),
-            0x0E: ("ASL", self.formatasabsolute),
-            0x10: ("BPL", self.formatasbranch),
-            0x11: ("ORA", self.formatasindirecty),
-            0x15: ("ORA", self.formataszeropagex),
-            0x16: ("ASL", self.formataszeropagex),
-            0x18: ("CLC", self.formatasempty),
-            0x19: ("ORA", self.formatasabsolutey),
-            0x1D: ("ORA", self.formatasabsolutex),
-            0x1E: ("ASL", self.formatasabsolutex),
-            0x20: ("JSR", self.formatasjump),
-            0x21: ("AND", self.formatasindirectx),
-            0x24: ("BIT", self.formataszeropage),
-            0x25: ("AND", self.formataszeropage),
-            0x26: ("ROL", self.formataszeropage),
-            0x28: ("PLP", self.formatasempty),
-            0x29: ("AND", self.formatasimmediate),
-            0x2A: ("ROL", self.formatasempty),
-            0x2C: ("BIT", self.formatasabsolute),
-            0x2D: ("AND", self.formatasabsolute),
-            0x2E: ("ROL", self.formatasabsolute),
-            0x30: ("BMI", self.formatasbranch),
-            0x31: ("AND", self.formatasindirecty),
-            0x35: ("AND", self.formataszeropagex),
-            0x36: ("ROL", self.formataszeropagex),
-            0x38: ("SEC", self.formatasempty),
-            0x39: ("AND", self.formatasabsolutey),
-            0x3D: ("AND", self.formatasabsolutex),
-            0x3E: ("ROL", self.formatasabsolutex),
-            0x40: ("RTI", self.formatasempty),
-            0x41: ("EOR", self.formatasindirectx),
-            0x45: ("EOR", self.formataszeropage),
-            0x46: ("LSR", self.formataszeropage),
-            0x48: ("PHA", self.formatasempty),
-            0x49: ("EOR", self.formatasimmediate),
-            0x4A: ("LSR", self.formatasempty),
-            0x4C: ("JMP", self.formatasjump),
-            0x4D: ("EOR", self.formatasabsolute),
-            0x4E: ("LSR", self.formatasabsolute),
-            0x50: ("BVC", self.formatasbranch),
-            0x51: ("EOR", self.formatasindirecty),
-            0x55: ("EOR", self.formataszeropagex),
-            0x56: ("LSR", self.formataszeropagex),
-            0x58: ("CLI", self.formatasempty),
-            0x59: ("EOR", self.formatasabsolutey),
-            0x5A: ("PHY", self.formatasempty),
-            0x5D: ("EOR", self.formatasabsolutex),
-            0x5E: ("LSR", self.formatasabsolutex),
-            0x60: ("RTS", self.formatasempty),
-            0x61: ("ADC", self.formatasindirectx),
-            0x65: ("ADC", self.formataszeropage),
-            0x66: ("ROR", self.formataszeropage),
-            0x68: ("PLA", self.formatasempty),
-            0x69: ("ADC", self.formatasimmediate),
-            0x6A: ("ROR", self.formatasempty),
-            0x6D: ("ADC", self.formatasabsolute),
-            0x6E: ("ROR", self.formatasabsolute),
-            0x70: ("BVS", self.formatasbranch),
-            0x71: ("ADC", self.formatasindirecty),
-            0x75: ("ADC", self.formataszeropagex),
-            0x76: ("ROR", self.formataszeropagex),
-            0x78: ("SEI", self.formatasempty),
-            0x79: ("ADC", self.formatasabsolutey),
-            0x7A: ("PLY", self.formatasempty),
-            0x7D: ("ADC", self.formatasabsolutex),
-            0x7E: ("ROR", self.formatasabsolutex),
-            0x81: ("STA", self.formatasindirectx),
-            0x84: ("STY", self.formataszeropage),
-            0x85: ("STA", self.formataszeropage),
-            0x86: ("STX", self.formataszeropage),
-            0x88: ("DEY", self.formatasempty),
-            0x8A: ("TXA", self.formatasempty),
-            0x8C: ("STY", self.formatasabsolute),
-            0x8D: ("STA", self.formatasabsolute),
-            0x8E: ("STX", self.formatasabsolute),
-            0x90: ("BCC", self.formatasbranch),
-            0x91: ("STA", self.formatasindirecty),
-            0x94: ("STY", self.formataszeropagex),
-            0x95: ("STA", self.formataszeropagex),
-            0x96: ("STX", self.formataszeropagey),
-            0x98: ("TYA", self.formatasempty),
-            0x99: ("STA", self.formatasabsolutey),
-            0x9A: ("TXS", self.formatasempty),
-            0x9D: ("STA", self.formatasabsolutex),
-            0xA0: ("LDY", self.formatasimmediate),
-            0xA1: ("LDA", self.formatasindirectx),
-            0xA2: ("LDX", self.formatasimmediate),
-            0xA4: ("LDY", self.formataszeropage),
-            0xA5: ("LDA", self.formataszeropage),
-            0xA6: ("LDX", self.formataszeropage),
-            0xA8: ("TAY", self.formatasempty),
-            0xA9: ("LDA", self.formatasimmediate),
-            0xAA: ("TAX", self.formatasempty),
-            0xAC: ("LDY", self.formatasabsolute),
-            0xAD: ("LDA", self.formatasabsolute),
-            0xAE: ("LDX", self.formatasabsolute),
-            0xB0: ("BCS", self.formatasbranch),
-            0xB1: ("LDA", self.formatasindirecty),
-            0xB4: ("LDY", self.formataszeropagex),
-            0xB5: ("LDA", self.formataszeropagex),
-            0xB6: ("LDX", self.formataszeropagey),
-            0xB8: ("CLV", self.formatasempty),
-            0xB9: ("LDA", self.formatasabsolutey),
-            0xBA: ("TSX", self.formatasempty),
-            0xBC: ("LDY", self.formatasabsolutex),
-            0xBD: ("LDA", self.formatasabsolutex),
-            0xBE: ("LDX", self.formatasabsolutey),
-            0xC0: ("CPY", self.formatasimmediate),
-            0xC1: ("CMP", self.formatasindirectx),
-            0xC4: ("CPY", self.formataszeropage),
-            0xC5: ("CMP", self.formataszeropage),
-            0xC6: ("DEC", self.formataszeropage),
-            0xC8: ("INY", self.formatasempty),
-            0xC9: ("CMP", self.formatasimmediate),
-            0xCA: ("DEX", self.formatasempty),
-            0xCC: ("CPY", self.formatasabsolute),
-            0xCD: ("CMP", self.formatasabsolute),
-            0xCE: ("DEC", self.formatasabsolute),
-            0xD0: ("BNE", self.formatasbranch),
-            0xD1: ("CMP", self.formatasindirecty),
-            0xD5: ("CMP", self.formataszeropagex),
-            0xD6: ("DEC", self.formataszeropagex),
-            0xD8: ("CLD", self.formatasempty),
-            0xD9: ("CMP", self.formatasabsolutey),
-            0xDA: ("PHX", self.formatasempty),
-            0xDD: ("CMP", self.formatasabsolutex),
-            0xDE: ("DEC", self.formatasabsolutex),
-            0xE0: ("CPX", self.formatasimmediate),
-            0xE1: ("SBC", self.formatasindirectx),
-            0xE4: ("CPX", self.formataszeropage),
-            0xE5: ("SBC", self.formataszeropage),
-            0xE6: ("INC", self.formataszeropage),
-            0xE8: ("INX", self.formatasempty),
-            0xE9: ("SBC", self.formatasimmediate),
-            0xEA: ("NOP", self.formatasempty),
-            0xEC: ("CPX", self.formatasabsolute),
-            0xED: ("SBC", self.formatasabsolute),
-            0xEE: ("INC", self.formatasabsolute),
-            0xF0: ("BEQ", self.formatasbranch),
-            0xF1: ("SBC", self.formatasindirecty),
-            0xF5: ("SBC", self.formataszeropagex),
-            0xF6: ("INC", self.formataszeropagex),
-            0xF8: ("SED", self.formatasempty),
-            0xF9: ("SBC", self.formatasabsolutey),
-            0xFA: ("PLX", self.formatasempty),
-            0xFD: ("SBC", self.formatasabsolutex),
-            0xFE: ("INC", self.formatasabsolutex),
-            0xFF: (".SYS", self.formatasimmediate)
-        }
+
+        # Share the class's table, which is only ever read.
+        self.opcodes = self.HEXCODES
+
+    # Mnemonic and formatter by opcode (the formatters are plain functions, called with the disassembler).
+    HEXCODES = {
+        0x00: ("BRK", formatasempty),
+        0x01: ("ORA", formatasindirectx),
+        0x05: ("ORA", formataszeropage),
+        0x06: ("ASL", formataszeropage),
+        0x08: ("PHP", formatasempty),
+        0x09: ("ORA", formatasimmediate),
+        0x0A: ("LDY", formatasimmediate),
+        0x0D: ("ORA", formatasabsolute),
+        0x0E: ("ASL", formatasabsolute),
+        0x10: ("BPL", formatasbranch),
+        0x11: ("ORA", formatasindirecty),
+        0x15: ("ORA", formataszeropagex),
+        0x16: ("ASL", formataszeropagex),
+        0x18: ("CLC", formatasempty),
+        0x19: ("ORA", formatasabsolutey),
+        0x1D: ("ORA", formatasabsolutex),
+        0x1E: ("ASL", formatasabsolutex),
+        0x20: ("JSR", formatasjump),
+        0x21: ("AND", formatasindirectx),
+        0x24: ("BIT", formataszeropage),
+        0x25: ("AND", formataszeropage),
+        0x26: ("ROL", formataszeropage),
+        0x28: ("PLP", formatasempty),
+        0x29: ("AND", formatasimmediate),
+        0x2A: ("ROL", formatasempty),
+        0x2C: ("BIT", formatasabsolute),
+        0x2D: ("AND", formatasabsolute),
+        0x2E: ("ROL", formatasabsolute),
+        0x30: ("BMI", formatasbranch),
+        0x31: ("AND", formatasindirecty),
+        0x35: ("AND", formataszeropagex),
+        0x36: ("ROL", formataszeropagex),
+        0x38: ("SEC", formatasempty),
+        0x39: ("AND", formatasabsolutey),
+        0x3D: ("AND", formatasabsolutex),
+        0x3E: ("ROL", formatasabsolutex),
+        0x40: ("RTI", formatasempty),
+        0x41: ("EOR", formatasindirectx),
+        0x45: ("EOR", formataszeropage),
+        0x46: ("LSR", formataszeropage),
+        0x48: ("PHA", formatasempty),
+        0x49: ("EOR", formatasimmediate),
+        0x4A: ("LSR", formatasempty),
+        0x4C: ("JMP", formatasjump),
+        0x4D: ("EOR", formatasabsolute),
+        0x4E: ("LSR", formatasabsolute),
+        0x50: ("BVC", formatasbranch),
+        0x51: ("EOR", formatasindirecty),
+        0x55: ("EOR", formataszeropagex),
+        0x56: ("LSR", formataszeropagex),
+        0x58: ("CLI", formatasempty),
+        0x59: ("EOR", formatasabsolutey),
+        0x5A: ("PHY", formatasempty),
+        0x5D: ("EOR", formatasabsolutex),
+        0x5E: ("LSR", formatasabsolutex),
+        0x60: ("RTS", formatasempty),
+        0x61: ("ADC", formatasindirectx),
+        0x65: ("ADC", formataszeropage),
+        0x66: ("ROR", formataszeropage),
+        0x68: ("PLA", formatasempty),
+        0x69: ("ADC", formatasimmediate),
+        0x6A: ("ROR", formatasempty),
+        0x6D: ("ADC", formatasabsolute),
+        0x6E: ("ROR", formatasabsolute),
+        0x70: ("BVS", formatasbranch),
+        0x71: ("ADC", formatasindirecty),
+        0x75: ("ADC", formataszeropagex),
+        0x76: ("ROR", formataszeropagex),
+        0x78: ("SEI", formatasempty),
+        0x79: ("ADC", formatasabsolutey),
+        0x7A: ("PLY", formatasempty),
+        0x7D: ("ADC", formatasabsolutex),
+        0x7E: ("ROR", formatasabsolutex),
+        0x81: ("STA", formatasindirectx),
+        0x84: ("STY", formataszeropage),
+        0x85: ("STA", formataszeropage),
+        0x86: ("STX", formataszeropage),
+        0x88: ("DEY", formatasempty),
+        0x8A: ("TXA", formatasempty),
+        0x8C: ("STY", formatasabsolute),
+        0x8D: ("STA", formatasabsolute),
+        0x8E: ("STX", formatasabsolute),
+        0x90: ("BCC", formatasbranch),
+        0x91: ("STA", formatasindirecty),
+        0x94: ("STY", formataszeropagex),
+        0x95: ("STA", formataszeropagex),
+        0x96: ("STX", formataszeropagey),
+        0x98: ("TYA", formatasempty),
+        0x99: ("STA", formatasabsolutey),
+        0x9A: ("TXS", formatasempty),
+        0x9D: ("STA", formatasabsolutex),
+        0xA0: ("LDY", formatasimmediate),
+        0xA1: ("LDA", formatasindirectx),
+        0xA2: ("LDX", formatasimmediate),
+        0xA4: ("LDY", formataszeropage),
+        0xA5: ("LDA", formataszeropage),
+        0xA6: ("LDX", formataszeropage),
+        0xA8: ("TAY", formatasempty),
+        0xA9: ("LDA", formatasimmediate),
+        0xAA: ("TAX", formatasempty),
+        0xAC: ("LDY", formatasabsolute),
+        0xAD: ("LDA", formatasabsolute),
+        0xAE: ("LDX", formatasabsolute),
+        0xB0: ("BCS", formatasbranch),
+        0xB1: ("LDA", formatasindirecty),
+        0xB4: ("LDY", formataszeropagex),
+        0xB5: ("LDA", formataszeropagex),
+        0xB6: ("LDX", formataszeropagey),
+        0xB8: ("CLV", formatasempty),
+        0xB9: ("LDA", formatasabsolutey),
+        0xBA: ("TSX", formatasempty),
+        0xBC: ("LDY", formatasabsolutex),
+        0xBD: ("LDA", formatasabsolutex),
+        0xBE: ("LDX", formatasabsolutey),
+        0xC0: ("CPY", formatasimmediate),
+        0xC1: ("CMP", formatasindirectx),
+        0xC4: ("CPY", formataszeropage),
+        0xC5: ("CMP", formataszeropage),
+        0xC6: ("DEC", formataszeropage),
+        0xC8: ("INY", formatasempty),
+        0xC9: ("CMP", formatasimmediate),
+        0xCA: ("DEX", formatasempty),
+        0xCC: ("CPY", formatasabsolute),
+        0xCD: ("CMP", formatasabsolute),
+        0xCE: ("DEC", formatasabsolute),
+        0xD0: ("BNE", formatasbranch),
+        0xD1: ("CMP", formatasindirecty),
+        0xD5: ("CMP", formataszeropagex),
+        0xD6: ("DEC", formataszeropagex),
+        0xD8: ("CLD", formatasempty),
+        0xD9: ("CMP", formatasabsolutey),
+        0xDA: ("PHX", formatasempty),
+        0xDD: ("CMP", formatasabsolutex),
+        0xDE: ("DEC", formatasabsolutex),
+        0xE0: ("CPX", formatasimmediate),
+        0xE1: ("SBC", formatasindirectx),
+        0xE4: ("CPX", formataszeropage),
+        0xE5: ("SBC", formataszeropage),
+        0xE6: ("INC", formataszeropage),
+        0xE8: ("INX", formatasempty),
+        0xE9: ("SBC", formatasimmediate),
+        0xEA: ("NOP", formatasempty),
+        0xEC: ("CPX", formatasabsolute),
+        0xED: ("SBC", formatasabsolute),
+        0xEE: ("INC", formatasabsolute),
+        0xF0: ("BEQ", formatasbranch),
+        0xF1: ("SBC", formatasindirecty),
+        0xF5: ("SBC", formataszeropagex),
+        0xF6: ("INC", formataszeropagex),
+        0xF8: ("SED", formatasempty),
+        0xF9: ("SBC", formatasabsolutey),
+        0xFA: ("PLX", formatasempty),
+        0xFD: ("SBC", formatasabsolutex),
+        0xFE: ("INC", formatasabsolutex),
+        0xFF: (".SYS", formatasimmediate)
+    }
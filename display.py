@@ -0,0 +1,204 @@
+import re
+import struct
+import sys
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TextDisplay(object):
+
+    # Default screen memory address and size.
+    BASE = 0x0400
+    COLUMNS = 40
+    ROWS = 25
+
+    # Each glyph is 8 rows of 8 pixels, one byte per row.
+    GLYPHSIZE = 8
+
+    # A data line of the character rom source: .byte $3c $66 ...
+    BYTELINE = re.compile(r"^\s*\.BYTE\s+(.*)$", re.IGNORECASE)
+
+    def __init__(self, font, columns=COLUMNS, rows=ROWS, foreground=(255, 255, 255), background=(0, 0, 0)):
+
+        # Screen size in cells and pixels.
+        self.columns = columns
+        self.rows = rows
+        self.width = columns * self.GLYPHSIZE
+        self.height = rows * self.GLYPHSIZE
+
+        # Pre-expand every glyph into its RGB pixel rows, so drawing a cell is only copying.
+        glyphs = [bytes(font[index:index + self.GLYPHSIZE]).ljust(self.GLYPHSIZE, b'\x00')
+                  for index in range(0, self.GLYPHSIZE * 256, self.GLYPHSIZE)]
+
+        on = bytes(foreground)
+        off = bytes(background)
+
+        self._lut = [[b''.join(on if line & (0x80 >> bit) else off for bit in range(self.GLYPHSIZE)) for line in glyph]
+                     for glyph in glyphs]
+
+        # The frame as RGB pixels.
+        if numpy is not None:
+            self._lut = numpy.array([[list(line) for line in glyph] for glyph in self._lut], dtype=numpy.uint8).reshape(
+                256, self.GLYPHSIZE, self.GLYPHSIZE, 3)
+            self._frame = numpy.zeros((rows, self.GLYPHSIZE, columns, self.GLYPHSIZE, 3), dtype=numpy.uint8)
+
+        else:
+            self._frame = bytearray(off * (self.width * self.height))
+
+        # The processor whose memory holds the screen, where it starts, and the bitmap of cells written since the last frame.
+        self._processor = None
+        self.base = self.BASE
+        self._dirty = bytearray(b'\x01') * (columns * rows)
+
+    @classmethod
+    def readfont(cls, path):
+
+        font = bytearray()
+
+        # Read the glyph bytes from the .byte lines of the character rom source.
+        with open(path, mode='r') as infile:
+
+            for line in infile:
+
+                match = cls.BYTELINE.match(line)
+
+                if match:
+                    font.extend(int(value.lstrip('$'), 16) for value in match.group(1).split())
+
+        return bytes(font)
+
+    def attach(self, processor, base=None, refresh=None, framecycles=20000):
+
+        # Track writes to the screen memory.
+        self.base = self.BASE if base is None else base
+        self._processor = processor
+        self._dirty = processor._memory.trackwrites(self.base, self.base + self.columns * self.rows - 1)
+
+        # Check to see if the screen should be refreshed as the program runs.
+        if refresh is not None:
+
+            interrupts = processor.interrupts
+
+            def frame(cycle):
+
+                # Draw the frame and schedule the next one.
+                refresh()
+                interrupts.schedule(cycle + framecycles, frame)
+
+            interrupts.schedule(processor.cy + framecycles, frame)
+
+    def update(self):
+
+        dirty = self._dirty
+
+        # Collect the cells written since the last frame (each find is one scan in C, so the loop runs per changed cell).
+        cells = []
+        cell = dirty.find(1)
+
+        while cell != -1:
+            cells.append(cell)
+            dirty[cell] = 0
+            cell = dirty.find(1, cell + 1)
+
+        # Read the codes of the changed cells straight from memory (so watchpoints don't see them).
+        memory = self._processor._memory
+        codes = [memory.readblock(self.base + cell, 1)[0] for cell in cells]
+
+        # Draw the glyphs into the frame.
+        if numpy is not None:
+
+            if cells:
+                rows, columns = numpy.divmod(numpy.array(cells), self.columns)
+                self._frame[rows, :, columns, :] = self._lut[numpy.array(codes)]
+
+        else:
+
+            rowsize = self.width * 3
+            cellsize = self.GLYPHSIZE * 3
+
+            for cell, code in zip(cells, codes):
+
+                # Copy each pixel row of the glyph into place.
+                row, column = divmod(cell, self.columns)
+                offset = row * self.GLYPHSIZE * rowsize + column * cellsize
+
+                for line in self._lut[code]:
+                    self._frame[offset:offset + cellsize] = line
+                    offset += rowsize
+
+        return list(zip(cells, codes))
+
+    def pixels(self):
+
+        # Return the frame as RGB bytes, top row first.
+        return self._frame.tobytes() if numpy is not None else bytes(self._frame)
+
+    def saveppm(self, path):
+
+        self.update()
+
+        # Write a binary PPM.
+        with open(path, mode='wb') as output:
+            output.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+            output.write(self.pixels())
+
+    def savepng(self, path):
+
+        self.update()
+
+        # Put a filter type of 0 (none) before each row of pixels.
+        pixels = self.pixels()
+        rowsize = self.width * 3
+        raw = b''.join(b'\x00' + pixels[offset:offset + rowsize] for offset in range(0, len(pixels), rowsize))
+
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+        # Write an 8 bit RGB PNG.
+        with open(path, mode='wb') as output:
+            output.write(b'\x89PNG\r\n\x1a\n')
+            output.write(chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)))
+            output.write(chunk(b'IDAT', zlib.compress(raw)))
+            output.write(chunk(b'IEND', b''))
+
+    def save(self, path):
+
+        # Files ending in .png get a PNG, anything else gets a PPM.
+        if path.lower().endswith(".png"):
+            self.savepng(path)
+
+        else:
+            self.saveppm(path)
+
+    def writeansi(self, output=None):
+
+        output = sys.stdout if output is None else output
+
+        # Move the cursor to each changed cell and write its character (reversed for codes with bit 7 set).
+        text = []
+
+        for cell, code in self.update():
+
+            row, column = divmod(cell, self.columns)
+            text.append("\x1b[%d;%dH%s%s\x1b[0m" % (row + 1, column + 1, "\x1b[7m" if code & 0x80 else "",
+                                                   self.character(code)))
+
+        output.write(''.join(text))
+        output.flush()
+
+    def character(self, code):
+
+        code &= 0x7F
+
+        # Screen codes 0-31 are @, A-Z and [ \ ] ^ _, and 32-63 match ASCII.  The rest are graphics.
+        if code < 0x20:
+            return chr(code + 0x40)
+
+        if code < 0x40:
+            return chr(code)
+
+        return '#'
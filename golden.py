@@ -0,0 +1,305 @@
+import argparse
+import contextlib
+import glob
+import io
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from acia import ACIA, BufferStream
+from processor import Processor
+
+
+class GoldenTrace(object):
+
+    # Golden trace file: magic, the number of instructions between hashes, then the hashes.  Each hash is chained on
+    # from the one before, so it covers every instruction up to it (and the last covers any instructions left over).
+    MAGIC = b'MFCH'
+    HEADER = struct.Struct('<I')
+
+    # The state hashed after each instruction: pc, a, x, y, sp, flags, cycle count.
+    STATE = struct.Struct('<HBBBBBQ')
+
+    # Hashes are written and read this many at a time, so a trace never sits fully in memory.
+    CHUNK = 65536
+
+    # A line that starts with a program counter (as written with the counter option).
+    COUNTERLINE = re.compile(r"^\s*([0-9A-F]{4})\s", re.IGNORECASE)
+
+    def __init__(self, path, startaddress=None, maxsteps=20000000, interval=1):
+
+        # The program, the most instructions it is run for, and the instructions between hashes.
+        self.path = path
+        self.maxsteps = maxsteps
+        self.interval = interval
+
+        # Scripted input for a 6551 ACIA at its usual address, if the program has a .serial file next to it (the run
+        # ends when the program waits for input after the script).
+        self.script = None
+        scriptpath = os.path.splitext(path)[0] + ".serial"
+
+        if os.path.exists(scriptpath):
+            with open(scriptpath, mode='rb') as script:
+                self.script = script.read()
+
+        # Work out the start address and whether the file has a program counter on each line.
+        self.counterinfile = False
+        self.startaddress = 0x1000 if startaddress is None else startaddress
+
+        with open(path, mode='r') as infile:
+
+            for line in infile:
+
+                if line.strip():
+
+                    match = self.COUNTERLINE.match(line)
+
+                    if match:
+                        self.counterinfile = True
+                        self.startaddress = int(match.group(1), 16) if startaddress is None else startaddress
+
+                    break
+
+    def processor(self):
+
+        # Load the program, keeping the parse messages off the screen (memory skips the counter when includecounter is set).
+        with open(self.path, mode='r') as infile, contextlib.redirect_stdout(io.StringIO()):
+            processor = Processor(infile, None, self.startaddress, self.counterinfile, False, self.counterinfile)
+
+        # Run free (the harness stops at a BRK instead of entering the debugger).
+        processor.stopbetweensteps = False
+
+        # Connect the serial port, keeping its output too.
+        if self.script is not None:
+            ACIA(BufferStream(self.script)).attach(processor)
+
+        return processor
+
+    def state(self, processor):
+
+        # Return the state after an instruction.
+        return (processor.pc & 0xFFFF, processor.a & 0xFF, processor.x & 0xFF, processor.y & 0xFF, processor.sp & 0xFF,
+                processor.pf & 0xFF, processor.cy)
+
+    def chunks(self, processor):
+
+        pack = self.STATE.pack
+        crc32 = zlib.crc32
+        executestep = processor.executestep
+        interval = self.interval
+        steps = 0
+        running = 0
+        ended = False
+
+        # Execute until the program ends, hits a BRK, halts or reaches the step limit, a chunk of hashes at a time.
+        while not ended:
+
+            hashes = array('I')
+
+            while len(hashes) < self.CHUNK:
+
+                # Check to see if the run is over, hashing any instructions since the last hash.
+                if (steps >= self.maxsteps or processor.pc > processor.endaddress or not processor.nextstep or
+                        processor.stopbetweensteps):
+
+                    if steps % interval:
+                        hashes.append(running)
+
+                    ended = True
+                    break
+
+                executestep()
+                steps += 1
+
+                # Hash the state after the instruction into the running hash, keeping it every interval.
+                running = crc32(pack(processor.pc & 0xFFFF, processor.a & 0xFF, processor.x & 0xFF, processor.y & 0xFF,
+                                     processor.sp & 0xFF, processor.pf & 0xFF, processor.cy), running)
+
+                if not steps % interval:
+                    hashes.append(running)
+
+            if hashes:
+                yield hashes
+
+    def record(self, goldenpath):
+
+        processor = self.processor()
+        steps = 0
+
+        # Write the hashes as they are made.
+        with open(goldenpath, mode='wb') as output:
+
+            output.write(self.MAGIC + self.HEADER.pack(self.interval))
+
+            for hashes in self.chunks(processor):
+                hashes.tofile(output)
+                steps += len(hashes)
+
+        return "%s: recorded %d hashes of %d instructions each" % (self.path, steps, self.interval)
+
+    @classmethod
+    def readinterval(cls, goldenpath):
+
+        # Return the instructions between hashes of an existing golden trace (None if it isn't one).
+        with open(goldenpath, mode='rb') as golden:
+
+            if golden.read(len(cls.MAGIC)) != cls.MAGIC:
+                return None
+
+            return cls.HEADER.unpack(golden.read(cls.HEADER.size))[0]
+
+    def compare(self, goldenpath):
+
+        processor = self.processor()
+        steps = 0
+
+        # Read the golden hashes a chunk at a time alongside the run.
+        with open(goldenpath, mode='rb') as golden:
+
+            if golden.read(len(self.MAGIC)) != self.MAGIC:
+                return "%s: %s is not a golden trace" % (self.path, goldenpath)
+
+            # Hash at the same interval as the recording.
+            self.interval = self.HEADER.unpack(golden.read(self.HEADER.size))[0]
+
+            for hashes in self.chunks(processor):
+
+                expected = array('I')
+                expected.frombytes(golden.read(len(hashes) * expected.itemsize))
+
+                # Check the chunk in one go, and only look for the instruction if it differs.
+                if hashes != expected:
+
+                    for index in range(len(hashes)):
+                        if index >= len(expected) or hashes[index] != expected[index]:
+                            break
+
+                    # Replay to the hash to show the states either side of the instructions it covers.
+                    first = (steps + index) * self.interval
+                    before, after = self.replay(first, self.interval)
+                    where = ("at instruction %d" % (first + 1) if self.interval == 1 else
+                             "in instructions %d to %d" % (first + 1, first + self.interval))
+
+                    return ("%s: diverged %s (golden trace has %s)\n"
+                            "  last matching state: PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d\n"
+                            "  divergent state:     PC:%04x A:%02x X:%02x Y:%02x SP:%02x Flags:%02x Cycles:%d" %
+                            ((self.path, where,
+                              "%08x" % expected[index] if index < len(expected) else "ended") + before + after))
+
+                steps += len(hashes)
+
+            # Check to see if the golden trace goes on longer.
+            if golden.read(1):
+                return ("%s: ended after %d instructions but the golden trace goes on" %
+                        (self.path, steps * self.interval))
+
+        return None
+
+    def replay(self, steps, count=1):
+
+        # Run a fresh copy of the program up to a step (the trace itself isn't kept, so it is run again).
+        processor = self.processor()
+
+        for _ in range(steps):
+            processor.executestep()
+
+        # Return the state before the steps and after them (or after the program ends, if that is sooner).
+        before = self.state(processor)
+
+        for _ in range(count):
+
+            if processor.pc > processor.endaddress or not processor.nextstep or processor.stopbetweensteps:
+                break
+
+            processor.executestep()
+
+        return before, self.state(processor)
+
+
+def checkprogram(task):
+
+    # Worker for one program: record or compare against its golden trace.
+    path, goldenpath, record, maxsteps, interval = task
+    trace = GoldenTrace(path, maxsteps=maxsteps)
+
+    try:
+        if record:
+
+            # Keep the interval of an existing trace unless given one.
+            if interval is None and os.path.exists(goldenpath):
+                interval = GoldenTrace.readinterval(goldenpath)
+
+            trace.interval = interval or 1
+
+            return True, trace.record(goldenpath)
+
+        if not os.path.exists(goldenpath):
+            return False, "%s: no golden trace at %s" % (path, goldenpath)
+
+        divergence = trace.compare(goldenpath)
+
+        return divergence is None, divergence or "%s: matches" % path
+
+    except Exception as error:
+        return False, "%s: %s" % (path, error)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Run programs and compare their traces with golden traces.")
+    parser.add_argument("programs", nargs="*", help="Programs to run (hex .out files, default tests/*.out).")
+    parser.add_argument("-r", "--record", action="store_true", dest="record", default=False,
+                        help="Record new golden traces instead of comparing.")
+    parser.add_argument("-g", "--golden", action="store", dest="golden", default=os.path.join("tests", "golden"),
+                        help="Directory holding the golden traces.")
+    parser.add_argument("-j", "--jobs", action="store", dest="jobs", type=int, default=None,
+                        help="Number of programs to run at once (default one per core).")
+    parser.add_argument("-n", "--maxsteps", action="store", dest="maxsteps", type=int, default=20000000,
+                        help="Most instructions to run each program for.")
+    parser.add_argument("-i", "--interval", action="store", dest="interval", type=int, default=None,
+                        help="Instructions between hashes when recording (default that of the existing trace, or 1).")
+
+    args = parser.parse_args()
+
+    # Check to see if we were given an interval that hashes anything.
+    if args.interval is not None and args.interval < 1:
+        parser.error("The interval must be at least 1.")
+
+    # Only text programs with something in them can be run.
+    programs = args.programs
+
+    if not programs:
+
+        programs = []
+
+        for path in sorted(glob.glob(os.path.join("tests", "*.out"))):
+            with open(path, mode='rb') as infile:
+                data = infile.read()
+
+            if data and b'\x00' not in data:
+                programs.append(path)
+
+    if args.record:
+        os.makedirs(args.golden, exist_ok=True)
+
+    tasks = [(path, os.path.join(args.golden, os.path.splitext(os.path.basename(path))[0] + ".trace"), args.record,
+              args.maxsteps, args.interval) for path in programs]
+
+    # Run the programs across the cores.
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(checkprogram, tasks))
+
+    for passed, message in results:
+        print(message)
+
+    failures = sum(1 for passed, message in results if not passed)
+    print("%d of %d programs passed" % (len(results) - failures, len(results)))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+from array import array
+from hooks import Hooks
+
+
+class HistorySegment(object):
+
+    def __init__(self, start, registers, memory, interrupts):
+
+        # The step number at which the snapshot was taken.
+        self.start = start
+
+        # Full snapshot of the registers, memory and scheduled events at the start of the segment.
+        self.registers = registers
+        self.memory = memory
+        self.interrupts = interrupts
+
+        # Journal of the memory writes made during the segment, as parallel arrays of step and address.
+        self.writesteps = array('L')
+        self.writeaddresses = array('L')
+
+
+class History(object):
+
+    def __init__(self, processor, interval=1000, journalsize=100000):
+
+        # The processor being recorded.
+        self._processor = processor
+
+        # Number of steps between full snapshots.
+        self.interval = max(1, interval)
+
+        # Number of steps kept in the journal.  Older snapshots are dropped as new ones are taken.
+        self.journalsize = max(self.interval, journalsize)
+
+        # The recorded segments, oldest first.
+        self._segments = []
+
+        # Total number of steps recorded.
+        self.steps = 0
+
+        # The write journal of the newest segment, and the step at which the next snapshot is due.
+        self._writesteps = None
+        self._writeaddresses = None
+        self._nextsnapshot = 0
+
+        # Take the first snapshot.
+        self.takesnapshot()
+
+        # Start counting steps and watching memory writes.
+        self._processor.addhook(Hooks.INSTRUCTION, self.record)
+        self._processor.addhook(Hooks.MEMORYWRITE, self.recordwrite)
+
+    def detach(self):
+
+        # Stop counting steps and watching memory writes.
+        self._processor.removehook(Hooks.INSTRUCTION, self.record)
+        self._processor.removehook(Hooks.MEMORYWRITE, self.recordwrite)
+
+        # Release the snapshots.
+        self._segments = []
+
+    def takesnapshot(self):
+
+        # Start a new segment with a copy-on-write fork of memory.
+        segment = HistorySegment(self.steps, self._processor.getregisters(), self._processor._memory.fork(),
+                                 self._processor.interrupts.snapshot())
+        self._segments.append(segment)
+
+        # New writes are journalled into this segment.
+        self._writesteps = segment.writesteps
+        self._writeaddresses = segment.writeaddresses
+        self._nextsnapshot = self.steps + self.interval
+
+        # Drop the oldest segment once the journal is full.
+        if len(self._segments) * self.interval > self.journalsize:
+            del self._segments[0]
+
+    def record(self, pc, opcode):
+
+        # Increment step counter.
+        self.steps += 1
+
+        # Check to see if it is time for another snapshot.
+        if self.steps >= self._nextsnapshot:
+            self.takesnapshot()
+
+    def recordwrite(self, address, value):
+
+        # Save the write against the step currently executing.
+        self._writesteps.append(self.steps)
+        self._writeaddresses.append(address)
+
+    def earliest(self):
+
+        # Return the oldest step that can be restored.
+        return self._segments[0].start if self._segments else self.steps
+
+    def restore(self, step):
+
+        # Check to see that we have this step.
+        if not self._segments or step < self.earliest() or step > self.steps:
+            return False
+
+        # Find the newest snapshot at or before the step.
+        index = len(self._segments) - 1
+        while self._segments[index].start > step:
+            index -= 1
+
+        segment = self._segments[index]
+
+        # Discard the history after the snapshot, since it is about to be replayed.
+        del self._segments[index + 1:]
+        del segment.writesteps[:]
+        del segment.writeaddresses[:]
+        self.steps = segment.start
+        self._writesteps = segment.writesteps
+        self._writeaddresses = segment.writeaddresses
+        self._nextsnapshot = segment.start + self.interval
+
+        processor = self._processor
+
+        # Load the processor with a copy of the snapshot, so the snapshot itself is kept (the hooks move to the copy).
+        processor._memory.setreadhook(None)
+        processor._memory.setwritehook(None)
+        processor.setmemory(segment.memory.fork())
+        processor.setregisters(segment.registers)
+        processor.interrupts.restore(segment.interrupts)
+
+        # Replay forward to the step, without the trace or watchpoints seeing steps they have already seen.  This
+        # journals the writes again as it goes.
+        tracer = processor.tracer
+        processor.tracer = None
+        processor._memory.setwatchcallback(None)
+
+        try:
+            while self.steps < step:
+                processor.executestep()
+
+        finally:
+            processor.tracer = tracer
+            processor.breakpoints.install(processor._memory)
+
+        return True
+
+    def stepback(self, count):
+
+        # Restore the state from count steps ago (or the oldest we have).
+        return self.restore(max(self.earliest(), self.steps - count))
+
+    def lastwrite(self, address):
+
+        # Search the writes backwards, newest first.
+        for segment in reversed(self._segments):
+
+            addresses = segment.writeaddresses
+
+            for position in range(len(addresses) - 1, -1, -1):
+
+                # Check to see if this write was to the address.
+                if addresses[position] == address:
+                    return segment.writesteps[position]
+
+        return None
+
+    def runbacktowrite(self, address):
+
+        # Find the last step that wrote to the address.
+        step = self.lastwrite(address)
+
+        # Restore to just before that step executed.
+        return step is not None and self.restore(step)
@@ -0,0 +1,59 @@
+class Hooks(object):
+
+    # The kinds of hook, and what their callbacks are called with:
+    #   instruction  (pc, opcode) after each instruction
+    #   memoryread   (address, value) after each read of memory
+    #   memorywrite  (address, value) before each write to memory is stored
+    #   jsr          (address, target) after each subroutine call, with the address of the JSR
+    #   interrupt    (vector) as an IRQ or NMI handler is entered
+    INSTRUCTION = "instruction"
+    MEMORYREAD = "memoryread"
+    MEMORYWRITE = "memorywrite"
+    JSR = "jsr"
+    INTERRUPT = "interrupt"
+
+    KINDS = (INSTRUCTION, MEMORYREAD, MEMORYWRITE, JSR, INTERRUPT)
+
+    def __init__(self):
+
+        # The callbacks of each kind, in the order they were added (held as tuples, so the processor can loop over
+        # them without copying, and an empty one costs nothing to check).
+        self.instruction = ()
+        self.memoryread = ()
+        self.memorywrite = ()
+        self.jsr = ()
+        self.interrupt = ()
+
+    def add(self, kind, callback):
+
+        # Check to see if this is a known kind.
+        if kind not in self.KINDS:
+            raise ValueError("Hook kind must be one of %s." % ", ".join(self.KINDS))
+
+        setattr(self, kind, getattr(self, kind) + (callback,))
+
+    def remove(self, kind, callback):
+
+        # Drop the callback (it is fine if it was never added).
+        setattr(self, kind, tuple(hook for hook in getattr(self, kind) if hook != callback))
+
+    def everystep(self):
+
+        # Check to see if anything needs to see each instruction, or each access it makes, as it happens.
+        return bool(self.instruction or self.memoryread or self.memorywrite or self.jsr)
+
+    def dispatcher(self, kind):
+
+        callbacks = getattr(self, kind)
+
+        # No callbacks needs nothing, and one can be called directly.
+        if len(callbacks) < 2:
+            return callbacks[0] if callbacks else None
+
+        def dispatch(*arguments):
+
+            # Call each callback in turn.
+            for callback in callbacks:
+                callback(*arguments)
+
+        return dispatch
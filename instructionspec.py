@@ -0,0 +1,564 @@
+import linecache
+import re
+
+# Addressing modes: name -> (instruction length, source that works out the operand address, flag for indexed modes
+# that can cross a page).  The source runs with pc holding the address of the first operand byte and read reading memory.
+# Addresses wrap the way the 6502's do: indexing past $FFFF wraps to the bottom of memory, and zero page pointers and
+# indexing stay in the zero page, so every address is in range without checking it.  The operand bytes wrap past $FFFF
+# too, since pc is one past the opcode (and not wrapped itself, so a program running off the top of memory still ends).
+MODES = {
+    "implied": (1, (), False),
+    "accumulator": (1, (), False),
+    "relative": (2, (), False),
+    "immediate": (2, (
+        "address = pc & 0xFFFF",
+    ), False),
+    "zeropage": (2, (
+        "address = read(pc & 0xFFFF)",
+    ), False),
+    "zeropagex": (2, (
+        "address = (read(pc & 0xFFFF) + self.x) & 0xFF",
+    ), False),
+    "zeropagey": (2, (
+        "address = (read(pc & 0xFFFF) + self.y) & 0xFF",
+    ), False),
+    "absolute": (3, (
+        "address = read(pc & 0xFFFF) + (read((pc + 1) & 0xFFFF) << 8)",
+    ), False),
+    "absolutex": (3, (
+        "base = read(pc & 0xFFFF) + (read((pc + 1) & 0xFFFF) << 8)",
+        "address = (base + self.x) & 0xFFFF",
+    ), True),
+    "absolutey": (3, (
+        "base = read(pc & 0xFFFF) + (read((pc + 1) & 0xFFFF) << 8)",
+        "address = (base + self.y) & 0xFFFF",
+    ), True),
+    "indirect": (3, (
+        "pointer = read(pc & 0xFFFF) + (read((pc + 1) & 0xFFFF) << 8)",
+        "address = read(pointer) + (read((pointer + 1) & 0xFFFF) << 8)",
+    ), False),
+    "indexedindirect": (2, (
+        "pointer = (read(pc & 0xFFFF) + self.x) & 0xFF",
+        "address = read(pointer) + (read((pointer + 1) & 0xFF) << 8)",
+    ), False),
+    "indirectindexed": (2, (
+        "pointer = read(pc & 0xFFFF)",
+        "base = read(pointer) + (read((pointer + 1) & 0xFF) << 8)",
+        "address = (base + self.y) & 0xFFFF",
+    ), True),
+}
+
+
+def setnz(value):
+
+    # Source that sets the zero and negative flags from a value.
+    return "self.pf = (self.pf & ~({ZERO} | {NEGATIVE})) | (%s & {NEGATIVE}) | (0 if %s else {ZERO})" % (value, value)
+
+
+def arithmetic(table):
+
+    # Source that looks up A op M with the carry in a table from the alu module, in decimal mode (bit 3) or not, and
+    # sets A and the four flags the entry holds above it.
+    return (
+        "pf = self.pf",
+        "entry = %s[((pf & {DECIMAL}) << 14) | ((pf & {CARRY}) << 16) | (self.a << 8) | value]" % table,
+        "self.a = entry & 0xFF",
+        "self.pf = (pf & ~({CARRY} | {ZERO} | {OVERFLOW} | {NEGATIVE})) | (entry >> 8)",
+    )
+
+
+# Operations: mnemonic -> (kind, source).  The kind says what the generator wraps around the source:
+#   read    the operand is read into value first
+#   write   the source stores to address
+#   modify  value is read from the operand (or the accumulator) first and written back after
+#   implied the source works on registers only
+#   jump    the source sets pc itself
+#   branch  the source is the condition for taking the branch
+OPERATIONS = {
+    "ADC": ("read", arithmetic("ADCTABLE")),
+    "AND": ("read", (
+        "a = self.a & value",
+        "self.a = a",
+        setnz("a"),
+    )),
+    "ASL": ("modify", (
+        "self.pf = (self.pf & ~{CARRY}) | ((value >> 7) & {CARRY})",
+        "value = (value << 1) & 0xFF",
+        setnz("value"),
+    )),
+    "BCC": ("branch", "not (self.pf & {CARRY})"),
+    "BCS": ("branch", "self.pf & {CARRY}"),
+    "BEQ": ("branch", "self.pf & {ZERO}"),
+    "BIT": ("read", (
+        "self.pf = ((self.pf & ~({ZERO} | {OVERFLOW} | {NEGATIVE})) | (value & ({OVERFLOW} | {NEGATIVE})) |",
+        "           (0 if self.a & value else {ZERO}))",
+    )),
+    "BMI": ("branch", "self.pf & {NEGATIVE}"),
+    "BNE": ("branch", "not (self.pf & {ZERO})"),
+    "BPL": ("branch", "not (self.pf & {NEGATIVE})"),
+    "BRK": ("jump", (
+        "self.pc = pc + 1",
+        "self.pf |= {BREAK}",
+        "self.pushstack16(self.pc)",
+        "self.pushstack8(self.pf)",
+        "self.pf |= {INTERRUPT}",
+        "self.pc = self._memory.readtwobytes({IRQ_ADDR_LOW})",
+        "self.stopbetweensteps = True",
+    )),
+    "BVC": ("branch", "not (self.pf & {OVERFLOW})"),
+    "BVS": ("branch", "self.pf & {OVERFLOW}"),
+    "CLC": ("implied", (
+        "self.pf &= ~{CARRY}",
+    )),
+    "CLD": ("implied", (
+        "self.pf &= ~{DECIMAL}",
+    )),
+    "CLI": ("implied", (
+        "self.pf &= ~{INTERRUPT}",
+        "self.interrupts.unmasked()",
+    )),
+    "CLV": ("implied", (
+        "self.pf &= ~{OVERFLOW}",
+    )),
+    "CMP": ("read", (
+        "result = self.a - value",
+        "self.pf = ((self.pf & ~({CARRY} | {ZERO} | {NEGATIVE})) | (result & {NEGATIVE}) | (0 if result else {ZERO}) |",
+        "           (0 if result < 0 else {CARRY}))",
+    )),
+    "CPX": ("read", (
+        "result = self.x - value",
+        "self.pf = ((self.pf & ~({CARRY} | {ZERO} | {NEGATIVE})) | (result & {NEGATIVE}) | (0 if result else {ZERO}) |",
+        "           (0 if result < 0 else {CARRY}))",
+    )),
+    "CPY": ("read", (
+        "result = self.y - value",
+        "self.pf = ((self.pf & ~({CARRY} | {ZERO} | {NEGATIVE})) | (result & {NEGATIVE}) | (0 if result else {ZERO}) |",
+        "           (0 if result < 0 else {CARRY}))",
+    )),
+    "DEC": ("modify", (
+        "value = (value - 1) & 0xFF",
+        setnz("value"),
+    )),
+    "DEX": ("implied", (
+        "x = (self.x - 1) & 0xFF",
+        "self.x = x",
+        setnz("x"),
+    )),
+    "DEY": ("implied", (
+        "y = (self.y - 1) & 0xFF",
+        "self.y = y",
+        setnz("y"),
+    )),
+    "EOR": ("read", (
+        "a = self.a ^ value",
+        "self.a = a",
+        setnz("a"),
+    )),
+    "INC": ("modify", (
+        "value = (value + 1) & 0xFF",
+        setnz("value"),
+    )),
+    "INX": ("implied", (
+        "x = (self.x + 1) & 0xFF",
+        "self.x = x",
+        setnz("x"),
+    )),
+    "INY": ("implied", (
+        "y = (self.y + 1) & 0xFF",
+        "self.y = y",
+        setnz("y"),
+    )),
+    "JMP": ("jump", (
+        "self.pc = address",
+    )),
+    "JSR": ("jump", (
+        "self.pushstack16((pc + 1) & 0xFFFF)",
+        "self.pc = address",
+    )),
+    "LDA": ("read", (
+        "self.a = value",
+        setnz("value"),
+    )),
+    "LDX": ("read", (
+        "self.x = value",
+        setnz("value"),
+    )),
+    "LDY": ("read", (
+        "self.y = value",
+        setnz("value"),
+    )),
+    "LSR": ("modify", (
+        "self.pf = (self.pf & ~{CARRY}) | (value & {CARRY})",
+        "value >>= 1",
+        setnz("value"),
+    )),
+    "NOP": ("implied", (
+        "pass",
+    )),
+    "ORA": ("read", (
+        "a = self.a | value",
+        "self.a = a",
+        setnz("a"),
+    )),
+    "PHA": ("implied", (
+        "self.pushstack8(self.a)",
+    )),
+    "PHP": ("implied", (
+        "self.pushstack8(self.pf)",
+    )),
+    "PHX": ("implied", (
+        "self.pushstack8(self.x)",
+    )),
+    "PHY": ("implied", (
+        "self.pushstack8(self.y)",
+    )),
+    "PLA": ("implied", (
+        "a = self.popstack8()",
+        "self.a = a",
+        setnz("a"),
+    )),
+    "PLP": ("implied", (
+        "self.pf = self.popstack8()",
+        "if not self.pf & {INTERRUPT}:",
+        "    self.interrupts.unmasked()",
+    )),
+    "PLX": ("implied", (
+        "x = self.popstack8()",
+        "self.x = x",
+        setnz("x"),
+    )),
+    "PLY": ("implied", (
+        "y = self.popstack8()",
+        "self.y = y",
+        setnz("y"),
+    )),
+    "ROL": ("modify", (
+        "value = (value << 1) | (self.pf & {CARRY})",
+        "self.pf = (self.pf & ~{CARRY}) | (value >> 8)",
+        "value &= 0xFF",
+        setnz("value"),
+    )),
+    "ROR": ("modify", (
+        "value |= (self.pf & {CARRY}) << 8",
+        "self.pf = (self.pf & ~{CARRY}) | (value & {CARRY})",
+        "value >>= 1",
+        setnz("value"),
+    )),
+    "RTI": ("jump", (
+        "self.pf = self.popstack8()",
+        "self.pc = self.popstack16()",
+        "if not self.pf & {INTERRUPT}:",
+        "    self.interrupts.unmasked()",
+    )),
+    "RTS": ("jump", (
+        "self.pc = (self.popstack16() + 1) & 0xFFFF",
+    )),
+    "SBC": ("read", arithmetic("SBCTABLE")),
+    "SEC": ("implied", (
+        "self.pf |= {CARRY}",
+    )),
+    "SED": ("implied", (
+        "self.pf |= {DECIMAL}",
+    )),
+    "SEI": ("implied", (
+        "self.pf |= {INTERRUPT}",
+    )),
+    "STA": ("write", (
+        "write(address, self.a)",
+    )),
+    "STX": ("write", (
+        "write(address, self.x)",
+    )),
+    "STY": ("write", (
+        "write(address, self.y)",
+    )),
+    "TAX": ("implied", (
+        "x = self.a",
+        "self.x = x",
+        setnz("x"),
+    )),
+    "TAY": ("implied", (
+        "y = self.a",
+        "self.y = y",
+        setnz("y"),
+    )),
+    "TSX": ("implied", (
+        "x = self.sp",
+        "self.x = x",
+        setnz("x"),
+    )),
+    "TXA": ("implied", (
+        "a = self.x",
+        "self.a = a",
+        setnz("a"),
+    )),
+    "TXS": ("implied", (
+        "self.sp = self.x",
+    )),
+    "TYA": ("implied", (
+        "a = self.y",
+        "self.a = a",
+        setnz("a"),
+    )),
+}
+
+# Instructions: (mnemonic, addressing mode, opcode, cycles, extra cycles when indexing crosses a page).
+INSTRUCTIONS = (
+    ("ADC", "immediate", 0x69, 2, 0),
+    ("ADC", "zeropage", 0x65, 3, 0),
+    ("ADC", "zeropagex", 0x75, 4, 0),
+    ("ADC", "absolute", 0x6D, 4, 0),
+    ("ADC", "absolutex", 0x7D, 4, 1),
+    ("ADC", "absolutey", 0x79, 4, 1),
+    ("ADC", "indexedindirect", 0x61, 6, 0),
+    ("ADC", "indirectindexed", 0x71, 5, 1),
+    ("AND", "immediate", 0x29, 2, 0),
+    ("AND", "zeropage", 0x25, 3, 0),
+    ("AND", "zeropagex", 0x35, 4, 0),
+    ("AND", "absolute", 0x2D, 4, 0),
+    ("AND", "absolutex", 0x3D, 4, 1),
+    ("AND", "absolutey", 0x39, 4, 1),
+    ("AND", "indexedindirect", 0x21, 6, 0),
+    ("AND", "indirectindexed", 0x31, 5, 1),
+    ("ASL", "accumulator", 0x0A, 2, 0),
+    ("ASL", "zeropage", 0x06, 5, 0),
+    ("ASL", "zeropagex", 0x16, 6, 0),
+    ("ASL", "absolute", 0x0E, 6, 0),
+    ("ASL", "absolutex", 0x1E, 7, 0),
+    ("BCC", "relative", 0x90, 2, 0),
+    ("BCS", "relative", 0xB0, 2, 0),
+    ("BEQ", "relative", 0xF0, 2, 0),
+    ("BIT", "zeropage", 0x24, 3, 0),
+    ("BIT", "absolute", 0x2C, 4, 0),
+    ("BMI", "relative", 0x30, 2, 0),
+    ("BNE", "relative", 0xD0, 2, 0),
+    ("BPL", "relative", 0x10, 2, 0),
+    ("BRK", "implied", 0x00, 7, 0),
+    ("BVC", "relative", 0x50, 2, 0),
+    ("BVS", "relative", 0x70, 2, 0),
+    ("CLC", "implied", 0x18, 2, 0),
+    ("CLD", "implied", 0xD8, 2, 0),
+    ("CLI", "implied", 0x58, 2, 0),
+    ("CLV", "implied", 0xB8, 2, 0),
+    ("CMP", "immediate", 0xC9, 2, 0),
+    ("CMP", "zeropage", 0xC5, 3, 0),
+    ("CMP", "zeropagex", 0xD5, 4, 0),
+    ("CMP", "absolute", 0xCD, 4, 0),
+    ("CMP", "absolutex", 0xDD, 4, 1),
+    ("CMP", "absolutey", 0xD9, 4, 1),
+    ("CMP", "indexedindirect", 0xC1, 6, 0),
+    ("CMP", "indirectindexed", 0xD1, 5, 1),
+    ("CPX", "immediate", 0xE0, 2, 0),
+    ("CPX", "zeropage", 0xE4, 3, 0),
+    ("CPX", "absolute", 0xEC, 4, 0),
+    ("CPY", "immediate", 0xC0, 2, 0),
+    ("CPY", "zeropage", 0xC4, 3, 0),
+    ("CPY", "absolute", 0xCC, 4, 0),
+    ("DEC", "zeropage", 0xC6, 5, 0),
+    ("DEC", "zeropagex", 0xD6, 6, 0),
+    ("DEC", "absolute", 0xCE, 6, 0),
+    ("DEC", "absolutex", 0xDE, 7, 0),
+    ("DEX", "implied", 0xCA, 2, 0),
+    ("DEY", "implied", 0x88, 2, 0),
+    ("EOR", "immediate", 0x49, 2, 0),
+    ("EOR", "zeropage", 0x45, 3, 0),
+    ("EOR", "zeropagex", 0x55, 4, 0),
+    ("EOR", "absolute", 0x4D, 4, 0),
+    ("EOR", "absolutex", 0x5D, 4, 1),
+    ("EOR", "absolutey", 0x59, 4, 1),
+    ("EOR", "indexedindirect", 0x41, 6, 0),
+    ("EOR", "indirectindexed", 0x51, 5, 1),
+    ("INC", "zeropage", 0xE6, 5, 0),
+    ("INC", "zeropagex", 0xF6, 6, 0),
+    ("INC", "absolute", 0xEE, 6, 0),
+    ("INC", "absolutex", 0xFE, 7, 0),
+    ("INX", "implied", 0xE8, 2, 0),
+    ("INY", "implied", 0xC8, 2, 0),
+    ("JMP", "absolute", 0x4C, 3, 0),
+    ("JMP", "indirect", 0x6C, 5, 0),
+    ("JSR", "absolute", 0x20, 6, 0),
+    ("LDA", "immediate", 0xA9, 2, 0),
+    ("LDA", "zeropage", 0xA5, 3, 0),
+    ("LDA", "zeropagex", 0xB5, 4, 0),
+    ("LDA", "absolute", 0xAD, 4, 0),
+    ("LDA", "absolutex", 0xBD, 4, 1),
+    ("LDA", "absolutey", 0xB9, 4, 1),
+    ("LDA", "indexedindirect", 0xA1, 6, 0),
+    ("LDA", "indirectindexed", 0xB1, 5, 1),
+    ("LDX", "immediate", 0xA2, 2, 0),
+    ("LDX", "zeropage", 0xA6, 3, 0),
+    ("LDX", "zeropagey", 0xB6, 4, 0),
+    ("LDX", "absolute", 0xAE, 4, 0),
+    ("LDX", "absolutey", 0xBE, 4, 1),
+    ("LDY", "immediate", 0xA0, 2, 0),
+    ("LDY", "zeropage", 0xA4, 3, 0),
+    ("LDY", "zeropagex", 0xB4, 4, 0),
+    ("LDY", "absolute", 0xAC, 4, 0),
+    ("LDY", "absolutex", 0xBC, 4, 1),
+    ("LSR", "accumulator", 0x4A, 2, 0),
+    ("LSR", "zeropage", 0x46, 5, 0),
+    ("LSR", "zeropagex", 0x56, 6, 0),
+    ("LSR", "absolute", 0x4E, 6, 0),
+    ("LSR", "absolutex", 0x5E, 7, 0),
+    ("NOP", "implied", 0xEA, 2, 0),
+    ("ORA", "immediate", 0x09, 2, 0),
+    ("ORA", "zeropage", 0x05, 3, 0),
+    ("ORA", "zeropagex", 0x15, 4, 0),
+    ("ORA", "absolute", 0x0D, 4, 0),
+    ("ORA", "absolutex", 0x1D, 4, 1),
+    ("ORA", "absolutey", 0x19, 4, 1),
+    ("ORA", "indexedindirect", 0x01, 6, 0),
+    ("ORA", "indirectindexed", 0x11, 5, 1),
+    ("PHA", "implied", 0x48, 3, 0),
+    ("PHP", "implied", 0x08, 3, 0),
+    ("PHX", "implied", 0xDA, 3, 0),
+    ("PHY", "implied", 0x5A, 3, 0),
+    ("PLA", "implied", 0x68, 4, 0),
+    ("PLP", "implied", 0x28, 4, 0),
+    ("PLX", "implied", 0xFA, 4, 0),
+    ("PLY", "implied", 0x7A, 4, 0),
+    ("ROL", "accumulator", 0x2A, 2, 0),
+    ("ROL", "zeropage", 0x26, 5, 0),
+    ("ROL", "zeropagex", 0x36, 6, 0),
+    ("ROL", "absolute", 0x2E, 6, 0),
+    ("ROL", "absolutex", 0x3E, 7, 0),
+    ("ROR", "accumulator", 0x6A, 2, 0),
+    ("ROR", "zeropage", 0x66, 5, 0),
+    ("ROR", "zeropagex", 0x76, 6, 0),
+    ("ROR", "absolute", 0x6E, 6, 0),
+    ("ROR", "absolutex", 0x7E, 7, 0),
+    ("RTI", "implied", 0x40, 6, 0),
+    ("RTS", "implied", 0x60, 6, 0),
+    ("SBC", "immediate", 0xE9, 2, 0),
+    ("SBC", "zeropage", 0xE5, 3, 0),
+    ("SBC", "zeropagex", 0xF5, 4, 0),
+    ("SBC", "absolute", 0xED, 4, 0),
+    ("SBC", "absolutex", 0xFD, 4, 1),
+    ("SBC", "absolutey", 0xF9, 4, 1),
+    ("SBC", "indexedindirect", 0xE1, 6, 0),
+    ("SBC", "indirectindexed", 0xF1, 5, 1),
+    ("SEC", "implied", 0x38, 2, 0),
+    ("SED", "implied", 0xF8, 2, 0),
+    ("SEI", "implied", 0x78, 2, 0),
+    ("STA", "zeropage", 0x85, 3, 0),
+    ("STA", "zeropagex", 0x95, 4, 0),
+    ("STA", "absolute", 0x8D, 4, 0),
+    ("STA", "absolutex", 0x9D, 5, 0),
+    ("STA", "absolutey", 0x99, 5, 0),
+    ("STA", "indexedindirect", 0x81, 6, 0),
+    ("STA", "indirectindexed", 0x91, 6, 0),
+    ("STX", "zeropage", 0x86, 3, 0),
+    ("STX", "zeropagey", 0x96, 4, 0),
+    ("STX", "absolute", 0x8E, 4, 0),
+    ("STY", "zeropage", 0x84, 3, 0),
+    ("STY", "zeropagex", 0x94, 4, 0),
+    ("STY", "absolute", 0x8C, 4, 0),
+    ("TAX", "implied", 0xAA, 2, 0),
+    ("TAY", "implied", 0xA8, 2, 0),
+    ("TSX", "implied", 0xBA, 2, 0),
+    ("TXA", "implied", 0x8A, 2, 0),
+    ("TXS", "implied", 0x9A, 2, 0),
+    ("TYA", "implied", 0x98, 2, 0),
+)
+
+# Extra cycles for a taken branch, indexed by whether it lands in a different page.
+BRANCHTAKEN = (1, 2)
+
+
+def cycletables():
+
+    # Build the base and page crossing cycles by opcode (0 for opcodes with no instruction).
+    basecycles = [0] * 256
+    pagecrosscycles = [0] * 256
+
+    for mnemonic, mode, opcode, cycles, pagecross in INSTRUCTIONS:
+        basecycles[opcode] = cycles
+        pagecrosscycles[opcode] = pagecross
+
+    return basecycles, pagecrosscycles
+
+
+def handlername(mnemonic, mode):
+
+    # Implied and relative instructions are named by mnemonic alone (handleCLC), the rest by mode too (handleLDAzeropage).
+    return "handle" + mnemonic + ("" if mode in ("implied", "relative") else mode)
+
+
+def handlersource(mnemonic, mode, opcode, cycles, pagecross):
+
+    length, addresssource, indexed = MODES[mode]
+    kind, operation = OPERATIONS[mnemonic]
+
+    # Work out the operand address.
+    lines = list(addresssource)
+
+    # Indexed modes take the extra cycles when the index carries into the high byte.
+    if indexed and pagecross:
+        lines += ["if (base ^ address) & 0xFF00:",
+                  "    self.cy += %d" % pagecross]
+
+    # A branch skips its offset, or adds the signed offset and takes the extra cycles.
+    if kind == "branch":
+
+        lines += ["if %s:" % operation,
+                  "    offset = read(pc & 0xFFFF)",
+                  "    target = (pc + 1 + ((offset ^ 0x80) - 0x80)) & 0xFFFF",
+                  "    self.pc = target",
+                  "    self.cy += %d if ((pc + 1) ^ target) & 0xFF00 else %d" % (BRANCHTAKEN[1], BRANCHTAKEN[0]),
+                  "else:",
+                  "    self.pc = pc + 1"]
+
+    else:
+
+        # Fetch the operand.
+        if kind == "read" or kind == "modify":
+            lines.append("value = self.a" if mode == "accumulator" else "value = read(address)")
+
+        lines += operation
+
+        # Store the result.
+        if kind == "modify":
+            lines.append("self.a = value" if mode == "accumulator" else "write(address, value)")
+
+        # Step over the operand (the opcode was stepped over by executestep, and jumps set pc themselves).
+        if kind != "jump" and length > 1:
+            lines.append("self.pc = pc + %d" % (length - 1))
+
+    # Look up the memory functions and pc once if they are used more than once, otherwise go straight to them.
+    body = "\n".join(lines)
+    prologue = ["# %s %s: opcode %02X, length %d, %d cycles%s." % (mnemonic, mode, opcode, length, cycles,
+                                                                 " (+%d crossing a page)" % pagecross if pagecross else "")]
+
+    for name, function in (("read", "readbyte"), ("write", "writebyte")):
+
+        pattern = r"(?<![\w.])%s\(" % name
+        uses = len(re.findall(pattern, body))
+
+        if uses > 1:
+            prologue.append("%s = self._memory.%s" % (name, function))
+
+        elif uses:
+            body = re.sub(pattern, "self._memory.%s(" % function, body)
+
+    if re.search(r"(?<![\w.])pc\b", body):
+        prologue.append("pc = self.pc")
+
+    return "def %s(self):\n%s\n" % (handlername(mnemonic, mode),
+                                    "\n".join("    " + line for line in prologue + body.split("\n")))
+
+
+def generate(constants, names=None):
+
+    # Write the source of every handler, filling in the flag and vector constants (names are globals the handlers use,
+    # such as the arithmetic tables).
+    source = "\n\n".join(handlersource(*instruction) for instruction in INSTRUCTIONS).format_map(constants)
+
+    # Keep the source where tracebacks and the debugger can find it.
+    filename = "<instructionspec>"
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+    namespace = dict(names or {})
+    exec(compile(source, filename, "exec"), namespace)
+
+    # Return the handlers by opcode.
+    return {opcode: namespace[handlername(mnemonic, mode)] for mnemonic, mode, opcode, cycles, pagecross in INSTRUCTIONS}
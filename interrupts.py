@@ -0,0 +1,154 @@
+import heapq
+
+
+class InterruptController(object):
+
+    # Scheduled interrupt events.
+    IRQ = "IRQ"
+    NMI = "NMI"
+
+    # Cycle count used as the next event when nothing is scheduled.
+    NEVER = 1 << 62
+
+    def __init__(self, processor):
+
+        # The processor being interrupted.
+        self._processor = processor
+
+        # Scheduled events as a min-heap of [due cycle, sequence, event].  Cancelled entries have their event set to None.
+        self._events = []
+        self._sequence = 0
+
+        # Devices holding the IRQ line, and IRQ pulses waiting to be taken.
+        self._irqsources = set()
+        self._irqpulses = 0
+
+        # Flag for an NMI waiting to be taken.
+        self._nmipending = False
+
+        # Nothing to do yet.
+        processor.nextevent = self.NEVER
+
+    def fork(self, processor):
+
+        # Copy the scheduled IRQs and NMIs and the interrupt lines for a forked processor.  Events that call a function
+        # are dropped rather than copied, as they belong to a device of this processor (and would reschedule themselves
+        # here), so devices must be attached to the child afresh to have their events run there.
+        child = InterruptController(processor)
+        child._events = [list(entry) for entry in self._events if entry[2] in (self.IRQ, self.NMI)]
+        heapq.heapify(child._events)
+        child._sequence = self._sequence
+        child._irqsources = set(self._irqsources)
+        child._irqpulses = self._irqpulses
+        child._nmipending = self._nmipending
+        processor.nextevent = self._processor.nextevent
+
+        return child
+
+    def snapshot(self):
+
+        # Save the schedule (keeping the entries themselves, so a device holding one can still cancel it once restored),
+        # the interrupt lines and when to look next.
+        return ([(entry, list(entry)) for entry in self._events], self._sequence, set(self._irqsources),
+                self._irqpulses, self._nmipending, self._processor.nextevent)
+
+    def restore(self, snapshot):
+
+        events, self._sequence, irqsources, self._irqpulses, self._nmipending, nextevent = snapshot
+
+        # Put each entry back as it was (in the heap order it was saved in), dropping any scheduled since.
+        for entry, values in events:
+            entry[:] = values
+
+        self._events = [entry for entry, values in events]
+        self._irqsources = set(irqsources)
+        self._processor.nextevent = nextevent
+
+    @property
+    def irqpending(self):
+        return bool(self._irqsources or self._irqpulses)
+
+    def schedule(self, cycle, event):
+
+        # Add the event (IRQ, NMI, or a function called as event(cycle)) to the heap.
+        entry = [cycle, self._sequence, event]
+        self._sequence += 1
+        heapq.heappush(self._events, entry)
+
+        # Bring the next event forward if this one is sooner.
+        if cycle < self._processor.nextevent:
+            self._processor.nextevent = cycle
+
+        return entry
+
+    def cancel(self, entry):
+
+        # Leave the entry in the heap to be skipped when it comes up.
+        entry[2] = None
+
+    def raiseirq(self, source=None):
+
+        # Check to see if this is a one-off pulse or a device holding the line.
+        if source is None:
+            self._irqpulses += 1
+
+        else:
+            self._irqsources.add(source)
+
+        # Check for it before the next instruction.
+        self._processor.nextevent = self._processor.cy
+
+    def clearirq(self, source):
+
+        # The device has been acknowledged and releases the line.
+        self._irqsources.discard(source)
+
+    def raisenmi(self):
+
+        # Take the NMI before the next instruction.
+        self._nmipending = True
+        self._processor.nextevent = self._processor.cy
+
+    def unmasked(self):
+
+        # Called when the interrupt flag is cleared, so a held IRQ is taken before the next instruction.
+        if self._irqsources or self._irqpulses:
+            self._processor.nextevent = self._processor.cy
+
+    def service(self):
+
+        processor = self._processor
+        events = self._events
+
+        # Fire every event that is due.
+        while events and events[0][0] <= processor.cy:
+
+            event = heapq.heappop(events)[2]
+
+            if event is None:
+                continue
+
+            if event == self.IRQ:
+                self._irqpulses += 1
+
+            elif event == self.NMI:
+                self._nmipending = True
+
+            else:
+                event(processor.cy)
+
+        # Take an NMI regardless of the interrupt flag.
+        if self._nmipending:
+            self._nmipending = False
+            processor.nmi()
+
+        # Take an IRQ if the interrupt flag lets it in.
+        elif (self._irqsources or self._irqpulses) and processor.irq():
+            self._irqpulses = max(0, self._irqpulses - 1)
+
+        # Skip over cancelled events at the top of the heap.
+        while events and events[0][2] is None:
+            heapq.heappop(events)
+
+        # Work out when to look again (a masked IRQ waits for the interrupt flag to be cleared).
+        processor.nextevent = events[0][0] if events else self.NEVER
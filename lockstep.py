@@ -0,0 +1,526 @@
+import numpy
+import instructionspec
+from processor import Cycles, Flags, Processor, Vectors
+
+
+class Lockstep(object):
+
+    # Why an instance stopped (RUNNING while it still runs).
+    RUNNING = 0
+    ENDED = 1
+    BREAK = 2
+    INVALID = 3
+
+    # Memory is held in pages of this many bytes (operand fetches and addresses wrap past the top of memory, as the
+    # scalar processor's do).
+    PAGESIZE = 0x100
+    PAGES = 0x100
+
+    # Instructions grouped by what they do, for building the handlers from the spec.
+    LOADS = {"LDA": "a", "LDX": "x", "LDY": "y"}
+    STORES = {"STA": "a", "STX": "x", "STY": "y"}
+    COMPARES = {"CMP": "a", "CPX": "x", "CPY": "y"}
+    LOGIC = {"AND": numpy.bitwise_and, "EOR": numpy.bitwise_xor, "ORA": numpy.bitwise_or}
+    TRANSFERS = {"TAX": ("a", "x"), "TAY": ("a", "y"), "TSX": ("sp", "x"), "TXA": ("x", "a"), "TYA": ("y", "a")}
+    INCREMENTS = {"INX": ("x", 1), "INY": ("y", 1), "DEX": ("x", -1), "DEY": ("y", -1)}
+    PUSHES = {"PHA": "a", "PHP": "pf", "PHX": "x", "PHY": "y"}
+    PULLS = {"PLA": "a", "PLX": "x", "PLY": "y"}
+    FLAGCHANGES = {"CLC": (Flags.CARRY, False), "CLD": (Flags.DECIMAL, False), "CLI": (Flags.INTERRUPT, False),
+                   "CLV": (Flags.OVERFLOW, False), "SEC": (Flags.CARRY, True), "SED": (Flags.DECIMAL, True),
+                   "SEI": (Flags.INTERRUPT, True)}
+    BRANCHES = {"BCC": (Flags.CARRY, False), "BCS": (Flags.CARRY, True), "BEQ": (Flags.ZERO, True),
+                "BMI": (Flags.NEGATIVE, True), "BNE": (Flags.ZERO, False), "BPL": (Flags.NEGATIVE, False),
+                "BVC": (Flags.OVERFLOW, False), "BVS": (Flags.OVERFLOW, True)}
+
+    # The scalar processor's ADC and SBC tables, widened to index with the registers.
+    ADCTABLE = numpy.frombuffer(Processor.ADCTABLE, dtype=numpy.uint16).astype(numpy.int64)
+    SBCTABLE = numpy.frombuffer(Processor.SBCTABLE, dtype=numpy.uint16).astype(numpy.int64)
+
+    def __init__(self, count, image=None, startaddress=0x1000, endaddress=0xFFFF):
+
+        # Number of instances, and the address past which an instance has finished the program.
+        self.count = count
+        self.endaddress = endaddress
+
+        # Registers, one entry per instance (held wide so arithmetic is masked rather than wrapping on its own).
+        self.pc = numpy.full(count, startaddress, dtype=numpy.int64)
+        self.a = numpy.zeros(count, dtype=numpy.int64)
+        self.x = numpy.zeros(count, dtype=numpy.int64)
+        self.y = numpy.zeros(count, dtype=numpy.int64)
+        self.sp = numpy.full(count, 0xFF, dtype=numpy.int64)
+        self.pf = numpy.zeros(count, dtype=numpy.int64)
+        self.cy = numpy.zeros(count, dtype=numpy.int64)
+
+        # Why each instance stopped.
+        self.status = numpy.full(count, self.RUNNING, dtype=numpy.int8)
+
+        # Memory as a pool of pages with a page table per instance.  Every instance starts out sharing the pages of the
+        # image, and gets its own copy of a page the first time it writes to it.
+        self._pool = numpy.zeros((self.PAGES, self.PAGESIZE), dtype=numpy.uint8)
+        self._poolsize = self.PAGES
+
+        if image is not None:
+            self._pool.reshape(-1)[:len(image)] = numpy.frombuffer(bytes(image), dtype=numpy.uint8)
+
+        self._pagetable = numpy.tile(numpy.arange(self.PAGES, dtype=numpy.int64), (count, 1))
+        self._owned = numpy.zeros((count, self.PAGES), dtype=bool)
+
+        # The handler for each opcode, built from the instruction spec (opcodes with no instruction halt the instance).
+        self._handlers = [self.invalid] * 256
+
+        for mnemonic, mode, opcode, cycles, pagecross in instructionspec.INSTRUCTIONS:
+            self._handlers[opcode] = self.handler(mnemonic, mode, pagecross)
+
+    @classmethod
+    def fromprocessor(cls, processor, count):
+
+        # Start every instance from the memory and registers of a loaded processor.
+        image = bytes(value & 0xFF for page in processor._memory._pages for value in page)
+        lockstep = cls(count, image, processor.pc, processor.endaddress)
+
+        for register in ("a", "x", "y", "sp", "pf", "cy"):
+            getattr(lockstep, register)[:] = getattr(processor, register)
+
+        return lockstep
+
+    # region Memory
+    def read(self, members, addresses):
+
+        # Look each address up in its instance's page.
+        return self._pool[self._pagetable[members, addresses >> 8], addresses & 0xFF].astype(numpy.int64)
+
+    def write(self, members, addresses, values):
+
+        pages = addresses >> 8
+
+        # Give instances still sharing a page their own copy before writing to it.
+        shared = ~self._owned[members, pages]
+
+        if shared.any():
+            self.unshare(members[shared], pages[shared])
+
+        self._pool[self._pagetable[members, pages], addresses & 0xFF] = values
+
+    def unshare(self, members, pages):
+
+        count = len(members)
+
+        # Grow the pool if there isn't room for the copies.
+        if self._poolsize + count > len(self._pool):
+            pool = numpy.empty((max(2 * len(self._pool), self._poolsize + count), self.PAGESIZE), dtype=numpy.uint8)
+            pool[:self._poolsize] = self._pool[:self._poolsize]
+            self._pool = pool
+
+        # Copy the pages and point the instances at their copies.
+        rows = numpy.arange(self._poolsize, self._poolsize + count)
+        self._pool[rows] = self._pool[self._pagetable[members, pages]]
+        self._pagetable[members, pages] = rows
+        self._owned[members, pages] = True
+        self._poolsize += count
+
+    def peek(self, index, address, length=1):
+
+        # Return a block of one instance's memory.
+        addresses = numpy.arange(address, address + length)
+
+        return bytes(self.read(numpy.full(length, index), addresses).astype(numpy.uint8))
+
+    def poke(self, members, address, values):
+
+        # Write a value (or a value per instance) to an address in each of the instances.
+        members = numpy.asarray(members)
+        self.write(members, numpy.broadcast_to(numpy.asarray(address, dtype=numpy.int64), members.shape),
+                   numpy.asarray(values) & 0xFF)
+
+    # endregion
+
+    # region Execution
+    def step(self):
+
+        # Finish the instances that have run past the end of the program.
+        running = self.status == self.RUNNING
+        ended = running & (self.pc > self.endaddress)
+        self.status[ended] = self.ENDED
+
+        members = numpy.flatnonzero(running & ~ended)
+
+        if not members.size:
+            return 0
+
+        # Fetch each instance's opcode and group the instances by it, so each opcode runs once for its whole group.
+        opcodes = self.read(members, self.pc[members])
+        order = numpy.argsort(opcodes, kind='stable')
+        opcodes = opcodes[order]
+        members = members[order]
+
+        bounds = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(opcodes)) + 1, [len(opcodes)]))
+        basecycles = Cycles.BASE
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+
+            opcode = int(opcodes[start])
+            group = members[start:end]
+
+            # Step over the opcode and count its base cycles, as executestep does.
+            self.pc[group] += 1
+            self.cy[group] += basecycles[opcode]
+
+            self._handlers[opcode](group)
+
+        return len(members)
+
+    def run(self, maxsteps=None):
+
+        steps = 0
+        instructions = 0
+
+        # Step until every instance has stopped or the step limit is reached.
+        while maxsteps is None or steps < maxsteps:
+
+            executed = self.step()
+
+            if not executed:
+                break
+
+            steps += 1
+            instructions += executed
+
+        return instructions
+
+    def state(self, index):
+
+        # Return one instance's registers as (pc, a, x, y, sp, flags, cycles).
+        return tuple(int(getattr(self, register)[index]) for register in ("pc", "a", "x", "y", "sp", "pf", "cy"))
+
+    # endregion
+
+    # region Handlers
+    def handler(self, mnemonic, mode, pagecross):
+
+        length = instructionspec.MODES[mode][0]
+        kind = instructionspec.OPERATIONS[mnemonic][0]
+        address = getattr(self, "address" + mode, None)
+
+        # Branches test a flag and take the branch for the instances where it matches.
+        if kind == "branch":
+
+            flag, set = self.BRANCHES[mnemonic]
+
+            def handle(members):
+                self.branch(members, ((self.pf[members] & flag) != 0) == set)
+
+            return handle
+
+        operation = self.operation(mnemonic)
+
+        # Jumps work out their own pc.
+        if kind == "jump":
+
+            def handle(members):
+                operation(members, address(members, pagecross) if address is not None else None)
+
+        elif kind == "implied":
+
+            def handle(members):
+                operation(members)
+
+        elif kind == "read":
+
+            def handle(members):
+                operation(members, self.read(members, address(members, pagecross)))
+                self.pc[members] += length - 1
+
+        elif kind == "write":
+
+            def handle(members):
+                operation(members, address(members, pagecross))
+                self.pc[members] += length - 1
+
+        # Read-modify-write instructions work on the accumulator or memory.
+        elif mode == "accumulator":
+
+            def handle(members):
+                self.a[members] = operation(members, self.a[members])
+
+        else:
+
+            def handle(members):
+                addresses = address(members, pagecross)
+                self.write(members, addresses, operation(members, self.read(members, addresses)))
+                self.pc[members] += length - 1
+
+        return handle
+
+    def operation(self, mnemonic):
+
+        # Return the vectorized operation for an instruction, from its group or its own handle method.
+        if mnemonic in self.LOADS:
+            register = getattr(self, self.LOADS[mnemonic])
+
+            def operation(members, values):
+                self.load(members, register, values)
+
+        elif mnemonic in self.STORES:
+            register = getattr(self, self.STORES[mnemonic])
+
+            def operation(members, addresses):
+                self.write(members, addresses, register[members])
+
+        elif mnemonic in self.COMPARES:
+            register = getattr(self, self.COMPARES[mnemonic])
+
+            def operation(members, values):
+                self.compare(members, register[members], values)
+
+        elif mnemonic in self.LOGIC:
+            function = self.LOGIC[mnemonic]
+
+            def operation(members, values):
+                self.load(members, self.a, function(self.a[members], values))
+
+        elif mnemonic in self.TRANSFERS:
+            source, target = (getattr(self, register) for register in self.TRANSFERS[mnemonic])
+
+            def operation(members):
+                self.load(members, target, source[members] & 0xFF)
+
+        elif mnemonic in self.INCREMENTS:
+            register, step = self.INCREMENTS[mnemonic]
+            register = getattr(self, register)
+
+            def operation(members):
+                self.load(members, register, (register[members] + step) & 0xFF)
+
+        elif mnemonic in self.PUSHES:
+            register = getattr(self, self.PUSHES[mnemonic])
+
+            def operation(members):
+                self.push8(members, register[members])
+
+        elif mnemonic in self.PULLS:
+            register = getattr(self, self.PULLS[mnemonic])
+
+            def operation(members):
+                self.load(members, register, self.pop8(members))
+
+        elif mnemonic in self.FLAGCHANGES:
+            flag, set = self.FLAGCHANGES[mnemonic]
+
+            def operation(members):
+                self.setflag(members, flag, set)
+
+        else:
+            operation = getattr(self, "handle" + mnemonic)
+
+        return operation
+
+    def invalid(self, members):
+
+        # Halt the instances (the pc is left past the opcode, as the halt policy leaves it).
+        self.status[members] = self.INVALID
+
+    def handleADC(self, members, values):
+        self.arithmetic(members, self.ADCTABLE, values)
+
+    def handleSBC(self, members, values):
+        self.arithmetic(members, self.SBCTABLE, values)
+
+    def handleBIT(self, members, values):
+
+        # Zero from A & M, negative and overflow from bits 7 and 6 of M.
+        self.pf[members] = ((self.pf[members] & ~(Flags.ZERO | Flags.OVERFLOW | Flags.NEGATIVE)) |
+                            (values & (Flags.OVERFLOW | Flags.NEGATIVE)) |
+                            ((self.a[members] & values) == 0) * Flags.ZERO)
+
+    def handleASL(self, members, values):
+        self.setflag(members, Flags.CARRY, values & 0x80)
+        return self.setnz(members, (values << 1) & 0xFF)
+
+    def handleLSR(self, members, values):
+        self.setflag(members, Flags.CARRY, values & 0x01)
+        return self.setnz(members, values >> 1)
+
+    def handleROL(self, members, values):
+        values = (values << 1) | (self.pf[members] & Flags.CARRY)
+        self.setflag(members, Flags.CARRY, values >> 8)
+        return self.setnz(members, values & 0xFF)
+
+    def handleROR(self, members, values):
+        values = values | ((self.pf[members] & Flags.CARRY) << 8)
+        self.setflag(members, Flags.CARRY, values & 0x01)
+        return self.setnz(members, values >> 1)
+
+    def handleINC(self, members, values):
+        return self.setnz(members, (values + 1) & 0xFF)
+
+    def handleDEC(self, members, values):
+        return self.setnz(members, (values - 1) & 0xFF)
+
+    def handleNOP(self, members):
+        pass
+
+    def handleTXS(self, members):
+        self.sp[members] = self.x[members]
+
+    def handlePLP(self, members):
+        self.pf[members] = self.pop8(members)
+
+    def handleJMP(self, members, addresses):
+        self.pc[members] = addresses
+
+    def handleJSR(self, members, addresses):
+        self.push16(members, (self.pc[members] + 1) & 0xFFFF)
+        self.pc[members] = addresses
+
+    def handleRTS(self, members, addresses):
+        self.pc[members] = (self.pop16(members) + 1) & 0xFFFF
+
+    def handleRTI(self, members, addresses):
+        self.pf[members] = self.pop8(members)
+        self.pc[members] = self.pop16(members)
+
+    def handleBRK(self, members, addresses):
+
+        # Push the address past the signature byte and the flags, then stop at the vector (where the debugger would open).
+        self.pc[members] += 1
+        self.pf[members] |= Flags.BREAK
+        self.push16(members, self.pc[members])
+        self.push8(members, self.pf[members])
+        self.pf[members] |= Flags.INTERRUPT
+
+        vector = numpy.full(len(members), Vectors.IRQ_ADDR_LOW)
+        self.pc[members] = self.read(members, vector) + (self.read(members, vector + 1) << 8)
+        self.status[members] = self.BREAK
+
+    # endregion
+
+    # region Addressing Modes
+    def addressimmediate(self, members, pagecross):
+        return self.pc[members] & 0xFFFF
+
+    def addresszeropage(self, members, pagecross):
+        return self.read(members, self.pc[members] & 0xFFFF)
+
+    def addresszeropagex(self, members, pagecross):
+        return (self.read(members, self.pc[members] & 0xFFFF) + self.x[members]) & 0xFF
+
+    def addresszeropagey(self, members, pagecross):
+        return (self.read(members, self.pc[members] & 0xFFFF) + self.y[members]) & 0xFF
+
+    def addressabsolute(self, members, pagecross):
+        pc = self.pc[members]
+        return self.read(members, pc & 0xFFFF) + (self.read(members, (pc + 1) & 0xFFFF) << 8)
+
+    def addressabsolutex(self, members, pagecross):
+        return self.indexed(members, self.addressabsolute(members, pagecross), self.x[members], pagecross)
+
+    def addressabsolutey(self, members, pagecross):
+        return self.indexed(members, self.addressabsolute(members, pagecross), self.y[members], pagecross)
+
+    def addressindirect(self, members, pagecross):
+        pointer = self.addressabsolute(members, pagecross)
+        return self.read(members, pointer) + (self.read(members, (pointer + 1) & 0xFFFF) << 8)
+
+    def addressindexedindirect(self, members, pagecross):
+        pointer = (self.read(members, self.pc[members] & 0xFFFF) + self.x[members]) & 0xFF
+        return self.read(members, pointer) + (self.read(members, (pointer + 1) & 0xFF) << 8)
+
+    def addressindirectindexed(self, members, pagecross):
+        pointer = self.read(members, self.pc[members] & 0xFFFF)
+        base = self.read(members, pointer) + (self.read(members, (pointer + 1) & 0xFF) << 8)
+        return self.indexed(members, base, self.y[members], pagecross)
+
+    def indexed(self, members, base, index, pagecross):
+
+        # Index, wrapping past the top of memory.
+        addresses = (base + index) & 0xFFFF
+
+        # Take the extra cycles where the index carried into the high byte.
+        if pagecross:
+            self.cy[members] += ((base ^ addresses) & 0xFF00 != 0) * pagecross
+
+        return addresses
+
+    def branch(self, members, taken):
+
+        # Step over the offset.
+        pc = self.pc[members]
+        self.pc[members] = pc + 1
+
+        members = members[taken]
+
+        if members.size:
+
+            # Add the signed offset, taking an extra cycle and another if the branch lands in a different page.
+            nextpc = pc[taken] + 1
+            offset = self.read(members, (nextpc - 1) & 0xFFFF)
+            target = (nextpc + ((offset ^ 0x80) - 0x80)) & 0xFFFF
+
+            self.pc[members] = target
+            self.cy[members] += numpy.take(Cycles.BRANCHTAKEN, ((nextpc ^ target) & 0xFF00) != 0)
+
+    # endregion
+
+    # region Helpers
+    def load(self, members, register, values):
+
+        # Set the register and the zero and negative flags.
+        register[members] = self.setnz(members, values)
+
+    def setnz(self, members, values):
+
+        self.pf[members] = ((self.pf[members] & ~(Flags.ZERO | Flags.NEGATIVE)) | (values & Flags.NEGATIVE) |
+                            (values == 0) * Flags.ZERO)
+
+        return values
+
+    def setflag(self, members, flag, values):
+
+        # Set or clear the flag per instance.
+        self.pf[members] = (self.pf[members] & ~flag) | (numpy.asarray(values) != 0) * flag
+
+    def compare(self, members, register, values):
+
+        result = register - values
+
+        self.pf[members] = ((self.pf[members] & ~(Flags.CARRY | Flags.ZERO | Flags.NEGATIVE)) |
+                            (result & Flags.NEGATIVE) | (result == 0) * Flags.ZERO | (result >= 0) * Flags.CARRY)
+
+    def arithmetic(self, members, table, values):
+
+        pf = self.pf[members]
+
+        # Look up the result and the carry, zero, overflow and negative flags, as the scalar processor's handlers do.
+        entries = table[((pf & Flags.DECIMAL) << 14) | ((pf & Flags.CARRY) << 16) | (self.a[members] << 8) | values]
+
+        self.a[members] = entries & 0xFF
+        self.pf[members] = (pf & ~(Flags.CARRY | Flags.ZERO | Flags.OVERFLOW | Flags.NEGATIVE)) | (entries >> 8)
+
+    def push8(self, members, values):
+
+        # Store at the stack pointer in page 1 and move it down, wrapping round the page.
+        sp = self.sp[members]
+        self.write(members, 0x100 | sp, values & 0xFF)
+        self.sp[members] = (sp - 1) & 0xFF
+
+    def pop8(self, members):
+
+        # Move the stack pointer up, wrapping round the page, and read there.
+        sp = (self.sp[members] + 1) & 0xFF
+        self.sp[members] = sp
+
+        return self.read(members, 0x100 | sp)
+
+    def push16(self, members, values):
+
+        # High byte first, so the low byte ends up at the lower address, as pushstack16 stores them.
+        self.push8(members, values >> 8)
+        self.push8(members, values)
+
+    def pop16(self, members):
+
+        low = self.pop8(members)
+
+        return low + (self.pop8(members) << 8)
+
+    # endregion
@@ -0,0 +1,263 @@
+from collections import OrderedDict
+
+
+class Memoizer(object):
+
+    # Opcodes that call and return from a subroutine.
+    JSR = 0x20
+    RTS = 0x60
+
+    # Most distinct addresses a call can read, or write, and still be cached.
+    MAXACCESSES = 256
+
+    def __init__(self, processor, size=256):
+
+        # The processor whose calls are cached.
+        self._processor = processor
+
+        # Cached calls, least recently used first, keyed by (target, a, x, y, pf, sp) on entry.  Each entry is the
+        # addresses read and their values, the (address, value) pairs written, the registers on return and the cycles.
+        self.size = max(1, size)
+        self._entries = OrderedDict()
+
+        # Subroutines that touched I/O, or didn't return to their caller, so are never cached.
+        self._impure = set()
+
+        # The call being recorded as (key, sp before the call, return address, cycle count on entry), the values it
+        # read that it hadn't written first, and the values it wrote.
+        self._recording = None
+        self._reads = dict()
+        self._writes = dict()
+
+        # The memory being recorded, the accessors doing the work while recording, and the ones to put back after.
+        self._memory = None
+        self._readbyte = None
+        self._writebyte = None
+        self._saved = None
+
+        # Calls replayed from the cache, and calls run in full.
+        self.hits = 0
+        self.misses = 0
+
+    def wrapcall(self, jsr):
+
+        entries = self._entries
+
+        def call(processor):
+
+            # Check to see if a call is already being recorded.
+            if self._recording is not None:
+
+                # A call made from inside it is recorded as part of it, unless the stack shows the recorded call was
+                # left without its return being seen (the debugger ran it, or the stack was reset).
+                if processor.sp < self._recording[1]:
+                    jsr(processor)
+                    return
+
+                self.abort()
+
+            # Make the call.
+            callersp = processor.sp
+            returnpc = processor.pc + 2
+            jsr(processor)
+
+            # Check to see if the subroutine can be cached.
+            target = processor.pc
+
+            if target in self._impure:
+                return
+
+            key = (target, processor.a, processor.x, processor.y, processor.pf, processor.sp)
+            entry = entries.get(key)
+
+            if entry is not None:
+
+                addresses, values, writes, a, x, y, pf, cycles = entry
+                pages = processor._memory._pages
+
+                # Check to see if memory still holds what the call read (its code included).
+                if tuple([pages[address >> 8][address & 0xFF] for address in addresses]) == values:
+
+                    # Replay the call, unless an event is due before it would have returned (so the event still
+                    # fires at the instruction it would have).
+                    if processor.cy + cycles <= min(processor.nextevent, processor._runend):
+
+                        writebyte = processor._memory.writebyte
+
+                        for address, value in writes:
+                            writebyte(address, value)
+
+                        processor.a = a
+                        processor.x = x
+                        processor.y = y
+                        processor.pf = pf
+                        processor.sp = callersp
+                        processor.pc = returnpc
+                        processor.cy += cycles
+
+                        entries.move_to_end(key)
+                        self.hits += 1
+
+                    return
+
+                # Something it read has been written since, so the entry is no longer any good.
+                del entries[key]
+
+            # Run the call, recording what it does.
+            self.misses += 1
+            self.record(key, callersp, returnpc)
+
+        # Keep the call's name for reports.
+        call.__name__ = jsr.__name__
+
+        return call
+
+    def wrapreturn(self, rts):
+
+        def ret(processor):
+
+            # Return.
+            rts(processor)
+
+            # Check to see if this leaves the call being recorded.
+            recording = self._recording
+
+            if recording is not None and processor.sp >= recording[1]:
+
+                # Cache it if it came back to its caller, otherwise it is playing with the stack.
+                if processor.sp == recording[1] and processor.pc == recording[2]:
+                    self.finish()
+
+                else:
+                    self.impure()
+
+        # Keep the return's name for reports.
+        ret.__name__ = rts.__name__
+
+        return ret
+
+    def record(self, key, callersp, returnpc):
+
+        memory = self._processor._memory
+
+        # Start afresh.
+        self._recording = (key, callersp, returnpc, self._processor.cy)
+        self._reads = dict()
+        self._writes = dict()
+
+        # Route the memory accesses through the recorder, keeping the accessors in use to do the work.
+        self._memory = memory
+        self._readbyte = memory.readbyte
+        self._writebyte = memory.writebyte
+        self._saved = (memory.__dict__.get('readbyte'), memory.__dict__.get('writebyte'))
+
+        memory.readbyte = self.recordread
+        memory.writebyte = self.recordwrite
+
+    def recordread(self, address):
+
+        value = self._readbyte(address)
+
+        # Check to see if this is the first the call has seen of the address (a handler that started before the
+        # recording stopped can still be holding the recorder).
+        if self._recording is not None and address not in self._reads and address not in self._writes:
+
+            # A device can read differently with the same inputs.
+            devices = self._memory._readdevices[address >> 8]
+
+            if devices is not None and devices[address & 0xFF] is not None:
+                self.impure()
+
+            else:
+
+                self._reads[address] = value
+
+                if len(self._reads) > self.MAXACCESSES:
+                    self.impure()
+
+        return value
+
+    def recordwrite(self, address, value):
+
+        self._writebyte(address, value)
+
+        # Check to see if the call is still being recorded.
+        if self._recording is None:
+            return
+
+        # A write to a device does something beyond memory.
+        devices = self._memory._writedevices[address >> 8]
+
+        if devices is not None and devices[address & 0xFF] is not None:
+            self.impure()
+
+        else:
+
+            self._writes[address] = value
+
+            if len(self._writes) > self.MAXACCESSES:
+                self.impure()
+
+    def finish(self):
+
+        key, callersp, returnpc, cycle = self._recording
+        processor = self._processor
+
+        # Check the recorder saw every access (the accessors are picked again when a device or watch is added).
+        recorded = processor._memory is self._memory and self._memory.__dict__.get('readbyte') == self.recordread
+        self.stop()
+
+        if not recorded:
+            return
+
+        # Cache the call, dropping the least recently used once the cache is full.
+        self._entries[key] = (tuple(self._reads), tuple(self._reads.values()), tuple(self._writes.items()),
+                              processor.a, processor.x, processor.y, processor.pf, processor.cy - cycle)
+
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def impure(self):
+
+        # Never try the subroutine again.
+        self._impure.add(self._recording[0][0])
+        self.stop()
+
+    def abort(self):
+
+        # Drop the recording, leaving the subroutine to be tried again (an interrupt came in, or it was left).
+        if self._recording is not None:
+            self.stop()
+
+    def stop(self):
+
+        # Put the accessors back.
+        for name, accessor in zip(('readbyte', 'writebyte'), self._saved):
+
+            if accessor is None:
+                self._memory.__dict__.pop(name, None)
+
+            else:
+                setattr(self._memory, name, accessor)
+
+        self._recording = None
+
+    def clear(self):
+
+        # Forget everything cached.
+        self.abort()
+        self._entries.clear()
+        self._impure.clear()
+
+    def report(self, output=None):
+
+        # Show how often calls were replayed.
+        calls = self.hits + self.misses
+        line = "Memoized calls: %d of %d replayed (%.1f%%), %d cached, %d subroutines impure" % (
+            self.hits, calls, 100.0 * self.hits / calls if calls else 0.0, len(self._entries), len(self._impure))
+
+        if output is None:
+            print(line)
+
+        else:
+            output.write(line + "\n")
@@ -1,29 +1,414 @@
+import copy
+
+
+class BusPage(list):
+
+    def __init__(self, values, memory, page):
+
+        # The bytes of RAM in the page, with the memory whose device and dirty page tables cover it.  Only pages with a
+        # device or tracked writes are bus pages, so reads and writes of plain RAM pages never get here.
+        super(BusPage, self).__init__(values)
+        self.memory = memory
+        self.page = page
+        self.base = page << 8
+
+    def __getitem__(self, index):
+
+        # Check to see if there is a device at this address (slices always read RAM, as blocks and dumps do).
+        if type(index) is int:
+
+            devices = self.memory._readdevices[self.page]
+
+            if devices is not None and devices[index] is not None:
+                return devices[index](self.base | index)
+
+        # Read from RAM.
+        return list.__getitem__(self, index)
+
+    def __setitem__(self, index, value):
+
+        memory = self.memory
+        devices = memory._writedevices[self.page]
+
+        # Check to see if there is a device at this address.
+        if devices is not None and devices[index] is not None:
+            devices[index](self.base | index, value)
+
+        else:
+
+            # Write to RAM.
+            list.__setitem__(self, index, value)
+
+            # Check to see if this page is tracked, and mark the address if it is in the region.
+            dirty = memory._dirtymaps[self.page]
+            address = self.base | index
+
+            if dirty is not None and dirty[1] <= address <= dirty[2]:
+                dirty[0][address - dirty[1]] = 1
+
+
 class Memory(object):
 
+    # Memory is held in pages of this many bytes.
+    PAGESIZE = 0x100
+
     def __init__(self, maximum):
 
-        # -1 means uninitialized memory.  64k allocated.
-        self._memmap = [0] * maximum
+        # Number of pages needed to hold the requested memory size.
+        self._pagecount = (maximum + self.PAGESIZE - 1) // self.PAGESIZE
+
+        # The pages of memory.  64k allocated.
+        self._pages = [[0] * self.PAGESIZE for _ in range(self._pagecount)]
+
+        # Flags for pages this instance can write in place (pages shared with a fork are copied on first write).
+        self._owned = [True] * self._pagecount
+
+        # Optional callbacks that see every read after it is made, and every write before it is stored.
+        self._readhook = None
+        self._writehook = None
+
+        # Watched addresses, the pages holding them, and the callback for a watch hit.
+        self._readwatches = set()
+        self._writewatches = set()
+        self._readwatchpages = [False] * self._pagecount
+        self._writewatchpages = [False] * self._pagecount
+        self._watchcallback = None
+
+        # Device page tables.  Each entry is None for a plain RAM page, or a list of the callbacks for each address in an I/O page.
+        self._readdevices = [None] * self._pagecount
+        self._writedevices = [None] * self._pagecount
+
+        # Device addresses whose value can change without an event (such as a running counter), and device addresses whose
+        # read changes nothing (so reading one again reads the same until an event).  Only reads of RAM and of pure
+        # addresses that aren't volatile can be idle.
+        self._volatile = set()
+        self._pure = set()
+
+        # Dirty page table.  Each entry is None for an untracked page, or the (bitmap, start, end) of a tracked region.
+        self._dirtymaps = [None] * self._pagecount
+
+        # Pages with a device or tracked writes, which are held as bus pages.
+        self._buspages = set()
 
     def readbyte(self, address):
 
         # Retrive value from memory address.
-        return self._memmap[address]
+        return self._pages[address >> 8][address & 0xFF]
 
     def readtwobytes(self, address):
 
-        # Retrive the contents of address and address + 1.
-        return self._memmap[address] + (0x100 * self._memmap[address + 1])
+        # Retrive the contents of address and address + 1 (wrapping past $FFFF).
+        return self.readbyte(address) + (0x100 * self.readbyte((address + 1) & 0xFFFF))
+
+    def readblock(self, address, length):
+
+        # Clip the block to the end of memory.
+        end = min(address + length, self._pagecount * self.PAGESIZE)
+        block = []
+
+        # Retrieve the contents of the range a page at a time (from RAM, without calling any devices).
+        while address < end:
+            stop = min(end, (address | 0xFF) + 1)
+            block += self._pages[address >> 8][address & 0xFF:(address & 0xFF) + stop - address]
+            address = stop
+
+        return block
 
     def writebyte(self, address, value):
 
+        # Get the page for this address.
+        page = address >> 8
+
+        # Check to see if this page is still shared with a fork.
+        if not self._owned[page]:
+
+            # Make a private copy of the page before writing to it.
+            self._pages[page] = self._pages[page][:]
+            self._owned[page] = True
+
         # Assign value to memory.
-        self._memmap[address] = value
+        self._pages[page][address & 0xFF] = value
+
+    def fork(self):
+
+        # Copy the memory object, sharing the pages themselves.
+        child = copy.copy(self)
+        child._pages = list(self._pages)
+
+        # Neither copy owns the pages anymore, so the first write to a page by either will copy it.
+        child._owned = [False] * self._pagecount
+        self._owned = [False] * self._pagecount
+
+        # Hooks and watches belong to whoever installed them on this instance, so the child starts without any.
+        child._readhook = None
+        child._writehook = None
+        child._readwatches = set()
+        child._writewatches = set()
+        child._readwatchpages = [False] * self._pagecount
+        child._writewatchpages = [False] * self._pagecount
+        child._watchcallback = None
+        child._updateaccessors()
+
+        # Devices are part of the machine, so the child keeps them (their own state isn't copied).
+        child._readdevices = list(self._readdevices)
+        child._writedevices = list(self._writedevices)
+        child._volatile = set(self._volatile)
+        child._pure = set(self._pure)
+        child._dirtymaps = list(self._dirtymaps)
+        child._buspages = set(self._buspages)
+
+        # Bus pages go through the device and dirty page tables of their memory, so each side gets its own straight away.
+        for page in self._buspages:
+            child._pages[page] = BusPage(self._pages[page], child, page)
+            child._owned[page] = True
+            self._owned[page] = True
+
+        return child
+
+    def mapdevice(self, start, end, read=None, write=None, volatile=False, pure=False):
+
+        # Map the addresses start to end (inclusive) to a device, called as read(address) and write(address, value).
+        for address in range(start, end + 1):
+
+            # Note the addresses that read differently as time passes.
+            if volatile:
+                self._volatile.add(address)
+
+            else:
+                self._volatile.discard(address)
+
+            # Note the addresses the device says can be read without changing anything.
+            if pure:
+                self._pure.add(address)
+
+            else:
+                self._pure.discard(address)
+
+            # Get the page for this address.
+            page = address >> 8
+
+            # Give the page a callback table the first time a device is mapped into it.
+            if read is not None:
+                if self._readdevices[page] is None:
+                    self._readdevices[page] = [None] * self.PAGESIZE
+
+                self._readdevices[page][address & 0xFF] = read
+
+            if write is not None:
+                if self._writedevices[page] is None:
+                    self._writedevices[page] = [None] * self.PAGESIZE
+
+                self._writedevices[page][address & 0xFF] = write
+
+            # Make it a bus page.
+            self._updatepage(page)
+
+    def unmapdevice(self, start, end):
+
+        # Return the addresses start to end (inclusive) to RAM.
+        for address in range(start, end + 1):
+
+            # Get the page for this address.
+            page = address >> 8
+            self._volatile.discard(address)
+            self._pure.discard(address)
+
+            # Clear the callbacks.
+            for devices in (self._readdevices, self._writedevices):
+                if devices[page] is not None:
+                    devices[page][address & 0xFF] = None
+
+                    # Go back to a plain RAM page once nothing is mapped in it.
+                    if not any(devices[page]):
+                        devices[page] = None
+
+            # Go back to a plain list once the page needs nothing from the bus.
+            self._updatepage(page)
+
+    def hasdevices(self):
+
+        # Check to see if any device is on the bus.
+        return any(self._readdevices) or any(self._writedevices)
+
+    def copytracking(self):
+
+        copies = dict()
+
+        # Give this memory its own copy of each dirty bitmap, so its writes no longer mark the ones it was forked from.
+        for page, dirty in enumerate(self._dirtymaps):
+
+            if dirty is not None:
+
+                if id(dirty) not in copies:
+                    copies[id(dirty)] = (bytearray(dirty[0]), dirty[1], dirty[2])
+
+                self._dirtymaps[page] = copies[id(dirty)]
+
+    def isstable(self, address):
+
+        # Check to see if reading the address again reads the same and changes nothing until an event (RAM, or a device
+        # address declared pure that doesn't read differently as time passes).
+        devices = self._readdevices[address >> 8]
+
+        if devices is None or devices[address & 0xFF] is None:
+            return True
+
+        return address in self._pure and address not in self._volatile
+
+    def setreadhook(self, hook):
+
+        # Save the hook (None removes it).
+        self._readhook = hook
+
+        # Pick the read accessor.
+        self._updateaccessors()
+
+    def setwritehook(self, hook):
+
+        # Save the hook (None removes it).
+        self._writehook = hook
+
+        # Pick the write accessor.
+        self._updateaccessors()
+
+    def setwatchcallback(self, callback):
+
+        # Save the function called as callback(address, value, iswrite) when a watched address is accessed.
+        self._watchcallback = callback
+
+    def addwatch(self, address, read, write):
+
+        # Get the page for this address.
+        page = address >> 8
+
+        # Add the address to the watch lists and mark its page.
+        if read:
+            self._readwatches.add(address)
+            self._readwatchpages[page] = True
+
+        if write:
+            self._writewatches.add(address)
+            self._writewatchpages[page] = True
+
+        # Pick the accessors.
+        self._updateaccessors()
+
+    def removewatch(self, address):
+
+        # Remove the address from the watch lists.
+        self._readwatches.discard(address)
+        self._writewatches.discard(address)
+
+        # Rebuild the watched page lists.
+        self._readwatchpages = [False] * self._pagecount
+        self._writewatchpages = [False] * self._pagecount
+
+        for watched in self._readwatches:
+            self._readwatchpages[watched >> 8] = True
+
+        for watched in self._writewatches:
+            self._writewatchpages[watched >> 8] = True
+
+        # Pick the accessors.
+        self._updateaccessors()
+
+    def trackwrites(self, start, end):
+
+        # Start marking writes to the addresses start to end (inclusive) in a bitmap, one byte per address.
+        bitmap = bytearray(b'\x01') * (end - start + 1)
+
+        # Point each page of the region at the bitmap, making it a bus page.
+        for page in range(start >> 8, (end >> 8) + 1):
+            self._dirtymaps[page] = (bitmap, start, end)
+            self._updatepage(page)
+
+        # The caller reads and clears the bitmap (everything starts dirty).
+        return bitmap
+
+    def untrackwrites(self, start, end):
+
+        # Stop marking writes to the region.
+        for page in range(start >> 8, (end >> 8) + 1):
+            self._dirtymaps[page] = None
+            self._updatepage(page)
+
+    def _updateaccessors(self):
+
+        # Check to see if reads need to be seen by a hook or watch.
+        if self._readhook is not None or self._readwatches:
+
+            # Route reads through the hook and watch check.
+            self.readbyte = self._checkedread
+
+        else:
+
+            # Go back to reading memory directly (bus pages see to any devices).
+            self.__dict__.pop('readbyte', None)
+
+        # Check to see if writes need to be seen by a hook or watch.
+        if self._writehook is not None or self._writewatches:
+
+            # Route writes through the hook and watch check.
+            self.writebyte = self._checkedwrite
+
+        else:
+
+            # Go back to writing memory directly (bus pages see to any devices and dirty bitmaps).
+            self.__dict__.pop('writebyte', None)
+
+    def _updatepage(self, page):
+
+        values = self._pages[page]
+
+        # Check to see if the page has a device or tracked writes, which a bus page sees to.
+        if (self._readdevices[page] is not None or self._writedevices[page] is not None or
+                self._dirtymaps[page] is not None):
+
+            if page not in self._buspages:
+                self._pages[page] = BusPage(values, self, page)
+                self._owned[page] = True
+                self._buspages.add(page)
+
+        # Otherwise keep it a plain list, which reads and writes at full speed.
+        elif page in self._buspages:
+            self._pages[page] = list(values)
+            self._owned[page] = True
+            self._buspages.discard(page)
+
+    def _checkedread(self, address):
+
+        # Read the value.
+        value = Memory.readbyte(self, address)
+
+        # Let the hook see the read.
+        if self._readhook is not None:
+            self._readhook(address, value)
+
+        # Check to see if this is a watched address (only watched pages pay for the set lookup).
+        if self._readwatchpages[address >> 8] and address in self._readwatches and self._watchcallback is not None:
+            self._watchcallback(address, value, False)
+
+        return value
+
+    def _checkedwrite(self, address, value):
+
+        # Let the hook see the write.
+        if self._writehook is not None:
+            self._writehook(address, value)
+
+        # Check to see if this is a watched address (only watched pages pay for the set lookup).
+        if self._writewatchpages[address >> 8] and address in self._writewatches and self._watchcallback is not None:
+            self._watchcallback(address, value, True)
+
+        # Store the value.
+        Memory.writebyte(self, address, value)
 
     def load(self, address, sourcelines, counterinfile):
 
-        # The memory offset.
+        # The memory offset, the first program counter in the file and the end of the program.
         offset = 0
+        firstcounter = None
+        end = address
 
         # Check to see that we have a valid start address.
         if (address is not None) and (-1 < address < 65535):
@@ -37,8 +422,18 @@ class Memory(object):
                 # Loop through data.
                 for idx, value in enumerate(lineparts):
 
-                    # Check to see if we should skip the program counter.
-                    if counterinfile is False or idx > 0:
+                    # Check to see if this is the program counter, which places the line (relative to the first line, so
+                    # the program can still be loaded at another address).
+                    if counterinfile and idx == 0:
+
+                        counter = int(value, 16)
+
+                        if firstcounter is None:
+                            firstcounter = counter
+
+                        offset = counter - firstcounter
+
+                    else:
 
                         # Convert to int.
                         intval = int(value, 16)
@@ -50,26 +445,32 @@ class Memory(object):
                             if address + offset < 65535:
 
                                 # Load memory with data.
-                                self._memmap[address + offset] = intval
+                                self.writebyte(address + offset, intval)
 
                                 # increment counter.
                                 offset += 1
+                                end = max(end, address + offset)
 
                             else:
                                 print("ERROR: Memory overflow.")
                                 break
                         else:
-                            print("ERROR: Invalid value at address 0x" + str(self._memmap[address + offset]))
+                            print("ERROR: Invalid value at address 0x" + str(self.readbyte(address + offset)))
                             break
         else:
             print("ERROR: Invalid starting address 0x" + str(address))
 
-        return address + offset
+        return end
 
     def clear(self):
 
         # Clear out all memory.
-        self._memmap = [0] * 65536
+        self._pages = [[0] * self.PAGESIZE for _ in range(self._pagecount)]
+        self._owned = [True] * self._pagecount
+
+        # Put back the bus pages.
+        for page in self._buspages:
+            self._pages[page] = BusPage(self._pages[page], self, page)
 
     def dump(self, address, length, verbose=False, output=None):
 
@@ -80,7 +481,7 @@ class Memory(object):
         if (address is not None) and (-1 < address < 65535):
 
             # Loop through range.
-            for cell in self._memmap[address:(address + length + 1)]:
+            for cell in self.readblock(address, length + 1):
 
                 # Check to see if this is a new line.
                 if factor % 16 == 0:
@@ -1,7 +1,12 @@
 import argparse
+import os
+from acia import ACIA
 from assembler import Assembler
 from disassembler import Disassembler
+from display import TextDisplay
+from opcodecoverage import OpcodeCoverage
 from processor import Processor
+from symbols import Symbols
 
 app_version = "1.23"
 
@@ -24,6 +29,26 @@ parser.add_argument("-s", "--startaddress", action="store", dest="startaddr", de
                     help="The start address in hex for the program.")
 parser.add_argument("-c", "--counter", action="store_true", dest="counter", default=False,
                     help="Output program counter as part of output file.")
+parser.add_argument("-r", "--record", action="store_true", dest="record", default=False,
+                    help="Record execution history so the debugger can step backwards.")
+parser.add_argument("-x", "--trace", action="store", dest="trace", default=None,
+                    help="Record an instruction trace and save it to this file (.bin for binary records).")
+parser.add_argument("-f", "--profile", action="store", dest="profile", default=None,
+                    help="Profile execution, printing a report and writing collapsed stacks to this file.")
+parser.add_argument("-l", "--labels", action="store", dest="labels", default=None,
+                    help="Label file written when assembling and used to name addresses when profiling.")
+parser.add_argument("-k", "--clock", action="store", dest="clock", type=float, default=None,
+                    help="Run at this clock rate in MHz instead of as fast as possible.")
+parser.add_argument("-u", "--serial", action="store", dest="serial", default=None,
+                    help="Connect a 6551 ACIA at $7F70 to stdio, tcp:PORT or a file of scripted input.")
+parser.add_argument("-n", "--display", action="store", dest="display", default=None,
+                    help="Render the text screen at $0400 to this file (.png or .ppm), or to the terminal with ansi.")
+parser.add_argument("-m", "--coverage", action="store", dest="coverage", default=None,
+                    help="Record the opcodes executed, merging with and saving to this bitmap file, and print a report.")
+parser.add_argument("-b", "--memoize", action="store", dest="memoize", type=int, default=None,
+                    help="Cache up to this many calls of subroutines that only work on memory, and replay them.")
+parser.add_argument("-z", "--invalid", action="store", dest="invalid", default="halt", choices=("trap", "nop", "halt"),
+                    help="What to do with an invalid opcode: trap into the debugger, skip it as a NOP or halt.")
 parser.add_argument("-p", "--program", action="store_true", dest="program", default=False,
                     help="Program counter is present in the input file.")
 
@@ -59,6 +84,11 @@ try:
         # Assemble file.
         handler.assemble()
 
+        # Check to see if we should save the labels.
+        if args.labels:
+            with open(args.labels, mode='w') as labelfile:
+                handler.writelabels(labelfile)
+
     elif args.disassemble:
 
         # Check to see if a start address was added.
@@ -90,10 +120,89 @@ try:
         # Set up processor.
         handler = Processor(infile, outfile, intval, args.counter, args.debug, args.program)
 
+        # Set what happens on an invalid opcode.
+        handler.setinvalidopcodepolicy(args.invalid)
+
+        # Check to see if we should record opcode coverage (kept in the instruction table as it is reloaded).
+        coverage = None
+
+        if args.coverage:
+            coverage = OpcodeCoverage()
+            coverage.load(args.coverage)
+            coverage.attach(handler)
+
+        # Check to see if we should record history for the debugger.
+        if args.record:
+            handler.enablehistory()
+
+        # Check to see if we should record an instruction trace.
+        if args.trace:
+            handler.enabletrace(tracefile=args.trace)
+
+        # Check to see if we should profile.
+        if args.profile:
+            handler.enableprofiler(Symbols.load(args.labels) if args.labels else None)
+
+        # Check to see if we should cache subroutine calls.
+        if args.memoize:
+            handler.enablememoizer(args.memoize)
+
+        # Check to see if we should run at a fixed clock rate.
+        if args.clock:
+            handler.setclockrate(args.clock * 1000000)
+
+        # Check to see if we should connect a serial port.
+        acia = ACIA.fromspec(args.serial) if args.serial else None
+
+        if acia is not None:
+            acia.attach(handler)
+
+        # Check to see if we should render the text screen.
+        display = None
+
+        if args.display:
+            display = TextDisplay(TextDisplay.readfont(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                    "character.rom")))
+
+            # Draw the terminal as the program runs, or the image file once it ends.
+            display.attach(handler, refresh=display.writeansi if args.display == "ansi" else None)
+
         # Execute code.
         handler.run(args.debug)
         handler.showcpustate()
 
+        # Save and show the opcode coverage.
+        if coverage is not None:
+            coverage.save(args.coverage)
+            coverage.report()
+
+        # Draw the final screen.
+        if display is not None:
+            if args.display == "ansi":
+                display.writeansi()
+
+            else:
+                display.save(args.display)
+
+        # Send any serial output still buffered and close the port.
+        if acia is not None:
+            acia.close()
+
+        # Show how well the call cache did.
+        if handler.memoizer is not None:
+            handler.memoizer.report()
+
+        # Save the instruction trace.
+        if args.trace:
+            handler.tracer.save(args.trace)
+
+        # Show the profile and save the collapsed stacks.
+        if args.profile:
+            handler.profiler.report()
+
+            with open(args.profile, mode='w') as profilefile:
+                handler.profiler.writecollapsed(profilefile)
+
     # Close the files.
     infile.close()
     outfile.close()
@@ -7,16 +7,18 @@ class MFCBase(object):
 
         self.__infile = infile
         self.__outfile = outfile
-        self.__opcodes = dict()
-        self.__sourcelines = list()
-        self.__bytecount = 0
         self.__includecounter = includecounter
         self.__counterinfile = counterinfile
 
+        # The program counter, source lines and assembly state are plain attributes, as they are used on every line.
+        self.opcodes = dict()
+        self.sourcelines = list()
+        self.bytecount = 0
+
         if not startaddr:
-            self.__pc = 0x1000
+            self.pc = 0x1000
         else:
-            self.__pc = startaddr
+            self.pc = startaddr
 
     def writeline(self, value):
 
@@ -40,8 +42,8 @@ class MFCBase(object):
 
                 line = line.strip()
 
-                # Convert line to upper case (in case the developer didn't).
-                line = line.upper()
+                # Convert line to upper case (in case the developer didn't), leaving quoted text as it is.
+                line = '"'.join(part if index % 2 else part.upper() for index, part in enumerate(line.split('"')))
 
                 # Convert tabs to spaces.
                 line = re.sub("\t", " ", line)
@@ -53,10 +55,10 @@ class MFCBase(object):
                     continue
 
                 # Add to source list.
-                self.__sourcelines.append(line)
+                self.sourcelines.append(line)
 
             # Report lines parsed.
-            print("Finishing parsing %s source lines..." % len(self.__sourcelines))
+            print("Finishing parsing %s source lines..." % len(self.sourcelines))
 
         except:
             raise Exception("Error in parsing file.")
@@ -76,35 +78,3 @@ class MFCBase(object):
     @property
     def counterinfile(self):
         return self.__counterinfile
-
-    @property
-    def pc(self):
-        return self.__pc
-
-    @pc.setter
-    def pc(self, value):
-        self.__pc = value
-
-    @property
-    def sourcelines(self):
-        return self.__sourcelines
-
-    @sourcelines.setter
-    def sourcelines(self, value):
-        self.__sourcelines = value
-
-    @property
-    def opcodes(self):
-        return self.__opcodes
-
-    @opcodes.setter
-    def opcodes(self, value):
-        self.__opcodes = value
-
-    @property
-    def bytecount(self):
-        return self.__bytecount
-
-    @bytecount.setter
-    def bytecount(self, value):
-        self.__bytecount = value
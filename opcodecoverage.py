@@ -0,0 +1,127 @@
+import functools
+import os
+
+import instructionspec
+
+
+class OpcodeCoverage(object):
+
+    # Opcodes of the branches, which are named by mnemonic alone like the implied instructions.
+    RELATIVE = frozenset(opcode for mnemonic, mode, opcode, cycles, pagecross in instructionspec.INSTRUCTIONS
+                         if mode == "relative")
+
+    def __init__(self):
+
+        # Bitmap of the opcodes executed, one byte per opcode.
+        self.opcodes = bytearray(256)
+
+        # Handler names for the valid opcodes (None for opcodes with no instruction), taken from the processor.
+        self.names = [None] * 256
+
+    def attach(self, processor):
+
+        # Name the opcodes from the processor's handlers (handleLDAimmediate becomes LDAimmediate).
+        for opcode in processor.validopcodes:
+            self.names[opcode] = processor.instructions[opcode].__name__[len("handle"):]
+
+        # Put a stub in each slot of the table that marks the opcode then puts the real handler back, so each opcode
+        # pays for coverage once.  The stubs go in a copy of the table for this processor, since the table is shared.
+        # The processor attaches the coverage again whenever it reloads the table.
+        instructions = processor.instructions = list(processor.instructions)
+        processor.coverage = self
+
+        for opcode in range(256):
+
+            if not self.opcodes[opcode]:
+                instructions[opcode] = self.stub(instructions, opcode)
+
+        # The free run table is built again from the stubs.
+        processor._fastinstructions = None
+
+    def stub(self, instructions, opcode):
+
+        handler = instructions[opcode]
+
+        @functools.wraps(handler)
+        def first(processor):
+
+            # Mark the opcode, restore the handler and run it.
+            self.opcodes[opcode] = 1
+            instructions[opcode] = handler
+
+            # The free run table has the stub too, so build it again without it (swapping it in if it's running).
+            if processor._fastinstructions is not None:
+
+                running = processor.instructions is processor._fastinstructions
+                processor._fastinstructions = None
+
+                # It is built from the table the stubs are in, so put that back first.
+                if running:
+                    processor.instructions = instructions
+                    processor.instructions = processor.fastinstructions()
+
+            handler(processor)
+
+        return first
+
+    def load(self, path):
+
+        # Merge in the bitmap from another run (so a corpus can be covered run by run).
+        if os.path.exists(path):
+            with open(path, mode='rb') as infile:
+                for opcode, hit in enumerate(infile.read(256)):
+                    self.opcodes[opcode] |= hit
+
+    def save(self, path):
+
+        # Write the bitmap.
+        with open(path, mode='wb') as output:
+            output.write(bytes(self.opcodes))
+
+    def modes(self):
+
+        modes = dict()
+
+        # Count the valid opcodes and those executed by addressing mode (the handler name after the mnemonic).
+        for opcode, name in enumerate(self.names):
+
+            if name is not None:
+                mode = name[3:] or ("relative" if opcode in self.RELATIVE else "implied")
+                total, executed = modes.get(mode, (0, 0))
+                modes[mode] = (total + 1, executed + self.opcodes[opcode])
+
+        return modes
+
+    def report(self, output=None):
+
+        lines = []
+        valid = [opcode for opcode in range(256) if self.names[opcode] is not None]
+        executed = [opcode for opcode in valid if self.opcodes[opcode]]
+
+        # Overall coverage.
+        lines.append("Opcodes executed: %d of %d" % (len(executed), len(valid)))
+        lines.append("")
+
+        # Coverage by addressing mode.
+        lines.append("%-24s %8s %8s" % ("Mode", "Executed", "Total"))
+
+        for mode, (total, count) in sorted(self.modes().items()):
+            lines.append("%-24s %8d %8d" % (mode, count, total))
+
+        lines.append("")
+
+        # Valid opcodes never executed.
+        lines.append("Not executed: " + " ".join("%02X:%s" % (opcode, self.names[opcode]) for opcode in valid
+                                                 if not self.opcodes[opcode]))
+
+        # Invalid opcodes that were hit.
+        invalid = [opcode for opcode in range(256) if self.names[opcode] is None and self.opcodes[opcode]]
+        lines.append("Invalid opcodes hit: " + (" ".join("%02X" % opcode for opcode in invalid) or "none"))
+
+        # Print the report, or write it to the output file.
+        for line in lines:
+            if output is None:
+                print(line)
+
+            else:
+                output.write(line + "\n")
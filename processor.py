@@ -1,2555 +1,1191 @@
+import alu
+import asyncio
+import copy
+import instructionspec
+from breakpoints import Breakpoints
+from cpustate import CPUState
 from datetime import datetime
+from history import History
+from hooks import Hooks
+from interrupts import InterruptController
+from memoizer import Memoizer
 from memory import Memory
 from mfcbase import MFCBase
+from profiler import Profiler
+from throttle import Throttle
+from tracer import Tracer
 
 
-class Processor(MFCBase):
+class Processor(CPUState):
     COMMANDS = """
+    a = watch memory (a@address:mode, mode r, w or rw ex. a@0200:w)
+    b = step back (b@count ex. b@10, needs history)
     c = show cpu state
+    d = show instruction trace (d or d@count ex. d@50, needs trace)
     e = execute next instruction
     f = continue (free run)
     h = print this list of commands
+    k = set breakpoint (k@address or k@address:condition ex. k@C004:a==0 and mem(0x10)>3)
+    l = list breakpoints and watchpoints
     m = dump memory contents (m@address ex. m@C004)
     p = print current instruction
     r = reset cpu
     s = dump stack
     t = halt program
+    u = remove breakpoint or watchpoint (u@address)
+    w = run back to last write of address (w@address ex. w@0200, needs history)
     z = dump zero page
     """
 
-    def __init__(self, infile, outfile, startaddr, includecounter, verbose, counterinfile):
-
-        # These represent the program counter, a, x, y registers, stack pointer, processor flags, and a cycle counter.
-        self.pc = 0x0000
-        self.a = 0x00
-        self.x = 0x00
-        self.y = 0x00
-        self.sp = 0x01FF
-        self.pf = 0x00
-        self.cy = 0
-
-        # 64k RAM.
-        self.maxmemory = 65536
-
-        # The table of opcodes and their execution handlers.
-        self.instructions = None
-
-        # Flag to indicate logging to file.
-        self.verbose = verbose
-
-        # The end address of the loaded program.
-        self.endaddress = 0
-
-        # Flag to keep stepping through program (for debugging).
-        self.nextstep = True
-
-        # Flag to switch off command request (for debugging).
-        self.stopbetweensteps = True
-
-        # Load the allowable instructions.
-        self.loadinstructionset()
-
-        # Superclass init.
-        super(Processor, self).__init__(infile, outfile, startaddr, includecounter, counterinfile)
-
-        # Initialize memory (64k).
-        self._memory = Memory(self.maxmemory)
-
-        # Parse the input file.
-        self.parse()
-
-        # Load program into memory.
-        self.endaddress = self.loadmemory(startaddr, self.sourcelines)
-
-        # Set the program counter.
-        self.pc = startaddr
-
-    # region CPU Control
-
-    def reset(self):
-
-        # Reset registers.
-        self.a = 0x00
-        self.x = 0x00
-        self.y = 0x00
-        self.sp = 0xff
-
-        # Reset flags
-        self.pf = Flags.BREAK | Flags.UNUSED
-
-        # Read the data from the reset vector.
-        addrlow = self._memory.readbyte(Vectors.RESET_ADDR_LOW)
-        addrhigh = self._memory.readbyte(Vectors.RESET_ADDR_HIGH)
-
-        # Check to see that we have valid reset vector address.
-        if (self.validateaddress(addrlow)) and (self.validateaddress(addrhigh)):
-
-            # Set program counter to address.
-            self.pc = (addrlow & 0xff) | ((addrhigh << 8) & 0xff00)
-
-            return True
-        else:
-            print("ERROR: Bad reset vector address %s,%s" %
-                  (format(str(self._memory.readbyte(addrlow)), '02X'),
-                   format(str(self._memory.readbyte(addrhigh)), '02X')))
-            return False
-
-    def run(self, singlestep):
-
-        # Assign the single step value.
-        self.stopbetweensteps = singlestep
-
-        # Begin message.
-        self.writeheadermessage()
-
-        # Loop through the code that is loaded in memory.
-        while self.pc <= self.endaddress and self.nextstep:
-
-            # Check to see if we are in free run mode.
-            if self.stopbetweensteps:
-
-                # Show the interactive debugger.
-                self.showdebugger()
-
-            # We are in free run mode.
-            else:
-
-                # Execute the next operation.
-                self.executestep()
-
-        # Check to see if we are in verbose mode.
-        if self.verbose:
-
-            # Write cpu state for final execution.
-            self.showcpustate()
-
-        # End message.
-        self.writefootermessage()
-
-    def executestep(self):
-
-        # Fetch the first instruction.
-        opcode = self._memory.readbyte(self.pc)
-
-        # Get the command from the supported opcodes.
-        instruction = self.instructions[opcode]
-
-        # Increment program counter.
-        self.pc += 1
-
-        # Execute instruction.
-        instruction()
-
-    def showdebugger(self):
-
-        # Get input from user.
-        command = input("Enter Debugger Command (h for list of commands):").lower()
-
-        # Process user command.
-        if command[0] == 'c':
-            # Print CPU state.
-            self.showcpustate()
-
-        elif command[0] == 'e':
-            # Execute steps stopping between steps.
-            self.executestep()
-
-        elif command[0] == 'f':
-            # Switch to free run mode.
-            self.stopbetweensteps = False
-
-        elif command[0] == 'h':
-            # Print list of commands.
-            print(self.COMMANDS)
-
-        elif command[0] == 'm':
-            # Get the address.
-            addr = int(command[2:], 16)
-
-            # Print the value of that address.
-            print("Value at address %04x is %02x" % (addr, self._memory.readbyte(addr)))
-
-        elif command[0] == 'p':
-            # Get the current byte.
-            opcode = self._memory.readbyte(self.pc)
-
-            # Print the opcode.
-            print("Current opcode: %02x" % opcode)
-
-        elif command[0] == 's':
-            # Print stack memory.
-            self.dumpstack()
-
-        elif command[0] == 't':
-            # End execution.
-            self.nextstep = False
-
-        elif command[0] == 'z':
-            # Print zero page memory.
-            self.dumpzeropage()
-
-    def showcpustate(self):
-
-        # Get string versions of the byte values.
-        str_pc = self.twobytestostring(self.pc)
-        str_a = self.onebytetostring(self.a)
-        str_x = self.onebytetostring(self.x)
-        str_y = self.onebytetostring(self.y)
-        str_sp = self.onebytetostring(self.sp & 0xFF)
-        str_pf = self.onebytetostring(self.pf)
-
-        # Output to screen.
-        print("PC:" + str_pc + " A:" + str_a + " X:" + str_x + " Y:" + str_y + " SP:" + str_sp + " Flags:" + str_pf +
-              " CPU Cycles:" + str(self.cy))
-
-        # Check to see if we should be logging to file.
-        if self.verbose:
-
-            # Write to output file.
-            self.writeline("PC:" + str_pc + " A:" + str_a + " X:" + str_x + " Y:" + str_y + " SP:" + str_sp + " Flags:" + str_pf +
-                           " CPU Cycles:" + str(self.cy))
-
-    def dumpzeropage(self):
-
-        # Print the zero page memory contents.
-        self._memory.dump(0x00, 0xFF)
-
-    def dumpstack(self):
-
-        # Print stack contents.
-        self._memory.dump(0x0100, 0xFF)
-
-    def loadmemory(self, startaddress, data):
-
-        # Load the data into memory.
-        return self._memory.load(startaddress, data, self.includecounter)
-
-    # endregion
-
-    # region Helper Methods
-
-    def writeheadermessage(self):
-
-        # Output to screen.
-        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
-        print("; MFC6502 - Execution Begins: %s" % datetime.now())
-        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
-
-        if self.verbose:
-
-            # Write output to file.
-            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
-            self.writeline("; MFC6502 - Execution Begins: %s" % datetime.now())
-            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
-
-    def writefootermessage(self):
-
-        # Output to screen.
-        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
-        print("; MFC6502 - Execution Ends: %s" % datetime.now())
-        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
-
-        if self.verbose:
-
-            # Write output to file.
-            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
-            self.writeline("; MFC6502 - Execution Begins: %s" % datetime.now())
-            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
-
-    def onebytetostring(self, value):
-        return "0x%02x" % value
-
-    def twobytestostring(self, value):
-        return "0x%04x" % value
-
-    # TODO: Need to calculate accurate cycle times for calculations that cross page boundries.
-    def calcuateaddress(self, useonebyte, offset):
-
-        address = -1
-
-        # Check to see if we are basing the address on one byte or two.
-        if useonebyte:
-
-            # Calculate the correct address.
-            address = (self._memory.readbyte(self.pc) + offset) & 0xFF
-
-        else:
-            # Calculate the correct address.
-            address = self._memory.readbyte(self.pc) + (0x100 * self._memory.readbyte(self.pc + 1)) + offset
-
-        # Check to make sure it is a valid address.
-        self.validateaddress(address)
-
-        return address
-
-    # TODO: Need to calculate accurate cycle times for calculations that cross page boundries.
-    def calculaterelativeaddress(self, address):
-
-        # First increment the address.  This is because relative address is PC + 1.
-        address += 1
-
-        # If the address is less than 128, just return it, otherwise subtract 256 from it and return it.
-        return address if address < 0x80 else address - 0x100
-
-    # TODO: Need to calculate accurate cycle times for calculations that cross page boundries.
-    def calculateindexedaddress(self, offset):
-
-        # This holds any additional cycle timing that needs to be added due to page boundry crossing.
-        addcycle = 0
-
-        # Calculate the address as base + offset to get first byte.
-        lowbyte = (self._memory.readbyte(self.pc) + offset) & 0xFF
-
-        # Check to see if we wrapped zero page (for additional processor cycle)
-        if lowbyte < offset:
-            # Increase the cycle offset.
-            addcycle = 1
-
-        # Now get the high byte.
-        address = lowbyte + (0x100 * self._memory.readbyte(lowbyte + 1))
-
-        # Check to see if this is valid.
-        self.validateaddress(address)
-
-        return address, addcycle
-
-    # TODO: Need to calculate accurate cycle times for calculations that cross page boundries.
-    def calculateindirectaddress(self, offset):
-
-        # This holds any additional cycle timing that needs to be added due to page boundry crossing.
-        addcycle = 0
-
-        # Calculate the address as base + offset to get first byte.
-        lowbyte = self._memory.readbyte(self.pc) & 0xFF
-
-        # Check to see if we wrapped zero page (for additional processor cycle)
-        if lowbyte < offset:
-            # Increase the cycle offset.
-            addcycle = 1
-
-        # Now get the high byte.
-        address = (lowbyte + (0x100 * self._memory.readbyte(lowbyte + 1))) + offset
-
-        # Check to see if this is valid.
-        self.validateaddress(address)
-
-        return address, addcycle
-
-    def validateaddress(self, address):
-        if address < 0 or address > self.maxmemory:
-            print("Invalid address: ${0:04X}".format(address))
-            return False
-
-        else:
-            return True
-
-    def converttobcd(self, value):
-
-        # Mask LSbit to see if that digit is greater than 9.
-        if value & 0x0F > 0x09:
-            # Roll the digit.
-            value += 0x06
-
-        # Mast MSbit to see if that digit is greater than 9.
-        if value & 0xF0 > 0x90:
-            # Roll that digit.
-            value += 0x60
-
-        return value
-
-    # endregion
-
-    # region ALU Helpers
-    def addvalues(self, val1, val2):
-
-        # Do the math A+M+C.
-        result = val1 + val2 + self.getflag(Flags.CARRY)
-
-        # Check to see if this is BCD mode.
-        if self.getflag(Flags.DECIMAL):
-
-            # Do the conversion to BCD.
-            result = self.converttobcd(result)
-
-            # Now check to see if we need to set carry.
-            self.setflag(Flags.CARRY, (result > 0x99))
-
-        else:
-
-            # Set carry and overflow based on result.
-            self.setflag(Flags.CARRY, (result > 0xFF))
-            self.setflag(Flags.OVERFLOW, (val1 < 128 and val2 < 128 and result > 127))
-
-        # Return the 2 byte result.
-        return result & 0xFF
-
-    def subtractvalues(self, val1, val2):
-
-        # Do the math A-M-(1-C).
-        result = val1 - val2 - (1 - self.getflag(Flags.CARRY))
-
-        # Check to see if this is BCD mode.
-        if self.getflag(Flags.DECIMAL):
-
-            # Do the conversion to BCD.
-            result = self.converttobcd(result)
-
-            # Now check to see if we need to set carry.
-            self.setflag(Flags.CARRY, (result > 0x99))
-
-        else:
-
-            # Set carry and overflow based on result.
-            self.setflag(Flags.CARRY, (result <= 0xFF))
-            self.setflag(Flags.OVERFLOW, (val1 < 128 and val2 < 128 and result > 127))
-
-        # Return the 2 byte result.
-        return result & 0xFF
-
-    def comparevalues(self, val1, val2):
-
-        # Set flags.
-        self.setflag(Flags.CARRY, (val1 >= val2))
-        self.setflag(Flags.ZERO, (val1 == val2))
-        self.setflag(Flags.NEGATIVE, (val1 & 0x80))
-
-    # endregion
-
-    # region Stack Helpers
-    def pushstack8(self, value):
-
-        # Push value to current stack pointer.
-        self._memory.writebyte(self.sp, value)
-
-        # Decrement stack pointer.
-        self.sp -= 1
-
-    def popstack8(self):
-
-        # Increment the stack pointer.
-        self.sp += 1
-
-        # Return the value at this address.
-        return self._memory.readbyte(self.sp)
-
-    def pushstack16(self, value):
-
-        # Push the first byte to stack pointer.
-        self._memory.writebyte(self.sp, (value & 0xFF))
-
-        # Push the high byte to the stack.
-        self._memory.writebyte((self.sp - 1), ((value >> 8) & 0xFF))
-
-        # Decrement the stack pointer
-        self.sp -= 2
-
-    def popstack16(self):
-
-        # Increment the stack pointer.
-        self.sp += 2
-
-        # Return the combined value of the stack pointer low byte + the high byte.
-        value = self._memory.readbyte(self.sp) + (0x100 * self._memory.readbyte(self.sp - 1))
-
-        return value
-
-    # endregion
-
-    # region Flag Helpers
-    def getflag(self, flag):
-
-        return self.pf & flag
-
-    def setflag(self, flag, value):
-
-        if value:
-            self.pf |= flag
-
-        else:
-            self.pf &= ~flag
-
-    # endregion
-
-    # region Opcode Handlers
-
-    # region ADC
-    def handleADCimmediate(self):
-
-        # Perform operation.
-        self.handleADCbase(self.pc, 1, 2)
-
-    def handleADCzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleADCbase(address, 1, 3)
-
-    def handleADCzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleADCbase(address, 1, 4)
-
-    def handleADCabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleADCbase(address, 2, 4)
-
-    def handleADCabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleADCbase(address, 2, 4)
-
-    def handleADCabsolutey(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
-
-        # Perform operation.
-        self.handleADCbase(address, 2, 4)
-
-    def handleADCindexedindirect(self):
-
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
-
-        # Perform operation.
-        self.handleADCbase(address, 1, 6)
-
-    def handleADCindirectindexed(self):
-
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
-
-        # Perform operation.
-        self.handleADCbase(address, 1, (5 + cycle))
-
-    def handleADCbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Update accumulator with result.
-        self.a = self.addvalues(self.a, val)
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region AND
-    def handleANDimmediate(self):
-
-        # Perform operation.
-        self.handleANDbase(self.pc, 1, 2)
-
-    def handleANDzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleANDbase(address, 1, 3)
-
-    def handleANDzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleANDbase(address, 1, 4)
-
-    def handleANDabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleANDbase(address, 2, 4)
-
-    def handleANDabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleANDbase(address, 2, 4)
-
-    def handleANDabsolutey(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
-
-        # Perform operation.
-        self.handleANDbase(address, 2, 4)
-
-    def handleANDindexedindirect(self):
-
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
-
-        # Perform operation.
-        self.handleANDbase(address, 2, 6)
-
-    def handleANDindirectindexed(self):
-
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
-
-        # Perform operation.
-        self.handleANDbase(address, 2, (5 + cycle))
-
-    def handleANDbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Update accumulator with result.
-        self.a &= val
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region ASL
-    def handleASLaccumulator(self):
-
-        # Take the high bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x80))
-
-        # Rotate the value to the left << one place.  Bit 0 is set to 0.
-        self.a = (self.a << 1) & 0xFE
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
-
-        # Update cycle counter.
-        self.cy += 2
-
-    def handleASLzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleASLbase(address, 1, 5)
-
-    def handleASLzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleASLbase(address, 1, 6)
-
-    def handleASLabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleASLbase(address, 2, 6)
-
-    def handleASLabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleASLbase(address, 2, 7)
-
-    def handleASLbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Take the high bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x80))
-
-        # Rotate the value to the left << one place.  Bit 0 is set to 0.
-        val = (val << 1) & 0xFE
-
-        # Write the value back to memory.
-        self._memory.writebyte(address, val)
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region BCC
-    def handleBCC(self):
-
-        # Check to see if the carry flag is clear.
-        if self.getflag(Flags.CARRY):
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-        else:
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-    # endregion
-
-    # region BCS
-    def handleBCS(self):
-
-        # Check to see if the carry flag is set.
-        if self.getflag(Flags.CARRY):
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-        else:
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-    # endregion
-
-    # region BEQ
-    def handleBEQ(self):
-
-        # Check to see if the zero flag is set.
-        if self.getflag(Flags.ZERO):
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-        else:
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-    # endregion
-
-    # region BIT
-    def handleBITzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleBITbase(address, 1, 3)
-
-    def handleBITabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleBITbase(address, 2, 4)
-
-    def handleBITbase(self, address, pcoffset, cycles):
-
-        # Perform and on accumulator and value in memory.
-        result = self.a & self._memory.readbyte(address)
-
-        # Set flags according to result. Negative flag gets bit 7 if set, and overflow gets bit 6 if set.
-        self.setflag(Flags.ZERO, (result == 0))
-        self.setflag(Flags.NEGATIVE, (result & 0x80))
-        self.setflag(Flags.OVERFLOW, (result & 0x40))
-
-    # endregion
-
-    # region BMI
-    def handleBMI(self):
-
-        # Check to see if the negative flag is set.
-        if self.getflag(Flags.NEGATIVE):
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-        else:
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-    # endregion
-
-    # region BNE
-    def handleBNE(self):
-
-        # Check to see if the zero flag is clear.
-        if self.getflag(Flags.ZERO):
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-        else:
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-    # endregion
-
-    # region BPL
-    def handleBPL(self):
-
-        # Check to see if the negative flag is clear.
-        if self.getflag(Flags.NEGATIVE):
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-        else:
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-    # endregion
-
-    # region BRK
-    def handleBRK(self):
-
-        # Increment program counter.
-        self.pc += 2
-
-        # Set break flag.
-        self.setflag(Flags.BREAK, 1)
-
-        # Store the pc on the stack.
-        self.pushstack16(self.pc)
-
-        # Store the pf on the stack.
-        self.pushstack8(self.pf)
-
-        # Set the inturrupt flag.
-        self.setflag(Flags.INTERRUPT, 1)
-
-        # Load the pc with the inturrupt address vector contents.
-        self.pc = self._memory.readtwobytes(Vectors.IRQ_ADDR_LOW)
-
-        # Enter debugger.
-        self.showdebugger()
-
-    # endregion
-
-    # region BVC
-    def handleBVC(self):
-
-        # Check to see if the overflow flag is clear.
-        if self.getflag(Flags.OVERFLOW):
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-        else:
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-    # endregion
-
-    # region BVS
-    def handleBVS(self):
-
-        # Check to see if the overflow flag is set.
-        if self.getflag(Flags.OVERFLOW):
-
-            # Get address.
-            address = self.calcuateaddress(True, 0)
-
-            # Calculate new pc location.
-            self.pc += self.calculaterelativeaddress(address)
-
-            # Update cycle counter.
-            self.cy += 3
-
-        else:
-
-            # Update program and cycle counters.
-            self.pc += 1
-            self.cy += 2
-
-    # endregion
-
-    # region CLC
-    def handleCLC(self):
-
-        # Clear flag value.
-        self.setflag(Flags.CARRY, 0)
-
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
-
-    # endregion
-
-    # region CLD
-    def handleCLD(self):
-
-        # Clear flag value.
-        self.setflag(Flags.DECIMAL, 0)
-
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
-
-    # endregion
-
-    # region CLI
-    def handleCLI(self):
-
-        # Clear flag value.
-        self.setflag(Flags.INTERRUPT, 0)
-
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
-
-    # endregion
-
-    # region CLV
-    def handleCLV(self):
-
-        # Clear flag value.
-        self.setflag(Flags.OVERFLOW, 0)
-
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
-
-    # endregion
-
-    # region CMP
-    def handleCMPimmediate(self):
-
-        # Perform operation.
-        self.handleCMPbase(self.pc, 1, 2)
-
-    def handleCMPzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.pc)
-
-        # Perform operation.
-        self.handleCMPbase(address, 1, 3)
-
-    def handleCMPzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleCMPbase(address, 1, 4)
-
-    def handleCMPabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleCMPbase(address, 2, 4)
-
-    def handleCMPabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleCMPbase(address, 2, 4)
-
-    def handleCMPabsolutey(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
-
-        # Perform operation.
-        self.handleCMPbase(address, 2, 4)
-
-    def handleCMPindexedindirect(self):
-
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
-
-        # Perform operation.
-        self.handleCMPbase(address, 1, 6)
-
-    def handleCMPindirectindexed(self):
-
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
-
-        # Perform operation.
-        self.handleCMPbase(address, 1, (5 + cycle))
-
-    def handleCMPbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Do the comparison between accumulator and value.
-        self.comparevalues(self.a, val)
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region CPX
-    def handleCPXimmediate(self):
-
-        # Perform operation.
-        self.handleCPXbase(self.pc, 1, 2)
-
-    def handleCPXzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.pc)
-
-        # Perform operation.
-        self.handleCPXbase(address, 1, 3)
-
-    def handleCPXabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleCPXbase(address, 2, 4)
-
-    def handleCPXbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Do the comparison between register and value.
-        self.comparevalues(self.x, val)
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region CPY
-    def handleCPYimmediate(self):
-
-        # Perform operation.
-        self.handleCPYbase(self.pc, 1, 2)
-
-    def handleCPYzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.pc)
-
-        # Perform operation.
-        self.handleCPYbase(address, 1, 3)
-
-    def handleCPYabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleCPYbase(address, 2, 4)
-
-    def handleCPYbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Do the comparison between register and value.
-        self.comparevalues(self.y, val)
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region DEC
-    def handleDECzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleDECbase(address, 1, 5)
-
-    def handleDECzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleDECbase(address, 1, 6)
-
-    def handleDECabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleDECbase(address, 2, 6)
-
-    def handleDECabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleDECbase(address, 2, 7)
-
-    def handleDECbase(self, address, pcoffset, cycles):
-
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
-
-        # Update value.
-        val -= 1
-
-        # Write the new value back.
-        self._memory.writebyte(address, val)
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
-
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
-
-    # endregion
-
-    # region DEX
-    def handleDEX(self):
-
-        # Decrement the x register.
-        self.x -= 1
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
-
-        # Update cycle counters.
-        self.cy += 2
-
-    # endregion
-
-    # region DEY
-    def handleDEY(self):
-
-        # Increment the y register.
-        self.y -= 1
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
-
-        # Update cycle counters.
-        self.cy += 2
-
-    # endregion
-
-    # region EOR
-    def handleEORimmediate(self):
-
-        # Perform operation.
-        self.handleEORbase(self.pc, 1, 2)
-
-    def handleEORzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleEORbase(address, 1, 3)
-
-    def handleEORzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleEORbase(address, 1, 4)
-
-    def handleEORabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleEORbase(address, 2, 4)
-
-    def handleEORabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleEORbase(address, 2, 4)
+    PROMPT = "Enter Debugger Command (h for list of commands):"
 
-    def handleEORabsolutey(self):
+    # Everything else the processor holds, in slots alongside the registers (no instance dictionary).
+    __slots__ = ('_source', '_memory', 'maxmemory', 'instructions', 'invalidopcode', 'validopcodes', 'fusion',
+                 'idleskip', '_idleloops', '_idlestate', '_idlecycle', 'idlecycles', '_runend', '_fastinstructions',
+                 'verbose', 'endaddress', 'nextstep', 'stopbetweensteps', 'history', 'breakpoints', 'tracer',
+                 'tracefile', 'profiler', 'memoizer', 'coverage', 'throttle', 'interrupts', 'hooks', 'executestep')
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
-
-        # Perform operation.
-        self.handleEORbase(address, 2, 4)
-
-    def handleEORindexedindirect(self):
-
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
-
-        # Perform operation.
-        self.handleEORbase(address, 2, 6)
-
-    def handleEORindirectindexed(self):
-
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
+    def __init__(self, infile, outfile, startaddr, includecounter, verbose, counterinfile):
 
-        # Perform operation.
-        self.handleEORbase(address, 2, (5 + cycle))
+        # Superclass init (the registers).
+        super(Processor, self).__init__()
 
-    def handleEORbase(self, address, pcoffset, cycles):
+        # 64k RAM.
+        self.maxmemory = 65536
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+        # The table of all 256 opcodes and their execution handlers, and what to do with opcodes that aren't valid.
+        self.instructions = None
+        self.invalidopcode = "halt"
+        self.validopcodes = frozenset()
 
-        # Update accumulator with result.
-        self.a ^= val
+        # Flag for running common instruction pairs as superinstructions in free run mode.
+        self.fusion = True
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        # Flag for skipping idle polling loops ahead to the next event in free run mode, the cycles per iteration of each
+        # loop checked so far (0 for a loop that can't idle), the state at the end of the last iteration, and the cycles
+        # skipped.
+        self.idleskip = True
+        self._idleloops = {}
+        self._idlestate = None
+        self._idlecycle = 0
+        self.idlecycles = 0
 
-        # Update program EOR cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # The cycle count the current free run stops at, which nothing skips past.
+        self._runend = InterruptController.NEVER
 
-    # endregion
+        # The table used in free run mode, with the superinstructions and idle loop checks.
+        self._fastinstructions = None
 
-    # region INC
-    def handleINCzeropage(self):
+        # Flag to indicate logging to file.
+        self.verbose = verbose
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        # The end address of the loaded program.
+        self.endaddress = 0
 
-        # Perform operation.
-        self.handleINCbase(address, 1, 5)
+        # Flag to keep stepping through program (for debugging).
+        self.nextstep = True
 
-    def handleINCzeropagex(self):
+        # Flag to switch off command request (for debugging).
+        self.stopbetweensteps = True
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+        # Execution history for stepping backwards (for debugging).
+        self.history = None
 
-        # Perform operation.
-        self.handleINCbase(address, 1, 6)
+        # Breakpoints and watchpoints (for debugging).
+        self.breakpoints = Breakpoints()
 
-    def handleINCabsolute(self):
+        # Ring buffer of the last instructions executed, and the file it is saved to on a crash (for debugging).
+        self.tracer = None
+        self.tracefile = None
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # Execution profile by opcode, address and subroutine.
+        self.profiler = None
 
-        # Perform operation.
-        self.handleINCbase(address, 2, 6)
+        # Cache of subroutine calls replayed instead of run again (off unless enabled).
+        self.memoizer = None
 
-    def handleINCabsolutex(self):
+        # Opcode coverage, whose stubs go in the instruction table (off unless attached).
+        self.coverage = None
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+        # Throttle for running at a fixed clock rate (None runs as fast as possible).
+        self.throttle = None
 
-        # Perform operation.
-        self.handleINCbase(address, 2, 7)
+        # Scheduled events and interrupt lines, and the cycle count at which they next need looking at.
+        self.interrupts = InterruptController(self)
 
-    def handleINCbase(self, address, pcoffset, cycles):
+        # Callbacks that observe execution (none to begin with), and the step picked to suit them.
+        self.hooks = Hooks()
+        self.executestep = self.stepplain
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+        # Load the allowable instructions.
+        self.loadinstructionset()
 
-        # Update value.
-        val += 1
+        # The program file, read and written through the file handling base (held here rather than inherited, so the
+        # processor keeps to its slots).
+        self._source = MFCBase(infile, outfile, startaddr, includecounter, counterinfile)
 
-        # Write the new value back.
-        self._memory.writebyte(address, val)
+        # Initialize memory (64k).
+        self._memory = Memory(self.maxmemory)
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
+        # Parse the input file.
+        self._source.parse()
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Load program into memory.
+        self.endaddress = self.loadmemory(startaddr, self._source.sourcelines)
 
-    # endregion
+        # Set the program counter.
+        self.pc = startaddr
 
-    # region INX
-    def handleINX(self):
+    # region CPU Control
 
-        # Increment the x register.
-        self.x += 1
+    def reset(self):
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        # Reset registers.
+        self.a = 0x00
+        self.x = 0x00
+        self.y = 0x00
+        self.sp = 0xff
 
-        # Update cycle counters.
-        self.cy += 2
+        # Reset flags
+        self.pf = Flags.BREAK | Flags.UNUSED
 
-    # endregion
+        # Set program counter to the address in the reset vector.
+        self.pc = self._memory.readtwobytes(Vectors.RESET_ADDR_LOW)
 
-    # region INY
-    def handleINY(self):
+        return True
 
-        # Increment the y register.
-        self.y += 1
+    def fork(self):
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        # Devices are bound to this processor (their callbacks, scheduled events and registers), so they can't follow a
+        # fork.  Fork first, then attach devices to each copy.
+        if self._memory.hasdevices():
+            raise ValueError("Can't fork a processor with devices attached.")
 
-        # Update cycle counters.
-        self.cy += 2
+        # Copy the registers, flags and settings of this processor.
+        child = copy.copy(self)
 
-    # endregion
+        # History, trace and hooks belong to the parent, but the child keeps its own copy of the breakpoints.
+        child.history = None
+        child.tracer = None
+        child.profiler = None
+        child.memoizer = None
+        child.coverage = None
+        child.hooks = Hooks()
+        child.breakpoints = self.breakpoints.copy()
 
-    # region JMP
-    def handleJMPabsolute(self):
+        # The child checks its own loops for idling.
+        child._idleloops = {}
+        child._idlestate = None
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # The child gets its own copy of the scheduled interrupts (device events stay with this processor).
+        child.interrupts = self.interrupts.fork(child)
 
-        # Perform Operation.
-        self.handleJMPbase(address, 2, 3)
+        # The child keeps to the same clock rate, measured on its own.
+        if self.throttle is not None:
+            child.throttle = Throttle(self.throttle.clockrate, self.throttle.slicecycles)
 
-    def handleJMPindirect(self):
+        # Share memory with the child, copying pages only when one of them writes (and marking its own dirty bitmaps).
+        child.setmemory(self._memory.fork())
+        child._memory.copytracking()
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # Bind the instruction table and the step to the child.
+        child.loadinstructionset()
+        child.selectstep()
 
-        # Use this to get the actual jump address.
-        jumpaddress = self._memory.readbyte(address) + (0x100 * self._memory.readbyte(address + 1))
+        return child
 
-        # Perform Operation
-        self.handleJMPbase(jumpaddress, 2, 5)
+    def setmemory(self, memory):
 
-    def handleJMPbase(self, address, pcoffset, cycles):
+        # Swap in the new memory, whose loops haven't been checked for idling.
+        self._memory = memory
+        self._idleloops.clear()
 
-        # Set the program counter to address.
-        self.pc = address
+        # Let the hooks see the new memory's reads and writes.
+        memory.setreadhook(self.hooks.dispatcher(Hooks.MEMORYREAD))
+        memory.setwritehook(self.hooks.dispatcher(Hooks.MEMORYWRITE))
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Watch the new memory.
+        self.breakpoints.install(memory)
 
-    # endregion
+    def irq(self):
 
-    # region JSR
-    def handleJSR(self):
+        # Check to see if interrupts are disabled.
+        if self.getflag(Flags.INTERRUPT):
+            return False
 
-        # Push next instruction onto the stack.
-        self.pushstack16(self.pc + 2)
+        # Enter the IRQ handler.
+        self.interrupt(Vectors.IRQ_ADDR_LOW)
 
-        # Set pc to the address of subroutine.
-        self.pc = self.calcuateaddress(False, 0)
+        return True
 
-        # Update cycle count.
-        self.cy += 6
+    def nmi(self):
 
-    # endregion
+        # Enter the NMI handler (this can't be disabled).
+        self.interrupt(Vectors.NMI_ADDR_LOW)
 
-    # region LDA
-    def handleLDAimmediate(self):
+    def interrupt(self, vector):
 
-        # Perform operation.
-        self.handleLDAbase(self.pc, 1, 2)
+        # A call being recorded for the cache would take in the handler.
+        if self.memoizer is not None:
+            self.memoizer.abort()
 
-    def handleLDAzeropage(self):
+        # Store the pc and the pf (with the break flag clear, since this is not a BRK) on the stack.
+        self.pushstack16(self.pc)
+        self.pushstack8(self.pf & ~Flags.BREAK)
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        # Set the inturrupt flag.
+        self.setflag(Flags.INTERRUPT, 1)
 
-        # Perform operation.
-        self.handleLDAbase(address, 1, 3)
+        # Load the pc with the inturrupt address vector contents.
+        self.pc = self._memory.readtwobytes(vector)
 
-    def handleLDAzeropagex(self):
+        # Count the cycles taken to get to the handler.
+        self.cy += Cycles.INTERRUPT
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+        # Let the hooks see the interrupt.
+        for callback in self.hooks.interrupt:
+            callback(vector)
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, 4)
+    def mapdevice(self, start, end, read=None, write=None, volatile=False, pure=False):
 
-    def handleLDAabsolute(self):
+        # Put a device on the bus at the addresses start to end (inclusive).
+        self._memory.mapdevice(start, end, read, write, volatile, pure)
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # Loops already checked for idling may read the new device.
+        self._idleloops.clear()
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, 4)
+    def unmapdevice(self, start, end):
 
-    def handleLDAabsolutex(self):
+        # Take the device off the bus.
+        self._memory.unmapdevice(start, end)
+        self._idleloops.clear()
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+    def getregisters(self):
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, 4)
+        # Return the registers as a tuple.
+        return self.pc, self.a, self.x, self.y, self.sp, self.pf, self.cy
 
-    def handleLDAabsolutey(self):
+    def setregisters(self, registers):
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
+        # Load the registers from a tuple.
+        self.pc, self.a, self.x, self.y, self.sp, self.pf, self.cy = registers
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, 4)
+    def addhook(self, kind, callback):
 
-    def handleLDAindexedindirect(self):
+        # Register the callback, then pick what runs to suit the hooks now registered.
+        self.hooks.add(kind, callback)
+        self.applyhooks(kind)
 
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
+    def removehook(self, kind, callback):
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, 6)
+        # Unregister the callback, going back to what runs without it.
+        self.hooks.remove(kind, callback)
+        self.applyhooks(kind)
 
-    def handleLDAindirectindexed(self):
+    def applyhooks(self, kind):
 
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
+        # Instruction hooks need the observed step.
+        if kind == Hooks.INSTRUCTION:
+            self.selectstep()
 
-        # Perform operation.
-        self.handleLDAbase(address, 2, (5 + cycle))
+        # Memory hooks go in the memory's accessors.
+        elif kind in (Hooks.MEMORYREAD, Hooks.MEMORYWRITE):
+            self._memory.setreadhook(self.hooks.dispatcher(Hooks.MEMORYREAD))
+            self._memory.setwritehook(self.hooks.dispatcher(Hooks.MEMORYWRITE))
 
-    def handleLDAbase(self, address, pcoffset, cycles):
+        # Call hooks go in the instruction table, which is rebuilt (with any coverage stubs put back).
+        elif kind == Hooks.JSR:
+            self.loadinstructionset()
 
-        # Load the accumulator with value.
-        self.a = self._memory.readbyte(address)
+    def enablehistory(self, interval=1000, journalsize=100000):
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        # Remove any existing history.
+        self.disablehistory()
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Start recording snapshots every interval steps, keeping journalsize steps.
+        self.history = History(self, interval, journalsize)
 
-    # endregion
+    def disablehistory(self):
 
-    # region LDX
-    def handleLDXimmediate(self):
+        # Check to see if we are recording.
+        if self.history is not None:
 
-        # Perform operation.
-        self.handleLDXbase(self.pc, 1, 2)
+            # Stop recording.
+            self.history.detach()
+            self.history = None
 
-    def handleLDXzeropage(self):
+    def enabletrace(self, size=4096, tracefile=None):
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        # Start recording the last size instructions, saving them to tracefile if execution crashes.
+        self.tracer = Tracer(self, size)
+        self.tracefile = tracefile
+        self.selectstep()
 
-        # Perform operation.
-        self.handleLDXbase(address, 1, 3)
+    def disabletrace(self):
 
-    def handleLDXzeropagey(self):
+        # Stop recording instructions.
+        self.tracer = None
+        self.tracefile = None
+        self.selectstep()
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.y)
+    def enableprofiler(self, symbols=None):
 
-        # Perform operation.
-        self.handleLDXbase(address, 1, 4)
+        # Remove any existing profile.
+        self.disableprofiler()
 
-    def handleLDXabsolute(self):
+        # Start counting executions and cycles after each instruction, naming addresses from symbols.
+        self.profiler = Profiler(self, symbols)
+        self.addhook(Hooks.INSTRUCTION, self.profiler.record)
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+    def disableprofiler(self):
 
-        # Perform operation.
-        self.handleLDXbase(address, 2, 4)
+        # Check to see if we are profiling.
+        if self.profiler is not None:
 
-    def handleLDXabsolutey(self):
+            # Stop profiling.
+            self.removehook(Hooks.INSTRUCTION, self.profiler.record)
+            self.profiler = None
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
+    def enablememoizer(self, size=256):
 
-        # Perform operation.
-        self.handleLDXbase(address, 2, 4)
+        # Start caching subroutine calls (up to size of them) in free run mode.
+        self.memoizer = Memoizer(self, size)
+        self._fastinstructions = None
 
-    def handleLDXbase(self, address, pcoffset, cycles):
+    def disablememoizer(self):
 
-        # Load the x register with value.
-        self.x = self._memory.readbyte(address)
+        # Stop caching calls.
+        if self.memoizer is not None:
+            self.memoizer.abort()
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.x == 0))
-        self.setflag(Flags.NEGATIVE, (self.x & 0x80))
+        self.memoizer = None
+        self._fastinstructions = None
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+    def setclockrate(self, clockrate, slicecycles=10000):
 
-    # endregion
+        # Run at clockrate cycles per second, checking the clock every slicecycles cycles (None runs flat out).
+        self.throttle = Throttle(clockrate, slicecycles) if clockrate else None
 
-    # region LDY
-    def handleLDYimmediate(self):
+    def run(self, singlestep):
 
-        # Perform operation.
-        self.handleLDYbase(self.pc, 1, 2)
+        # Assign the single step value.
+        self.stopbetweensteps = singlestep
 
-    def handleLDYzeropage(self):
+        # Begin message.
+        self.writeheadermessage()
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        try:
 
-        # Perform operation.
-        self.handleLDYbase(address, 1, 3)
+            # Loop through the code that is loaded in memory.
+            while self.pc <= self.endaddress and self.nextstep:
 
-    def handleLDYzeropagex(self):
+                # Check to see if we are in free run mode.
+                if self.stopbetweensteps:
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+                    # Show the interactive debugger.
+                    self.showdebugger()
 
-        # Perform operation.
-        self.handleLDYbase(address, 1, 4)
+                # Check to see if there are breakpoints or watchpoints to check.
+                elif self.breakpoints.armed:
 
-    def handleLDYabsolute(self):
+                    # Run until one is hit.
+                    self.runchecked()
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+                # Check to see if we are running at a fixed clock rate.
+                elif self.throttle is not None:
 
-        # Perform operation.
-        self.handleLDYbase(address, 2, 4)
+                    # Run in time slices.
+                    self.runthrottled()
 
-    def handleLDYabsolutex(self):
+                # We are in free run mode.
+                else:
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+                    # Run at full speed.
+                    self.runfree()
 
-        # Perform operation.
-        self.handleLDYbase(address, 2, 4)
+        except Exception:
 
-    def handleLDYbase(self, address, pcoffset, cycles):
+            # Save the instructions that led up to the crash.
+            self.savecrashtrace()
+            raise
 
-        # Load the x register with value.
-        self.y = self._memory.readbyte(address)
+        # Finish off the run.
+        self.endrun()
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.y == 0))
-        self.setflag(Flags.NEGATIVE, (self.y & 0x80))
+    async def runasync(self, singlestep, slicecycles=10000, readcommand=None):
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Assign the single step value.
+        self.stopbetweensteps = singlestep
 
-    # endregion
+        # Begin message.
+        self.writeheadermessage()
 
-    # region LSR
-    def handleLSRaccumulator(self):
+        try:
 
-        # Take the low bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x01))
+            # Loop through the code that is loaded in memory, yielding to the event loop between slices.
+            while self.pc <= self.endaddress and self.nextstep:
 
-        # Rotate the value to the right >> one place.  Bit 7 is set to 0.
-        self.a = (self.a >> 1) & 0x7F
+                # Check to see if we are in free run mode.
+                if self.stopbetweensteps:
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+                    # Wait for a debugger command without blocking the event loop.
+                    await self.showdebuggerasync(readcommand)
 
-        # Update cycle counter.
-        self.cy += 2
+                # Check to see if there are breakpoints or watchpoints to check.
+                elif self.breakpoints.armed:
 
-    def handleLSRzeropage(self):
+                    # Run a slice, stopping if one is hit.
+                    self.runchecked(slicecycles)
+                    await asyncio.sleep(0)
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+                # Check to see if we are running at a fixed clock rate.
+                elif self.throttle is not None:
 
-        # Perform operation.
-        self.handleLSRbase(address, 1, 5)
+                    # Run in time slices, sleeping on the event loop instead of the thread.
+                    await self.runthrottledasync()
 
-    def handleLSRzeropagex(self):
+                # We are in free run mode.
+                else:
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+                    # Run a slice at full speed.
+                    self.runcycles(slicecycles)
+                    await asyncio.sleep(0)
 
-        # Perform operation.
-        self.handleLSRbase(address, 1, 6)
+        except Exception:
 
-    def handleLSRabsolute(self):
+            # Save the instructions that led up to the crash.
+            self.savecrashtrace()
+            raise
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # Finish off the run.
+        self.endrun()
 
-        # Perform operation.
-        self.handleLSRbase(address, 2, 6)
+    def savecrashtrace(self):
 
-    def handleLSRabsolutex(self):
+        # Check to see if we are tracing.
+        if self.tracer is not None:
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+            # Save the instructions that led up to the crash (or show the last few).
+            if self.tracefile:
+                self.tracer.save(self.tracefile)
+                print("Instruction trace saved to %s" % self.tracefile)
 
-        # Perform operation.
-        self.handleLSRbase(address, 2, 7)
+            else:
+                self.tracer.show(20)
 
-    def handleLSRbase(self, address, pcoffset, cycles):
+    def endrun(self):
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+        # Check to see if we are in verbose mode.
+        if self.verbose:
 
-        # Take the low bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (val & 0x01))
+            # Write cpu state for final execution.
+            self.showcpustate()
 
-        # Rotate the value to the right >> one place.  Bit 7 is set to 0.
-        val = (val >> 1) & 0xFE
+        # Check to see if we were running at a fixed clock rate.
+        if self.throttle is not None:
 
-        # Write the value back to memory.
-        self._memory.writebyte(address, val)
+            # Show how close we got.
+            self.throttle.report()
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
+        # End message.
+        self.writefootermessage()
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+    def runfree(self):
 
-    # endregion
+        executestep = self.executestep
+        self._runend = InterruptController.NEVER
 
-    # region NOP
-    def handleNOP(self):
+        # Swap in the superinstructions and idle loop checks if nothing needs to see every instruction.
+        instructions = self.instructions
+        self.instructions = self.fastinstructions() if self.canrunfast() else instructions
 
-        # Update cycle counter.
-        self.cy += 2
+        try:
 
-    # endregion
+            # Execute until the program ends or the debugger is needed.
+            while self.pc <= self.endaddress and self.nextstep and not self.stopbetweensteps:
+                executestep()
 
-    # region ORA
-    def handleORAimmediate(self):
+        finally:
+            self.instructions = instructions
 
-        # Perform operation.
-        self.handleORAbase(self.pc, 1, 2)
+    def runcycles(self, cycles):
 
-    def handleORAzeropage(self):
+        executestep = self.executestep
+        endcycle = self.cy + cycles
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        # Idle loops and cached calls stop skipping at the end of the cycles, as they do at an event.
+        self._runend = endcycle
 
-        # Perform operation.
-        self.handleORAbase(address, 1, 3)
+        # Swap in the superinstructions and idle loop checks if nothing needs to see every instruction.
+        instructions = self.instructions
+        self.instructions = self.fastinstructions() if self.canrunfast() else instructions
 
-    def handleORAzeropagex(self):
+        try:
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+            # Execute until the cycles are used up, the program ends or the debugger is needed.
+            while self.cy < endcycle and self.pc <= self.endaddress and self.nextstep and not self.stopbetweensteps:
+                executestep()
 
-        # Perform operation.
-        self.handleORAbase(address, 1, 4)
+        finally:
+            self.instructions = instructions
 
-    def handleORAabsolute(self):
+    def canrunfast(self):
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        # The trace and the hooks (the profile and history among them) see instructions and accesses one at a time, so
+        # they need the plain table.
+        return ((self.fusion or self.idleskip or self.memoizer is not None) and self.tracer is None and
+                not self.hooks.everystep())
 
-        # Perform operation.
-        self.handleORAbase(address, 2, 4)
+    def fastinstructions(self):
 
-    def handleORAabsolutex(self):
+        # Check to see if the table needs building.
+        if self._fastinstructions is None:
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+            table = list(self.instructions)
 
-        # Perform operation.
-        self.handleORAbase(address, 2, 4)
+            # Wrap the branches to look for idle loops.
+            if self.idleskip:
+                for opcode in self.BRANCHOPCODES:
+                    table[opcode] = self.idlebranch(table[opcode])
 
-    def handleORAabsolutey(self):
+            # Wrap the calls and returns to cache them.
+            if self.memoizer is not None:
+                table[Memoizer.JSR] = self.memoizer.wrapcall(table[Memoizer.JSR])
+                table[Memoizer.RTS] = self.memoizer.wrapreturn(table[Memoizer.RTS])
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
+            # Replace the first opcode of each pair with a handler that runs the second straight after it (unless
+            # caching calls, as the pair's second opcode is fetched without the cache seeing it read).
+            if self.fusion and self.memoizer is None:
 
-        # Perform operation.
-        self.handleORAbase(address, 2, 4)
+                for firsts, seconds in self.FUSEDPAIRS:
 
-    def handleORAindexedindirect(self):
+                    partners = [None] * 256
 
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
+                    for second in seconds:
+                        partners[second] = table[second]
 
-        # Perform operation.
-        self.handleORAbase(address, 2, 6)
+                    for first in firsts:
+                        table[first] = self.fuse(table[first], partners)
 
-    def handleORAindirectindexed(self):
+            self._fastinstructions = table
 
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
+        return self._fastinstructions
 
-        # Perform operation.
-        self.handleORAbase(address, 2, (5 + cycle))
+    def fuse(self, first, partners):
 
-    def handleORAbase(self, address, pcoffset, cycles):
+        basecycles = Cycles.BASE
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+        def fused(processor):
 
-        # Update accumulator with result.
-        self.a |= val
+            # Run the first instruction.
+            first(processor)
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+            pc = processor.pc
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+            # Check to see if the next instruction is a partner (fetched straight from the page, as code never runs
+            # from a device, and wrapping, as pc may be past the top of memory), and that nothing would stop between the
+            # two (a due event, the end of the program or a halt).
+            opcode = processor._memory._pages[(pc >> 8) & 0xFF][pc & 0xFF]
+            second = partners[opcode]
 
-    # endregion
+            if (second is not None and processor.cy < processor.nextevent and pc <= processor.endaddress and
+                    processor.nextstep):
 
-    # region PHA
-    def handlePHA(self):
+                    # Run it exactly as executestep would, so flags, cycles and pc come out the same.
+                    processor.opcode = opcode
+                    processor.pc = pc + 1
+                    processor.cy += basecycles[opcode]
+                    second(processor)
 
-        # Push the accumulator onto the stack.
-        self.pushstack8(self.a)
+        # Keep the first instruction's name for reports.
+        fused.__name__ = first.__name__
 
-        # Update cycle counter.
-        self.cy += 3
+        return fused
 
-    # endregion
+    def idlebranch(self, branch):
 
-    # region PHP
-    def handlePHP(self):
+        loops = self._idleloops
 
-        # Push the processor flags onto the stack.
-        self.pushstack8(self.pf)
+        def idle(processor):
 
-        # Update cycle counter.
-        self.cy += 3
+            # Run the branch.
+            address = processor.pc - 1
+            branch(processor)
+            target = processor.pc
 
-    # endregion
+            # Check to see if it went back a short way, to the start of a loop that may be idling.
+            if target <= address and address - target <= processor.IDLELOOPSIZE:
 
-    # region PHX
-    def handlePHX(self):
+                key = (target, address)
+                cycles = loops.get(key)
 
-        # Push the x register onto the stack.
-        self.pushstack8(self.x)
+                if cycles is None:
+                    cycles = loops[key] = processor.idleloop(target, address)
 
-        # Update cycle counter.
-        self.cy += 3
+                if cycles:
+                    processor.idle(key, cycles)
 
-    # endregion
+        # Keep the branch's name for reports.
+        idle.__name__ = branch.__name__
 
-    # region PHY
-    def handlePHY(self):
+        return idle
 
-        # Push the y register onto the stack.
-        self.pushstack8(self.y)
+    def idleloop(self, start, branch):
 
-        # Update cycle counter.
-        self.cy += 3
+        memory = self._memory
+        cycles = 0
+        address = start
 
-    # endregion
+        # Walk the loop up to the branch, checking each instruction only reads memory at an address fixed in the code
+        # (RAM, or a device address that reads the same and changes nothing when read again), so nothing but an event can
+        # change what it sees and skipping an iteration changes nothing.
+        while address < branch:
 
-    # region PLA
-    def handlePLA(self):
+            opcode = memory.readbyte(address)
+            mode = self.IDLEOPCODES.get(opcode)
 
-        # Pop the value of the stack pointer to the accumulator.
-        self.a = self.popstack8()
+            if mode is None:
+                return 0
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+            if mode == "zeropage" and not memory.isstable(memory.readbyte(address + 1)):
+                return 0
 
-        # Update cycle counter.
-        self.cy += 4
+            if mode == "absolute" and not memory.isstable(memory.readtwobytes(address + 1)):
+                return 0
 
-    # endregion
+            cycles += Cycles.BASE[opcode]
+            address += instructionspec.MODES[mode][0]
 
-    # region PLP
-    def handlePLP(self):
+        # Check to see if the walk lands on the branch (it may have gone into the middle of an instruction).
+        if address != branch:
+            return 0
 
-        # Set processor flags from stack value.
-        self.pf = self.popstack8()
+        # Return the cycles round the loop, including the branch taken (and crossing a page if it does).
+        return (cycles + Cycles.BASE[memory.readbyte(branch)] +
+                Cycles.BRANCHTAKEN[1 if ((branch + 2) ^ start) & 0xFF00 else 0])
 
-    # endregion
+    def idle(self, key, cycles):
 
-    # region PLX
-    def handlePLX(self):
+        # The next event is part of the state, so an iteration with an event in it never counts as idle.
+        state = (key, self.a, self.x, self.y, self.pf, self.sp, self.nextevent)
 
-        # Pop the value of the stack pointer to the x register.
-        self.x = self.popstack8()
+        # Check to see if the last time round the loop ended in the same state, exactly one iteration ago.  Nothing in
+        # the loop writes, so it will go round the same way until an event changes what it reads.
+        if state == self._idlestate and self.cy - self._idlecycle == cycles:
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.x == 0))
-        self.setflag(Flags.NEGATIVE, (self.x & 0x80))
+            # Skip the iterations that end before the next event (or the end of the cycles being run), so the event still
+            # fires at the instruction it would have (checking the loop again in case its code has been rewritten since
+            # it was first seen).
+            end = min(self.nextevent, self._runend)
+            iterations = (end - self.cy - 1) // cycles
 
-        # Update cycle counter.
-        self.cy += 4
+            if iterations > 0 and end < InterruptController.NEVER and self.idleloop(*key) == cycles:
+                self.cy += iterations * cycles
+                self.idlecycles += iterations * cycles
 
-    # endregion
+        self._idlestate = state
+        self._idlecycle = self.cy
 
-    # region PLY
-    def handlePLY(self):
+    def runthrottled(self):
 
-        # Pop the value of the stack pointer to the y register.
-        self.y = self.popstack8()
+        throttle = self.throttle
+        slicecycles = throttle.slicecycles
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.y == 0))
-        self.setflag(Flags.NEGATIVE, (self.y & 0x80))
+        # Measure from here (the time spent in the debugger doesn't count).
+        throttle.start(self.cy)
 
-        # Update cycle counter.
-        self.cy += 4
+        # Run a slice at a time, waiting for the clock to catch up after each one.
+        while self.pc <= self.endaddress and self.nextstep and not self.stopbetweensteps:
+            self.runcycles(slicecycles)
+            throttle.wait(self.cy)
 
-    # endregion
+        throttle.stop(self.cy)
 
-    # region ROL
-    def handleROLaccumulator(self):
+    async def runthrottledasync(self):
 
-        # Capture current CFlag
-        ctmp = self.getflag(Flags.CARRY)
+        throttle = self.throttle
+        slicecycles = throttle.slicecycles
 
-        # Take the high bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x80))
+        # Measure from here (the time spent in the debugger doesn't count).
+        throttle.start(self.cy)
 
-        # Rotate the value to the left << one place.  Bit 0 is set to the value of the old CFlag.
-        self.a = ((self.a << 1) | (0x01 if ctmp else 0)) & 0xFF
+        # Run a slice at a time, letting other tasks run while the clock catches up.
+        while self.pc <= self.endaddress and self.nextstep and not self.stopbetweensteps:
+            self.runcycles(slicecycles)
+            await asyncio.sleep(throttle.delay(self.cy))
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        throttle.stop(self.cy)
 
-        # Update cycle counter.
-        self.cy += 2
+    def runchecked(self, cycles=None):
 
-    def handleROLzeropage(self):
+        executestep = self.executestep
+        breakpoints = self.breakpoints
+        addresses = breakpoints.addresses
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+        endcycle = self.cy + cycles if cycles is not None else float('inf')
 
-        # Perform operation.
-        self.handleROLbase(address, 1, 5)
+        # Clear any old watchpoint hit.
+        breakpoints.hit = None
 
-    def handleROLzeropagex(self):
+        # Execute until the cycles are used up, the program ends or the debugger is needed.
+        while self.cy < endcycle and self.pc <= self.endaddress and self.nextstep and not self.stopbetweensteps:
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+            executestep()
 
-        # Perform operation.
-        self.handleROLbase(address, 1, 6)
+            # Check to see if a watchpoint was hit during the step.
+            if breakpoints.hit is not None:
 
-    def handleROLabsolute(self):
+                # Report it and stop.
+                print(breakpoints.hit)
+                breakpoints.hit = None
+                self.stopbetweensteps = True
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+            # Check to see if we have reached a breakpoint.
+            elif self.pc in addresses and breakpoints.shouldbreak(self):
 
-        # Perform operation.
-        self.handleROLbase(address, 2, 6)
+                # Report it and stop.
+                print("Breakpoint at %04x" % self.pc)
+                self.stopbetweensteps = True
 
-    def handleROLabsolutex(self):
+    def selectstep(self):
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+        # Use the plain step, which checks for nothing, unless the trace or a hook needs to see each instruction.
+        self.executestep = self.stepplain if self.tracer is None and not self.hooks.instruction else self.stepobserved
 
-        # Perform operation.
-        self.handleROLbase(address, 2, 7)
+    def stepplain(self):
 
-    def handleROLbase(self, address, pcoffset, cycles):
+        # Check to see if a scheduled event or interrupt is due.
+        if self.cy >= self.nextevent:
+            self.interrupts.service()
 
-        # Capture current CFlag
-        ctmp = self.getflag(Flags.CARRY)
+        # Get the address of the instruction.
+        pc = self.pc
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+        # Fetch the first instruction.
+        opcode = self._memory.readbyte(pc)
 
-        # Take the high bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x80))
+        # Get the command from the supported opcodes.
+        instruction = self.instructions[opcode]
 
-        # Rotate the value to the left << one place.  Bit 0 is set to the value of the old CFlag.
-        val = ((val << 1) | (0x01 if ctmp else 0)) & 0xFF
+        # Increment program counter, and the cycle counter by the opcode's base cycles.
+        self.opcode = opcode
+        self.pc = pc + 1
+        self.cy += Cycles.BASE[opcode]
 
-        # Write the value back to memory.
-        self._memory.writebyte(address, val)
+        # Execute instruction.
+        instruction(self)
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
+    def stepobserved(self):
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Check to see if a scheduled event or interrupt is due.
+        if self.cy >= self.nextevent:
+            self.interrupts.service()
 
-    # endregion
+        # Get the address of the instruction.
+        pc = self.pc
 
-    # region ROR
-    def handleRORaccumulator(self):
+        # Fetch the first instruction.
+        opcode = self._memory.readbyte(pc)
 
-        # Capture current CFlag
-        ctmp = self.getflag(Flags.CARRY)
+        # Check to see if we are tracing.
+        if self.tracer is not None:
 
-        # Take the low bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (self.a & 0x01))
+            # Record the instruction before it executes.
+            self.tracer.record(pc, opcode)
 
-        # Rotate the value to the right >> one place.  Bit 7 is set to the value of the old CFlag.
-        self.a = (self.a >> 1) | (0x80 if ctmp else 0)
+        # Get the command from the supported opcodes.
+        instruction = self.instructions[opcode]
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+        # Increment program counter, and the cycle counter by the opcode's base cycles.
+        self.opcode = opcode
+        self.pc = pc + 1
+        self.cy += Cycles.BASE[opcode]
 
-        # Update cycle counter.
-        self.cy += 2
+        # Execute instruction.
+        instruction(self)
 
-    def handleRORzeropage(self):
+        # Let the hooks see the instruction.
+        for callback in self.hooks.instruction:
+            callback(pc, opcode)
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+    def showdebugger(self):
 
-        # Perform operation.
-        self.handleRORbase(address, 1, 5)
+        # Get input from user.
+        command = input(self.PROMPT)
 
-    def handleRORzeropagex(self):
+        # Process user command.
+        self.debuggercommand(command)
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+    async def showdebuggerasync(self, readcommand=None):
 
-        # Perform operation.
-        self.handleRORbase(address, 1, 6)
+        # Check to see if we have a way of reading commands without blocking.
+        if readcommand is not None:
 
-    def handleRORabsolute(self):
+            # Wait for the next command.
+            command = await readcommand(self.PROMPT)
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+        else:
 
-        # Perform operation.
-        self.handleRORbase(address, 2, 6)
+            # Wait for the user on an executor thread, so the event loop keeps running.
+            command = await asyncio.get_running_loop().run_in_executor(None, input, self.PROMPT)
 
-    def handleRORabsolutex(self):
+        # Process user command.
+        self.debuggercommand(command)
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+    def debuggercommand(self, command):
 
-        # Perform operation.
-        self.handleRORbase(address, 2, 7)
+        command = command.lower()
 
-    def handleRORbase(self, address, pcoffset, cycles):
+        # Ignore empty commands.
+        if not command:
+            return
 
-        # Capture current CFlag
-        ctmp = self.getflag(Flags.CARRY)
+        # Process user command.
+        if command[0] == 'a':
+            # Get the address and mode.
+            addr, _, mode = command[2:].partition(':')
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+            # Add the watchpoint.
+            self.breakpoints.addwatch(self._memory, int(addr, 16), 'r' in mode, 'w' in mode or not mode)
 
-        # Take the low bit of value and set it to Carry flag.
-        self.setflag(Flags.CARRY, (val & 0x01))
+        elif command[0] == 'b':
+            # Get the number of steps to go back.
+            count = int(command[2:]) if len(command) > 2 else 1
 
-        # Rotate the value to the right >> one place.  Bit 7 is set to the value of the old CFlag.
-        val = (val >> 1) | (0x80 if ctmp else 0)
+            # Step backwards.
+            if self.history is None or not self.history.stepback(count):
+                print("No history to step back through.")
 
-        # Write the value back to memory.
-        self._memory.writebyte(address, val)
+        elif command[0] == 'c':
+            # Print CPU state.
+            self.showcpustate()
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (val == 0))
-        self.setflag(Flags.NEGATIVE, (val & 0x80))
+        elif command[0] == 'd':
+            # Print the last instructions executed.
+            if self.tracer is None:
+                print("Instruction trace is not enabled.")
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+            else:
+                self.tracer.show(int(command[2:]) if len(command) > 2 else 20)
 
-    # endregion
+        elif command[0] == 'e':
+            # Execute steps stopping between steps.
+            self.executestep()
 
-    # region RTI
-    def handleRTI(self):
+            # Check to see if a watchpoint was hit during the step.
+            if self.breakpoints.hit is not None:
+                print(self.breakpoints.hit)
+                self.breakpoints.hit = None
 
-        # Restore the stack pointer from stack.
-        self.pf = self.popstack8()
+        elif command[0] == 'f':
+            # Switch to free run mode.
+            self.stopbetweensteps = False
 
-        # Restor the program counter form stack.
-        self.pc = self.popstack16()
+        elif command[0] == 'h':
+            # Print list of commands.
+            print(self.COMMANDS)
 
-    # endregion
+        elif command[0] == 'k':
+            # Get the address and condition.
+            addr, _, condition = command[2:].partition(':')
 
-    # region RTS
-    def handleRTS(self):
+            try:
+                # Add the breakpoint.
+                self.breakpoints.addbreakpoint(int(addr, 16), condition)
 
-        # Restore the pc from stack.
-        self.pc = self.popstack16()
+            except SyntaxError:
+                print("Invalid breakpoint condition: %s" % condition)
 
-    # endregion
+        elif command[0] == 'l':
+            # Print breakpoints and watchpoints.
+            self.breakpoints.show()
 
-    # region SBC
-    def handleSBCimmediate(self):
+        elif command[0] == 'm':
+            # Get the address.
+            addr = int(command[2:], 16)
 
-        # Perform operation.
-        self.handleSBCbase(self.pc, 1, 2)
+            # Print the value of that address.
+            print("Value at address %04x is %02x" % (addr, self._memory.readbyte(addr)))
 
-    def handleSBCzeropage(self):
+        elif command[0] == 'p':
+            # Get the current byte.
+            opcode = self._memory.readbyte(self.pc)
 
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
+            # Print the opcode.
+            print("Current opcode: %02x" % opcode)
 
-        # Perform operation.
-        self.handleSBCbase(address, 1, 3)
+        elif command[0] == 's':
+            # Print stack memory.
+            self.dumpstack()
 
-    def handleSBCzeropagex(self):
+        elif command[0] == 't':
+            # End execution.
+            self.nextstep = False
 
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
+        elif command[0] == 'u':
+            # Get the address.
+            addr = int(command[2:], 16)
 
-        # Perform operation.
-        self.handleSBCbase(address, 1, 4)
+            # Remove any breakpoint or watchpoint there.
+            self.breakpoints.removebreakpoint(addr)
+            self.breakpoints.removewatch(self._memory, addr)
 
-    def handleSBCabsolute(self):
+        elif command[0] == 'w':
+            # Get the address.
+            addr = int(command[2:], 16)
 
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+            # Go back to the last write of that address.
+            if self.history is None or not self.history.runbacktowrite(addr):
+                print("No recorded write to address %04x" % addr)
 
-        # Perform operation.
-        self.handleSBCbase(address, 2, 4)
+        elif command[0] == 'z':
+            # Print zero page memory.
+            self.dumpzeropage()
 
-    def handleSBCabsolutex(self):
+    def showcpustate(self):
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
+        # Get string versions of the byte values.
+        str_pc = self.twobytestostring(self.pc)
+        str_a = self.onebytetostring(self.a)
+        str_x = self.onebytetostring(self.x)
+        str_y = self.onebytetostring(self.y)
+        str_sp = self.onebytetostring(self.sp & 0xFF)
+        str_pf = self.onebytetostring(self.pf)
 
-        # Perform operation.
-        self.handleSBCbase(address, 2, 4)
+        # Output to screen.
+        print("PC:" + str_pc + " A:" + str_a + " X:" + str_x + " Y:" + str_y + " SP:" + str_sp + " Flags:" + str_pf +
+              " CPU Cycles:" + str(self.cy))
 
-    def handleSBCabsolutey(self):
+        # Check to see if we should be logging to file.
+        if self.verbose:
 
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
+            # Write to output file.
+            self.writeline("PC:" + str_pc + " A:" + str_a + " X:" + str_x + " Y:" + str_y + " SP:" + str_sp + " Flags:" + str_pf +
+                           " CPU Cycles:" + str(self.cy))
 
-        # Perform operation.
-        self.handleSBCbase(address, 2, 4)
+    def dumpzeropage(self):
 
-    def handleSBCindexedindirect(self):
+        # Print the zero page memory contents.
+        self._memory.dump(0x00, 0xFF)
 
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
+    def dumpstack(self):
 
-        # Perform operation.
-        self.handleSBCbase(address, 1, 6)
+        # Print stack contents.
+        self._memory.dump(0x0100, 0xFF)
 
-    def handleSBCindirectindexed(self):
+    def loadmemory(self, startaddress, data):
 
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
+        # Load the data into memory.
+        return self._memory.load(startaddress, data, self._source.includecounter)
 
-        # Perform operation.
-        self.handleSBCbase(address, 1, (5 + cycle))
+    # endregion
 
-    def handleSBCbase(self, address, pcoffset, cycles):
+    # region Helper Methods
 
-        # Get the value at that address.
-        val = self._memory.readbyte(address)
+    def writeline(self, value):
 
-        # Update accumulator with result.
-        self.a = self.subtractvalues(self.a, val)
+        # Write the line to the output file.
+        self._source.writeline(value)
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+    def writeheadermessage(self):
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        # Output to screen.
+        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
+        print("; MFC6502 - Execution Begins: %s" % datetime.now())
+        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
 
-    # endregion
+        if self.verbose:
 
-    # region SEC
-    def handleSEC(self):
+            # Write output to file.
+            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
+            self.writeline("; MFC6502 - Execution Begins: %s" % datetime.now())
+            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
 
-        # Clear flag value.
-        self.setflag(Flags.CARRY, 1)
+    def writefootermessage(self):
 
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
+        # Output to screen.
+        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
+        print("; MFC6502 - Execution Ends: %s" % datetime.now())
+        print(";;;;;;;;;;;;;;;;;;;;;;;;;")
 
-    # endregion
+        if self.verbose:
 
-    # region SED
-    def handleSED(self):
+            # Write output to file.
+            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
+            self.writeline("; MFC6502 - Execution Begins: %s" % datetime.now())
+            self.writeline(";;;;;;;;;;;;;;;;;;;;;;;;;")
 
-        # Clear flag value.
-        self.setflag(Flags.DECIMAL, 1)
+    def onebytetostring(self, value):
+        return "0x%02x" % value
 
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
+    def twobytestostring(self, value):
+        return "0x%04x" % value
 
     # endregion
 
-    # region SEI
-    def handleSEI(self):
-
-        # Clear flag value.
-        self.setflag(Flags.INTERRUPT, 1)
-
-        # Update program and cycle counters.
-        self.pc += 1
-        self.cy += 2
+    # region ALU Helpers
+    # ADC and SBC results with the flags they set, for every operand, carry and mode, laid out as alu.index says (built
+    # at the end of this module).
+    ADCTABLE = None
+    SBCTABLE = None
 
     # endregion
 
-    # region STA
-    def handleSTAzeropage(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleSTAbase(address, 1, 3)
-
-    def handleSTAzeropagex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(True, self.x)
-
-        # Perform operation.
-        self.handleSTAbase(address, 1, 4)
-
-    def handleSTAabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleSTAbase(address, 2, 4)
-
-    def handleSTAabsolutex(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.x)
-
-        # Perform operation.
-        self.handleSTAbase(address, 2, 5)
-
-    def handleSTAabsolutey(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, self.y)
+    # region Stack Helpers
+    def pushstack8(self, value):
 
-        # Perform operation.
-        self.handleSTAbase(address, 2, 5)
+        # Push value to the stack, which is page 1 with the stack pointer as the low byte.
+        self._memory.writebyte(0x100 | self.sp, value)
 
-    def handleSTAindexedindirect(self):
+        # Decrement stack pointer (wrapping round the page).
+        self.sp = (self.sp - 1) & 0xFF
 
-        # Get the address.
-        address, cycle = self.calculateindexedaddress(self.x)
+    def popstack8(self):
 
-        # Perform operation.
-        self.handleSTAbase(address, 1, 6)
+        # Increment the stack pointer (wrapping round the page).
+        self.sp = (self.sp + 1) & 0xFF
 
-    def handleSTAindirectindexed(self):
+        # Return the value at this address.
+        return self._memory.readbyte(0x100 | self.sp)
 
-        # Get the address.
-        address, cycle = self.calculateindirectaddress(self.y)
+    def pushstack16(self, value):
 
-        # Perform operation.
-        self.handleSTAbase(address, 1, 6)
+        # Push the high byte, then the low byte, so the low byte ends up at the lower address.
+        self.pushstack8((value >> 8) & 0xFF)
+        self.pushstack8(value & 0xFF)
 
-    def handleSTAbase(self, address, pcoffset, cycles):
+    def popstack16(self):
 
-        # Store the accumulator with value.
-        self._memory.writebyte(address, self.a)
+        # Pop the low byte, then the high byte.
+        low = self.popstack8()
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        return low + (self.popstack8() << 8)
 
     # endregion
 
-    # region STX
-    def handleSTXzeropage(self):
-
-        # Get address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleSTXbase(address, 1, 3)
-
-    def handleSTXzeropagey(self):
-
-        # Get address.
-        address = self.calcuateaddress(True, self.y)
-
-        # Perform operation.
-        self.handleSTXbase(address, 1, 4)
-
-    def handleSTXabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
+    # region Flag Helpers
+    def getflag(self, flag):
 
-        # Perform operation.
-        self.handleSTXbase(address, 2, 4)
+        return self.pf & flag
 
-    def handleSTXbase(self, address, pcoffset, cycles):
+    def setflag(self, flag, value):
 
-        # Store value to x register.
-        self._memory.writebyte(address, self.x)
+        if value:
+            self.pf |= flag
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+        else:
+            self.pf &= ~flag
 
     # endregion
 
-    # region STY
-    def handleSTYzeropage(self):
-
-        # Get address.
-        address = self.calcuateaddress(True, 0)
-
-        # Perform operation.
-        self.handleSTYbase(address, 1, 3)
-
-    def handleSTYzeropagex(self):
-
-        # Get address.
-        address = self.calcuateaddress(True, self.y)
-
-        # Perform operation.
-        self.handleSTYbase(address, 1, 4)
-
-    def handleSTYabsolute(self):
-
-        # Get the address.
-        address = self.calcuateaddress(False, 0)
-
-        # Perform operation.
-        self.handleSTYbase(address, 2, 4)
-
-    def handleSTYbase(self, address, pcoffset, cycles):
-
-        # Store value to x register.
-        self._memory.writebyte(address, self.y)
+    # region Opcode Handlers
 
-        # Update program and cycle counters.
-        self.pc += pcoffset
-        self.cy += cycles
+    # The handlers for the instructions (handleLDAimmediate and so on) are generated from instructionspec when this module
+    # is imported, with the address calculation and operation of each opcode written out in one function.
+    def handleinvalidtrap(self):
 
-    # endregion
+        # Report the opcode and enter the debugger.
+        print("Invalid opcode %02x at %04x" % (self.opcode, self.pc - 1))
+        self.stopbetweensteps = True
 
-    # region TAX
-    def handleTAX(self):
+    def handleinvalidnop(self):
 
-        # Copy accumulator to x register.
-        self.x = self.a
+        # Skip the opcode, counting it as a one byte NOP.
+        self.cy += Cycles.BASE[0xEA]
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.x == 0))
-        self.setflag(Flags.NEGATIVE, (self.x & 0x80))
+    def handleinvalidhalt(self):
 
-        # Update cycle counter.
-        self.cy += 2
+        # Report the opcode and end execution.
+        print("Invalid opcode %02x at %04x" % (self.opcode, self.pc - 1))
+        self.nextstep = False
 
     # endregion
 
-    # region TAY
-    def handleTAY(self):
-
-        # Copy accumulator to y register.
-        self.y = self.a
-
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.y == 0))
-        self.setflag(Flags.NEGATIVE, (self.y & 0x80))
-
-        # Update cycle counter.
-        self.cy += 2
+    # region Instruction Set
+    def loadinstructionset(self):
 
-    # endregion
+        # Use the shared table for the invalid opcode policy (the handlers are plain functions, called with the
+        # processor, so one table serves every instance).
+        self.instructions = self.INSTRUCTIONTABLES[self.invalidopcode]
+        self.validopcodes = self.VALIDOPCODES
 
-    # region TSX
-    def handleTSX(self):
+        # Wrap the call for the hooks to see it, in a copy of the table for this processor alone.
+        if self.hooks.jsr:
+            self.instructions = list(self.instructions)
+            self.instructions[Memoizer.JSR] = self.hookcall(self.instructions[Memoizer.JSR])
 
-        # Copy stack pointer to x register.
-        self.x = self._memory.readbyte(self.sp)
+        # The free run table is built from this table when it is next needed.
+        self._fastinstructions = None
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.y == 0))
-        self.setflag(Flags.NEGATIVE, (self.y & 0x80))
+        # Put the opcode coverage stubs back in the new table.
+        if self.coverage is not None:
+            self.coverage.attach(self)
 
-        # Update cycle counter.
-        self.cy += 2
+    def hookcall(self, jsr):
 
-    # endregion
+        hooks = self.hooks
 
-    # region TXA
-    def handleTXA(self):
+        def call(processor):
 
-        # Copy x register to accumulator.
-        self.a = self.x
+            # Make the call, then tell the hooks where from and to.
+            address = processor.pc - 1
+            jsr(processor)
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+            for callback in hooks.jsr:
+                callback(address, processor.pc)
 
-        # Update cycle counter.
-        self.cy += 2
+        # Keep the call's name for reports.
+        call.__name__ = jsr.__name__
 
-    # endregion
+        return call
 
-    # region TXS
-    def handleTXS(self):
+    def setinvalidopcodepolicy(self, policy):
 
-        # Copy x register to current stack pointer.
-        self.sp = self.x
+        # Check to see if this is a known policy.
+        if policy not in self.INVALIDOPCODEHANDLERS:
+            raise ValueError("Invalid opcode policy must be one of %s." % ", ".join(sorted(self.INVALIDOPCODEHANDLERS)))
 
-        # Update cycle counter.
-        self.cy += 2
+        # Rebuild the table with the new policy.
+        self.invalidopcode = policy
+        self.loadinstructionset()
 
     # endregion
 
-    # region TYA
-    def handleTYA(self):
-
-        # Copy y register to accumulator.
-        self.a = self.y
+    # Opcode pairs run as superinstructions: (first opcodes, second opcodes).
+    FUSEDPAIRS = (
+        ((0xC9, 0xC5, 0xD5, 0xCD, 0xDD, 0xD9, 0xC1, 0xD1), (0xD0, 0xF0)),  # CMP then BNE or BEQ
+        ((0xA9, 0xA5, 0xB5, 0xAD, 0xBD, 0xB9, 0xA1, 0xB1), (0x85, 0x95, 0x8D, 0x9D, 0x99, 0x81, 0x91)),  # LDA then STA
+        ((0xCA, 0x88), (0xD0,)),  # DEX or DEY then BNE
+        ((0x18,), (0x69, 0x65, 0x75, 0x6D, 0x7D, 0x79, 0x61, 0x71)),  # CLC then ADC
+        ((0xE8,), (0xE0, 0xE4, 0xEC))  # INX then CPX
+    )
 
-        # Update flags.
-        self.setflag(Flags.ZERO, (self.a == 0))
-        self.setflag(Flags.NEGATIVE, (self.a & 0x80))
+    # The branch opcodes, checked for idle loops.
+    BRANCHOPCODES = tuple(opcode for mnemonic, mode, opcode, cycles, pagecross in instructionspec.INSTRUCTIONS
+                          if mode == "relative")
 
-        # Update cycle counter.
-        self.cy += 2
+    # Instructions that can make up an idle loop with the addressing mode of each, the ones that leave memory alone
+    # and read, if at all, from an address fixed in the code.
+    IDLEOPCODES = {opcode: mode for mnemonic, mode, opcode, cycles, pagecross in instructionspec.INSTRUCTIONS
+                   if mnemonic in ("LDA", "LDX", "LDY", "AND", "ORA", "EOR", "CMP", "CPX", "CPY", "BIT", "NOP", "CLC",
+                                   "SEC", "CLV", "TAX", "TAY", "TXA", "TYA")
+                   and mode in ("implied", "immediate", "zeropage", "absolute")}
 
-    # endregion
+    # Most bytes from the start of an idle loop to its branch.
+    IDLELOOPSIZE = 16
 
-    # endregion
+    # Handlers for opcodes with no instruction, by policy.
+    INVALIDOPCODEHANDLERS = {
+        "trap": handleinvalidtrap,
+        "nop": handleinvalidnop,
+        "halt": handleinvalidhalt
+    }
 
-    # region Instruction Set
-    def loadinstructionset(self):
-        self.instructions = {
-            0x00: self.handleBRK,
-            0x01: self.handleORAindexedindirect,
-            0x05: self.handleORAzeropage,
-            0x06: self.handleASLzeropage,
-            0x08: self.handlePHP,
-            0x09: self.handleORAimmediate,
-            0x0A: self.handleASLaccumulator,
-            0x0D: self.handleORAabsolute,
-            0x0E: self.handleASLabsolute,
-            0x10: self.handleBPL,
-            0x11: self.handleORAindirectindexed,
-            0x15: self.handleORAzeropagex,
-            0x16: self.handleASLzeropagex,
-            0x18: self.handleCLC,
-            0x19: self.handleORAabsolutey,
-            0x1D: self.handleORAabsolutex,
-            0x1E: self.handleASLabsolutex,
-            0x20: self.handleJSR,
-            0x21: self.handleANDindexedindirect,
-            0x24: self.handleBITzeropage,
-            0x25: self.handleANDzeropage,
-            0x26: self.handleROLzeropage,
-            0x28: self.handlePLP,
-            0x29: self.handleANDimmediate,
-            0x2A: self.handleROLaccumulator,
-            0x2C: self.handleBITabsolute,
-            0x2D: self.handleANDabsolute,
-            0x2E: self.handleROLabsolute,
-            0x30: self.handleBMI,
-            0x31: self.handleANDindirectindexed,
-            0x35: self.handleANDzeropagex,
-            0x36: self.handleROLzeropagex,
-            0x38: self.handleSEC,
-            0x39: self.handleANDabsolutey,
-            0x3D: self.handleANDabsolutex,
-            0x3E: self.handleROLabsolutex,
-            0x41: self.handleEORindexedindirect,
-            0x45: self.handleEORzeropage,
-            0x46: self.handleLSRzeropage,
-            0x48: self.handlePHA,
-            0x49: self.handleEORimmediate,
-            0x4A: self.handleLSRaccumulator,
-            0x4C: self.handleJMPabsolute,
-            0x4D: self.handleEORabsolute,
-            0x4E: self.handleLSRabsolute,
-            0x50: self.handleBVC,
-            0x51: self.handleEORindirectindexed,
-            0x55: self.handleEORzeropagex,
-            0x56: self.handleLSRzeropagex,
-            0x58: self.handleCLI,
-            0x59: self.handleEORabsolutey,
-            0x5A: self.handlePHY,
-            0x5D: self.handleEORabsolutex,
-            0x5E: self.handleLSRabsolutex,
-            0x60: self.handleRTS,
-            0x61: self.handleADCindexedindirect,
-            0x65: self.handleADCzeropage,
-            0x66: self.handleRORzeropage,
-            0x68: self.handlePLA,
-            0x69: self.handleADCimmediate,
-            0x6A: self.handleRORaccumulator,
-            0x6C: self.handleJMPindirect,
-            0x6D: self.handleADCabsolute,
-            0x6E: self.handleRORabsolute,
-            0x70: self.handleBVS,
-            0x71: self.handleADCindirectindexed,
-            0x75: self.handleADCzeropagex,
-            0x76: self.handleRORzeropagex,
-            0x78: self.handleSEI,
-            0x79: self.handleADCabsolutey,
-            0x7A: self.handlePLY,
-            0x7D: self.handleADCabsolutex,
-            0x7E: self.handleRORabsolutex,
-            0x81: self.handleSTAindexedindirect,
-            0x84: self.handleSTYzeropage,
-            0x85: self.handleSTAzeropage,
-            0x86: self.handleSTXzeropage,
-            0x88: self.handleDEY,
-            0x8A: self.handleTXA,
-            0x8C: self.handleSTYabsolute,
-            0x8D: self.handleSTAabsolute,
-            0x8E: self.handleSTXabsolute,
-            0x90: self.handleBCC,
-            0x91: self.handleSTAindirectindexed,
-            0x94: self.handleSTYzeropagex,
-            0x95: self.handleSTAzeropagex,
-            0x96: self.handleSTXzeropagey,
-            0x98: self.handleTYA,
-            0x99: self.handleSTAabsolutey,
-            0x9A: self.handleTXS,
-            0x9D: self.handleSTAabsolutex,
-            0xA0: self.handleLDYimmediate,
-            0xA1: self.handleLDAindexedindirect,
-            0xA2: self.handleLDXimmediate,
-            0xA4: self.handleLDYzeropage,
-            0xA5: self.handleLDAzeropage,
-            0xA6: self.handleLDXzeropage,
-            0xA8: self.handleTAY,
-            0xA9: self.handleLDAimmediate,
-            0xAA: self.handleTAX,
-            0xAC: self.handleLDYabsolute,
-            0xAD: self.handleLDAabsolute,
-            0xAE: self.handleLDXabsolute,
-            0xB0: self.handleBCS,
-            0xB1: self.handleLDAindirectindexed,
-            0xB4: self.handleLDYzeropagex,
-            0xB5: self.handleLDAzeropagex,
-            0xB6: self.handleLDXzeropagey,
-            0xB8: self.handleCLV,
-            0xB9: self.handleLDAabsolutey,
-            0xBA: self.handleTSX,
-            0xBC: self.handleLDYabsolutex,
-            0xBD: self.handleLDAabsolutex,
-            0xBE: self.handleLDXabsolutey,
-            0xC0: self.handleCPYimmediate,
-            0xC1: self.handleCMPindexedindirect,
-            0xC4: self.handleCPYzeropage,
-            0xC5: self.handleCMPzeropage,
-            0xC6: self.handleDECzeropage,
-            0xC8: self.handleINY,
-            0xC9: self.handleCMPimmediate,
-            0xCA: self.handleDEX,
-            0xCC: self.handleCPYabsolute,
-            0xCD: self.handleCMPabsolute,
-            0xCE: self.handleDECabsolute,
-            0xD0: self.handleBNE,
-            0xD1: self.handleCMPindirectindexed,
-            0xD5: self.handleCMPzeropagex,
-            0xD6: self.handleDECzeropagex,
-            0xD8: self.handleCLD,
-            0xD9: self.handleCMPabsolutey,
-            0xDA: self.handlePHX,
-            0xDD: self.handleCMPabsolutex,
-            0xDE: self.handleDECabsolutex,
-            0xE0: self.handleCPXimmediate,
-            0xE1: self.handleSBCindexedindirect,
-            0xE4: self.handleCPXzeropage,
-            0xE5: self.handleSBCzeropage,
-            0xE6: self.handleINCzeropage,
-            0xE8: self.handleINX,
-            0xE9: self.handleSBCimmediate,
-            0xEA: self.handleNOP,
-            0xEC: self.handleCPXabsolute,
-            0xED: self.handleSBCabsolute,
-            0xEE: self.handleINCabsolute,
-            0xF0: self.handleBEQ,
-            0xF1: self.handleSBCindirectindexed,
-            0xF5: self.handleSBCzeropagex,
-            0xF6: self.handleINCzeropagex,
-            0xF8: self.handleSED,
-            0xF9: self.handleSBCabsolutey,
-            0xFA: self.handlePLX,
-            0xFD: self.handleSBCabsolutex,
-            0xFE: self.handleINCabsolutex
-        }
-    # endregion
+    # Handlers for the instructions by opcode, the opcodes they cover, and a table of all 256 opcodes for each invalid
+    # opcode policy (built from instructionspec at the end of this module, and shared by every processor).
+    HANDLERS = {}
+    VALIDOPCODES = frozenset()
+    INSTRUCTIONTABLES = {}
 
 
 class Flags(object):
@@ -2564,6 +1200,18 @@ class Flags(object):
     CARRY = 1
 
 
+class Cycles(object):
+    # Base cycle count for each opcode, and the extra cycle for opcodes that take one when indexing crosses a page (0 for
+    # opcodes that are not implemented).
+    BASE, PAGECROSS = instructionspec.cycletables()
+
+    # Extra cycles for a taken branch, indexed by whether it lands in a different page.
+    BRANCHTAKEN = instructionspec.BRANCHTAKEN
+
+    # Cycles taken to enter an IRQ or NMI handler.
+    INTERRUPT = 7
+
+
 class Vectors(object):
     # Inturrupt address (NMI).
     NMI_ADDR_LOW = 0xfffa
@@ -2576,3 +1224,22 @@ class Vectors(object):
     # Reset address.
     RESET_ADDR_LOW = 0xfffc
     RESET_ADDR_HIGH = 0xfffd
+
+
+# Work out ADC and SBC once, for the handlers to look up.
+Processor.ADCTABLE = alu.table(alu.add)
+Processor.SBCTABLE = alu.table(alu.subtract)
+
+# Generate the instruction handlers from the spec, with the flag and vector constants written in.
+Processor.HANDLERS = instructionspec.generate({name: value for constants in (Flags, Vectors)
+                                               for name, value in vars(constants).items() if name.isupper()},
+                                              {"ADCTABLE": Processor.ADCTABLE, "SBCTABLE": Processor.SBCTABLE})
+
+for _handler in Processor.HANDLERS.values():
+    setattr(Processor, _handler.__name__, _handler)
+
+# Fill the slots with no handler using each invalid opcode policy, so every opcode resolves through the table (kept as
+# tuples, since they are shared).
+Processor.VALIDOPCODES = frozenset(Processor.HANDLERS)
+Processor.INSTRUCTIONTABLES = {policy: tuple(Processor.HANDLERS.get(opcode, invalid) for opcode in range(256))
+                               for policy, invalid in Processor.INVALIDOPCODEHANDLERS.items()}
@@ -0,0 +1,131 @@
+from array import array
+from symbols import Symbols
+
+
+class Profiler(object):
+
+    # Opcodes that change the call stack.
+    JSR = 0x20
+    RTS = 0x60
+
+    def __init__(self, processor, symbols=None):
+
+        # The processor being profiled.
+        self._processor = processor
+
+        # Labels for naming addresses in reports.
+        self.symbols = symbols if symbols is not None else Symbols()
+
+        # Executions and cycles per opcode.
+        self.opcodecounts = array('Q', [0]) * 256
+        self.opcodecycles = array('Q', [0]) * 256
+
+        # Executions and cycles per instruction address.
+        self.pccounts = array('Q', [0]) * 65536
+        self.pccycles = array('Q', [0]) * 65536
+
+        # Calls and cycles (including called subroutines) per JSR target.
+        self.jsrcounts = array('Q', [0]) * 65536
+        self.jsrcycles = array('Q', [0]) * 65536
+
+        # The cycle count when the last step finished.
+        self._lastcycle = processor.cy
+
+        # The call stack as (target, cycle count at the call), with the start address as the root.
+        self._stack = [(processor.pc, processor.cy)]
+
+        # Cycles spent in each distinct call stack, and the cycle count when the current stack was entered.
+        self.stackcycles = dict()
+        self._stackstart = processor.cy
+
+    def record(self, pc, opcode):
+
+        processor = self._processor
+        cycle = processor.cy
+
+        # Get the cycles used by this step.
+        cycles = cycle - self._lastcycle
+        self._lastcycle = cycle
+
+        # Count the step against the opcode and address.
+        self.opcodecounts[opcode] += 1
+        self.opcodecycles[opcode] += cycles
+        self.pccounts[pc & 0xFFFF] += 1
+        self.pccycles[pc & 0xFFFF] += cycles
+
+        # Check to see if a subroutine was called.
+        if opcode == self.JSR:
+
+            # Close off the cycles for the calling stack and push the target.
+            self.closestack(cycle)
+            self._stack.append((processor.pc, cycle - cycles))
+
+        # Check to see if a subroutine returned.
+        elif opcode == self.RTS and len(self._stack) > 1:
+
+            # Close off the cycles for the subroutine's stack and pop it.
+            self.closestack(cycle)
+            target, start = self._stack.pop()
+
+            # Count the call, including everything it called.
+            self.jsrcounts[target & 0xFFFF] += 1
+            self.jsrcycles[target & 0xFFFF] += cycle - start
+
+    def closestack(self, cycle):
+
+        # Add the cycles since the stack was entered to its total.
+        key = tuple(target for target, start in self._stack)
+        self.stackcycles[key] = self.stackcycles.get(key, 0) + cycle - self._stackstart
+        self._stackstart = cycle
+
+    def opcodename(self, opcode):
+
+        # Name the opcode from its handler (handleLDAimmediate becomes LDAimmediate).
+        if opcode not in self._processor.validopcodes:
+            return "$%02X" % opcode
+
+        return self._processor.instructions[opcode].__name__[len("handle"):]
+
+    def rows(self, counts, cycles, namer, sortby):
+
+        # Collect the entries that were used.
+        rows = [(namer(index), counts[index], cycles[index]) for index in range(len(counts)) if counts[index]]
+
+        # Sort busiest first.
+        rows.sort(key=lambda row: row[2] if sortby == "cycles" else row[1], reverse=True)
+
+        return rows
+
+    def report(self, sortby="cycles", limit=20, output=None):
+
+        lines = []
+
+        # Build each table.
+        for title, counts, cycles, namer in (("Opcode", self.opcodecounts, self.opcodecycles, self.opcodename),
+                                             ("Address", self.pccounts, self.pccycles, self.symbols.name),
+                                             ("Subroutine", self.jsrcounts, self.jsrcycles, self.symbols.name)):
+
+            lines.append("%-24s %12s %12s" % (title, "Count", "Cycles"))
+
+            for name, count, cycle in self.rows(counts, cycles, namer, sortby)[:limit]:
+                lines.append("%-24s %12d %12d" % (name, count, cycle))
+
+            lines.append("")
+
+        # Print the report, or write it to the output file.
+        for line in lines:
+            if output is None:
+                print(line)
+
+            else:
+                output.write(line + "\n")
+
+    def writecollapsed(self, output):
+
+        # Count the cycles of the stack still running.
+        self.closestack(self._processor.cy)
+
+        # Write one line per stack in the collapsed format used by flamegraph tools.
+        for key, cycles in sorted(self.stackcycles.items()):
+            if cycles:
+                output.write("%s %d\n" % (";".join(self.symbols.name(target) for target in key), cycles))
@@ -0,0 +1,52 @@
+import bisect
+import re
+
+
+class Symbols(object):
+
+    # A line of a label file: LABEL = $ADDR
+    LABELLINE = re.compile(r"^\s*([A-Z_][A-Z0-9_]*)\s*=\s*\$([0-9A-F]+)\s*$", re.IGNORECASE)
+
+    def __init__(self, labels=None):
+
+        # Map of address to label (the first label seen wins when several share an address).
+        self._names = dict()
+
+        for label, address in sorted((labels or dict()).items()):
+            self._names.setdefault(address, label)
+
+        # Sorted addresses, for finding the nearest label below an address.
+        self._addresses = sorted(self._names)
+
+    @classmethod
+    def load(cls, path):
+
+        labels = dict()
+
+        # Read each label line, skipping anything else.
+        with open(path, mode='r') as infile:
+
+            for line in infile:
+
+                match = cls.LABELLINE.match(line)
+
+                if match:
+                    labels[match.group(1).upper()] = int(match.group(2), 16)
+
+        return cls(labels)
+
+    def name(self, address):
+
+        # Check to see if there is a label for exactly this address.
+        if address in self._names:
+            return self._names[address]
+
+        # Find the nearest label below the address.
+        position = bisect.bisect_right(self._addresses, address) - 1
+
+        if position >= 0:
+            nearest = self._addresses[position]
+            return "%s+%d" % (self._names[nearest], address - nearest)
+
+        # No label, so use the address.
+        return "$%04X" % address
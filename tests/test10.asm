@@ -701,8 +701,7 @@ type
 		lsr			;
 		and   	#$01		; strip LSB
 		clc			;
-		adc   	temp		; combine row & col to determine
-square color
+		adc   	temp		; combine row & col to determine square color
 		and   	#$01		; is board square white or blk?
 		bne	pout25 		; white, print space
 		lda   	#"*"		; black, print *
@@ -800,8 +799,7 @@ KIN        	LDA   	#"?"
 ;
 Init_6551      lda   #$1F               ; 19.2K/8/1
                sta   ACIActl            ; control reg
-               lda   #$0B               ; N parity/echo off/rx int off/
-dtr active low
+               lda   #$0B               ; N parity/echo off/rx int off/dtr active low
                sta   ACIAcmd            ; command reg
                rts                      ; done
 ;
@@ -0,0 +1,67 @@
+import time
+
+
+class Throttle(object):
+
+    # Fall this far behind (in seconds) and the throttle stops trying to catch up.
+    MAXLAG = 0.1
+
+    def __init__(self, clockrate, slicecycles=10000):
+
+        # Target clock rate in cycles per second, and the cycles run between clock checks.
+        self.clockrate = float(clockrate)
+        self.slicecycles = max(1, int(slicecycles))
+
+        # The time and cycle count the current run is measured from.
+        self._starttime = 0.0
+        self._startcycle = 0
+
+        # Totals for reporting the achieved rate.
+        self.elapsed = 0.0
+        self.cycles = 0
+
+    def start(self, cycle):
+
+        # Measure from now.
+        self._starttime = time.perf_counter()
+        self._startcycle = cycle
+
+    def wait(self, cycle):
+
+        # Sleep until the cycle is due.
+        time.sleep(self.delay(cycle))
+
+    def delay(self, cycle):
+
+        # Work out when this cycle is due at the target rate.
+        now = time.perf_counter()
+        due = self._starttime + (cycle - self._startcycle) / self.clockrate
+
+        # Check to see if we are ahead of the clock.
+        if due > now:
+            return due - now
+
+        # Check to see if we have fallen too far behind to catch up.
+        if now - due > self.MAXLAG:
+
+            # Count what we have so far and measure from here instead of running flat out to catch up.
+            self.stop(cycle)
+            self.start(cycle)
+
+        return 0.0
+
+    def stop(self, cycle):
+
+        # Add this run to the totals.
+        self.elapsed += time.perf_counter() - self._starttime
+        self.cycles += cycle - self._startcycle
+
+    def achieved(self):
+
+        # Return the achieved clock rate in cycles per second.
+        return self.cycles / self.elapsed if self.elapsed > 0 else 0.0
+
+    def report(self):
+
+        # Print the achieved and target clock rates.
+        print("Clock: achieved %.3f MHz, target %.3f MHz" % (self.achieved() / 1000000, self.clockrate / 1000000))
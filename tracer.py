@@ -0,0 +1,135 @@
+import struct
+
+
+class Tracer(object):
+
+    # Binary trace file header: magic, record count.
+    HEADER = struct.Struct('<4sI')
+    MAGIC = b'MFCT'
+
+    # Binary trace record: pc, opcode, two operand bytes, a, x, y, sp, flags, cycle count.
+    RECORD = struct.Struct('<HBBBBBBBBQ')
+
+    def __init__(self, processor, size=4096):
+
+        # The processor being traced.
+        self._processor = processor
+
+        # Number of instructions kept.
+        self.size = max(1, size)
+
+        # Total number of instructions recorded, and the slot for the next one.
+        self.count = 0
+        self._index = 0
+
+        # The ring buffer, preallocated as packed records.
+        self._recordsize = self.RECORD.size
+        self._buffer = bytearray(self._recordsize * self.size)
+        self._pack = self.RECORD.pack_into
+
+    def record(self, pc, opcode):
+
+        processor = self._processor
+        memory = processor._memory
+
+        # Read the operand bytes straight from the page (so watchpoints don't see them) unless they cross into the next.
+        if (pc & 0xFF) < 0xFE:
+            page = memory._pages[pc >> 8]
+            operand1 = page[(pc + 1) & 0xFF]
+            operand2 = page[(pc + 2) & 0xFF]
+
+        else:
+            operand1, operand2 = memory.readblock((pc + 1) & 0xFFFF, 1) + memory.readblock((pc + 2) & 0xFFFF, 1)
+
+        # Save the instruction and the registers before it executes.
+        self._pack(self._buffer, self._index * self._recordsize, pc & 0xFFFF, opcode, operand1 & 0xFF, operand2 & 0xFF,
+                   processor.a & 0xFF, processor.x & 0xFF, processor.y & 0xFF, processor.sp & 0xFF, processor.pf & 0xFF,
+                   processor.cy)
+
+        # Move to the next slot, wrapping at the end of the buffer.
+        self.count += 1
+        self._index = self._index + 1 if self._index + 1 < self.size else 0
+
+    def clear(self):
+
+        # Forget the recorded instructions.
+        self.count = 0
+        self._index = 0
+
+    def records(self, last=None):
+
+        # Work out how many records to return.
+        available = min(self.count, self.size)
+        last = available if last is None else min(last, available)
+
+        # Get the oldest of the records wanted, and where the newest ends.
+        start = ((self._index - last) % self.size) * self.RECORD.size
+        end = self._index * self.RECORD.size
+
+        # Return the packed records oldest first.
+        if last == 0:
+            return bytes()
+
+        elif start < end:
+            return bytes(self._buffer[start:end])
+
+        else:
+            return bytes(self._buffer[start:] + self._buffer[:end])
+
+    def entries(self, last=None):
+
+        # Unpack the records.
+        return self.RECORD.iter_unpack(self.records(last))
+
+    def formatentry(self, entry):
+
+        pc, opcode, operand1, operand2, a, x, y, sp, pf, cy = entry
+
+        # Format the entry the same way the cpu state is shown.
+        return ("%04x: %02x %02x %02x  A:0x%02x X:0x%02x Y:0x%02x SP:0x%02x Flags:0x%02x CPU Cycles:%d" %
+                (pc, opcode, operand1, operand2, a, x, y, sp, pf, cy))
+
+    def show(self, last=None):
+
+        # Print the entries to the screen.
+        for entry in self.entries(last):
+            print(self.formatentry(entry))
+
+    def dump(self, output, binary=False):
+
+        # Check to see if we are writing binary records.
+        if binary:
+
+            # Write the header then the packed records.
+            records = self.records()
+            output.write(self.HEADER.pack(self.MAGIC, len(records) // self.RECORD.size))
+            output.write(records)
+
+        else:
+
+            # Write one line per entry.
+            for entry in self.entries():
+                output.write(self.formatentry(entry) + "\n")
+
+    def save(self, path):
+
+        # Files ending in .bin get binary records, anything else gets text.
+        binary = path.lower().endswith(".bin")
+
+        with open(path, mode='wb' if binary else 'w') as output:
+            self.dump(output, binary)
+
+    @classmethod
+    def readbinary(cls, path):
+
+        with open(path, mode='rb') as infile:
+
+            # Check the header.
+            magic, count = cls.HEADER.unpack(infile.read(cls.HEADER.size))
+
+            if magic != cls.MAGIC:
+                raise Exception("%s is not a trace file." % path)
+
+            # Return each record.
+            for _ in range(count):
+                yield cls.RECORD.unpack(infile.read(cls.RECORD.size))
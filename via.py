@@ -0,0 +1,232 @@
+class VIATimer(object):
+
+    def __init__(self, via, flag):
+
+        # The VIA the timer belongs to, and its bit in the interrupt flag register.
+        self._via = via
+        self.flag = flag
+
+        # The latch (reload value) and the value the counter was loaded with.
+        self.latch = 0
+        self.value = 0
+
+        # The cycle count when the counter was loaded.
+        self.start = 0
+
+        # Flag for reloading from the latch on underflow instead of stopping.
+        self.freerun = False
+
+        # The scheduled underflow, if there is one.
+        self._underflow = None
+
+    def load(self, cycle):
+
+        # Copy the latch into the counter and start counting from this cycle.
+        self.value = self.latch
+        self.start = cycle
+
+        # Replace any underflow already scheduled.
+        interrupts = self._via.interrupts
+
+        if self._underflow is not None:
+            interrupts.cancel(self._underflow)
+
+        # The counter counts down through zero, so it underflows one cycle after reaching it.
+        self._underflow = interrupts.schedule(cycle + self.value + 1, self.underflow)
+
+    def read(self, cycle):
+
+        # Work out the counter from the cycles elapsed since it was loaded (it is never ticked).
+        elapsed = cycle - self.start
+
+        # Check to see if the counter is still on its first count, or is a one shot that keeps counting down.
+        if elapsed <= self.value or not self.freerun:
+            return (self.value - elapsed) & 0xFFFF
+
+        # A free running counter shows 0xFFFF on underflow then counts down from the latch again.
+        phase = (elapsed - self.value - 1) % (self.latch + 2)
+
+        return 0xFFFF if phase == 0 else self.latch + 1 - phase
+
+    def underflow(self, cycle):
+
+        # Flag the interrupt.
+        self._underflow = None
+        self._via.setflag(self.flag)
+
+        # Check to see if the counter reloads from the latch.
+        if self.freerun:
+
+            # Schedule the next underflow a whole period after this one.
+            self._underflow = self._via.interrupts.schedule(cycle + self.latch + 2, self.underflow)
+
+
+class VIA(object):
+
+    # Default base address, and the register offsets from it.
+    BASE = 0x7F60
+    ORB = 0x0
+    ORA = 0x1
+    DDRB = 0x2
+    DDRA = 0x3
+    T1CL = 0x4
+    T1CH = 0x5
+    T1LL = 0x6
+    T1LH = 0x7
+    T2CL = 0x8
+    T2CH = 0x9
+    SR = 0xA
+    ACR = 0xB
+    PCR = 0xC
+    IFR = 0xD
+    IER = 0xE
+    ORANOHANDSHAKE = 0xF
+
+    # Interrupt flag bits.
+    IRQFLAG = 0x80
+    T1FLAG = 0x40
+    T2FLAG = 0x20
+
+    # Auxiliary control bit for a free running timer 1.
+    T1FREERUN = 0x40
+
+    def __init__(self):
+
+        # The processor supplying the cycle count and interrupts (set when attached).
+        self._processor = None
+        self.interrupts = None
+
+        # The timers.
+        self.timer1 = VIATimer(self, self.T1FLAG)
+        self.timer2 = VIATimer(self, self.T2FLAG)
+
+        # The register file, for the registers with no behaviour of their own (ports, shift and control).
+        self.registers = [0] * 16
+
+        # Interrupt flag and enable registers.
+        self.ifr = 0
+        self.ier = 0
+
+    def attach(self, processor, base=None):
+
+        # Put the registers on the processor's bus.
+        base = self.BASE if base is None else base
+
+        # Reading a register changes nothing apart from the low byte of a counter (which acknowledges its interrupt), so a
+        # loop polling the rest can idle.
+        processor.mapdevice(base, base + 15, self.read, self.write, pure=True)
+
+        # The counters read differently every cycle, so a loop reading one is never idle.
+        processor.mapdevice(base + self.T1CL, base + self.T1CH, self.read, self.write, volatile=True)
+        processor.mapdevice(base + self.T2CL, base + self.T2CH, self.read, self.write, volatile=True)
+
+        # Take the cycle count and interrupts from the processor.
+        self._processor = processor
+        self.interrupts = processor.interrupts
+
+    def read(self, address):
+
+        register = address & 0x0F
+        cycle = self._processor.cy
+
+        # Reading the low byte of a counter acknowledges its interrupt.
+        if register == self.T1CL:
+            self.clearflag(self.T1FLAG)
+            return self.timer1.read(cycle) & 0xFF
+
+        if register == self.T1CH:
+            return self.timer1.read(cycle) >> 8
+
+        if register == self.T1LL:
+            return self.timer1.latch & 0xFF
+
+        if register == self.T1LH:
+            return self.timer1.latch >> 8
+
+        if register == self.T2CL:
+            self.clearflag(self.T2FLAG)
+            return self.timer2.read(cycle) & 0xFF
+
+        if register == self.T2CH:
+            return self.timer2.read(cycle) >> 8
+
+        # Bit 7 of the flags shows whether any enabled interrupt is flagged.
+        if register == self.IFR:
+            return self.ifr | (self.IRQFLAG if self.ifr & self.ier else 0)
+
+        # Bit 7 of the enable register always reads as set.
+        if register == self.IER:
+            return self.ier | 0x80
+
+        return self.registers[register]
+
+    def write(self, address, value):
+
+        register = address & 0x0F
+        cycle = self._processor.cy
+
+        # Writing the low byte of a counter sets the low byte of its latch.
+        if register == self.T1CL or register == self.T1LL:
+            self.timer1.latch = (self.timer1.latch & 0xFF00) | value
+
+        # Writing the high byte of timer 1 loads and starts it.
+        elif register == self.T1CH:
+            self.timer1.latch = (self.timer1.latch & 0x00FF) | (value << 8)
+            self.clearflag(self.T1FLAG)
+            self.timer1.load(cycle)
+
+        elif register == self.T1LH:
+            self.timer1.latch = (self.timer1.latch & 0x00FF) | (value << 8)
+            self.clearflag(self.T1FLAG)
+
+        elif register == self.T2CL:
+            self.timer2.latch = (self.timer2.latch & 0xFF00) | value
+
+        # Writing the high byte of timer 2 loads and starts it.
+        elif register == self.T2CH:
+            self.timer2.latch = (self.timer2.latch & 0x00FF) | (value << 8)
+            self.clearflag(self.T2FLAG)
+            self.timer2.load(cycle)
+
+        elif register == self.ACR:
+            self.registers[register] = value
+            self.timer1.freerun = bool(value & self.T1FREERUN)
+
+        # Writing ones to the flag register clears those flags.
+        elif register == self.IFR:
+            self.clearflag(value & 0x7F)
+
+        # Bit 7 of the enable register says whether the other bits are being set or cleared.
+        elif register == self.IER:
+
+            if value & 0x80:
+                self.ier |= value & 0x7F
+
+            else:
+                self.ier &= ~value & 0x7F
+
+            self.updateirq()
+
+        else:
+            self.registers[register] = value
+
+    def setflag(self, flag):
+
+        # Flag the interrupt and update the IRQ line.
+        self.ifr |= flag
+        self.updateirq()
+
+    def clearflag(self, flag):
+
+        # Clear the interrupt and update the IRQ line.
+        self.ifr &= ~flag
+        self.updateirq()
+
+    def updateirq(self):
+
+        # Hold the IRQ line while any enabled interrupt is flagged.
+        if self.ifr & self.ier:
+            self.interrupts.raiseirq(self)
+
+        else:
+            self.interrupts.clearirq(self)